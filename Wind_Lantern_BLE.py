@@ -8,12 +8,16 @@ import uasyncio as asyncio
 import aioble
 import bluetooth
 import struct
-from machine import Pin, PWM
-import time
-import random
+from machine import Pin
 import _thread
-
-version = "1.0.9"
+from effects import EffectStack, Shimmer
+from flicker import FlickerEngine
+from palette import BLUE
+from pulse import Pulse, PulseGroup
+from render import make_scheduler
+from wind import to_fixed
+
+version = "1.0.21"
 print("Wind Lantern BLE - Version:", version)
 
 sLock = _thread.allocate_lock()
@@ -28,7 +32,9 @@ blue_pin_2 = 10
 
 wind_factor = 0
 
-terminateThread = False
+RENDER_BACKEND = 'thread' # 'thread', 'timer' or 'asyncio', see render.py
+PALETTE = 'candle' # see palette.py for the others
+SYNC_ROLE = None # None, 'leader' or 'follower' to flicker in step with other lanterns, see sync.py
 
 # org.bluetooth.service.environmental_sensing
 _ENV_SENSE_UUID = bluetooth.UUID(0x181A)
@@ -38,10 +44,6 @@ _ENV_SENSE_TEMP_UUID = bluetooth.UUID(0x2A72)
 # Name of the peripheral you want to connect
 peripheral_name="RPi-Pico"
 
-class Pulse(PWM):
-    def duty(self, percent_duty):
-        return self.duty_u16(int(percent_duty/100 *65535))
-    
 red_pwm = Pulse(Pin(red_pin))
 red_pwm.freq(300)
 red_pwm.duty(100)
@@ -60,28 +62,24 @@ green_pwm_2.duty(100)
 blue_pwm_2 = Pulse(Pin(blue_pin_2))
 blue_pwm_2.freq(300)
 blue_pwm_2.duty(99)  
- 
-def red_light():
-        global wind_factor
-        red_pwm.duty( 100 - min(random.randint(93-wind_factor, 100), 100) )
-        red_pwm_2.duty(100 - min(random.randint(93-wind_factor, 100) , 100) ) 
-        rand_flicker_sleep()
- 
-def green_light():
-        global wind_factor
-        green_pwm.duty( 100 - min(random.randint(33-wind_factor, 34) ,100) )
-        green_pwm_2.duty(100 - min(random.randint(33-wind_factor, 34) ,100) )
-        rand_flicker_sleep()
- 
-def rand_flicker_sleep():
-    time.sleep(random.randint(3, 10) / 100.0)
 
-def light_candle():
-        print("Starting candle thread")
-        while terminateThread == False:
-                red_light()
-                green_light()
-                time.sleep_ms(1)
+leds = PulseGroup(red_pwm, green_pwm, blue_pwm, red_pwm_2, green_pwm_2, blue_pwm_2)
+flicker_engine = FlickerEngine(palette=PALETTE)
+ 
+def render_frame():
+        # compose all six channels for one timestamp, then commit them back-to-back
+        factor = sync.shared_factor(wind_factor) if sync else wind_factor
+        frame = flicker_engine.compose(factor)
+        effects.apply(frame) # overlays posted from the asyncio side
+        leds.write(frame)
+        return factor
+
+candle = make_scheduler(RENDER_BACKEND, render_frame)
+effects = EffectStack()
+sync = None
+if SYNC_ROLE:
+    from sync import LanternSync
+    sync = LanternSync(candle, [flicker_engine], role=SYNC_ROLE)
 
 # Helper to decode the wind characteristic encoding (sint16, hundredths of a degree).
 def _decode_value(data):
@@ -103,8 +101,6 @@ async def find_wind_sensor():
                 return result.device
     return None
 
-_thread.start_new_thread(light_candle, ())
-
 async def main():
     while True:
         device = await find_wind_sensor()
@@ -125,8 +121,8 @@ async def main():
             try:
                 wind_service = await connection.service(_ENV_SENSE_UUID)
                 wind_characteristic = await wind_service.characteristic(_ENV_SENSE_TEMP_UUID)
-                blue_pwm.duty(100) # turn off blue LEDs
-                blue_pwm_2.duty(100) # turn off blue LEDs
+                flicker_engine.set_level(BLUE, 0) # turn off blue LEDs
+                effects.post(Shimmer(flicker_engine)) # connected to the wind sensor
             except asyncio.TimeoutError:
                 print("Timeout discovering services/characteristics. Retrying...")
                 await asyncio.sleep_ms(5000)  # Wait for 5 seconds before retrying
@@ -144,9 +140,12 @@ async def main():
                         wind_speed = _decode_value(wind_data)
                         if wind_speed is not None:
                             print("Wind: {:.2f}".format(wind_speed))
-                            wind_factor = max(int(wind_speed), 0) # protect against negative wind factor
-                            wind_factor = wind_factor * 2   # increase wind factor effect
-                            print("Wind factor:", wind_factor)
+                            factor = max(int(wind_speed), 0) # protect against negative wind factor
+                            factor = factor * 2   # increase wind factor effect
+                            wind_factor = to_fixed(factor) # fixed point for the render loop
+                            if not (sync and sync.locked):
+                                flicker_engine.set_wind(wind_factor, wind_factor)  # refresh waveform tables
+                            print("Wind factor:", factor)
                         else:
                             print("Invalid wind data")
                     else:
@@ -160,7 +159,13 @@ async def main():
 # Create an Event Loop
 loop = asyncio.get_event_loop()
 # Create a task to run the main function
-loop.create_task(main())
+if SYNC_ROLE == 'follower':
+    sync.start() # the leader supplies the wind, and scanning for the sensor would stop the beacon scan
+else:
+    loop.create_task(main())
+    if sync:
+        sync.start()
+candle.start()
 
 try:
     # Run the event loop indefinitely
@@ -168,10 +173,10 @@ try:
 except Exception as e:
     print('Error occurred: ', e)
 except KeyboardInterrupt:
+    candle.stop()
     red_pwm.duty(100)
     red_pwm_2.duty(100)
     green_pwm.duty(100)
     green_pwm_2.duty(100)
     print('Program Interrupted by the user')
-    terminateThread = True
 
@@ -0,0 +1,260 @@
+# Rob Faludi 2025
+# Wind Lantern that follows a local BLE wind sensor while it is connected and
+# the Open-Meteo forecast when it is not, fading between the two, see WindBlend in wind.py
+# BLE based on code from Rui Santos & Sara Santos
+# https://randomnerdtutorials.com/raspberry-pi-pico-w-bluetooth-low-energy-micropython/
+# Flicker based on code from Grant Whitney
+# https://grantwinney.com/raspberry-pi-flickering-candle/
+
+import uasyncio as asyncio
+import aioble
+import bluetooth
+import struct
+from machine import Pin, WDT
+import time
+import json
+import secrets
+from nature_api import AsyncClient
+from effects import EffectStack, Shimmer
+from flicker import FlickerEngine
+from forecast import WindForecast
+from pulse import Pulse, PulseGroup
+from render import make_scheduler
+from wind import WindBlend, WindManager
+
+version = "1.0.5"
+print("Wind Lantern Hybrid - Version:", version)
+
+# Wi-Fi credentials
+ssid = secrets.WIFI_SSID  # your SSID name
+password = secrets.WIFI_PASSWORD  # your WiFi password
+
+wdt = WDT(timeout=8388)  # 8-second watchdog timer
+
+nature_client = AsyncClient(ssid, password, debug_mode=False, watchdog=wdt) # requests never block the event loop
+
+address = "350 5th Avenue, New York, NY"
+latitude = 40.7484773
+longitude = -73.9881643
+
+red_pin = 5
+green_pin = 6
+blue_pin = 7
+
+red_pin_2 = 8
+green_pin_2 = 9
+blue_pin_2 = 10
+
+RENDER_BACKEND = 'thread' # 'thread', 'timer' or 'asyncio', see render.py
+PALETTE = 'candle' # see palette.py for the others
+SENSOR_SCALE = 1.0 # sensor reading to m/s
+BLEND_STEP_MS = 500 # how often the two sources are blended into the wind manager
+FADE_MS = 10000 # length of a fade between the sensor and the forecast
+STALE_MS = 5000 # sensor readings older than this count as a dropout
+FORECAST_CHECK_MS = 15 * 60 * 1000 # how often the forecast is checked for a refresh
+
+# org.bluetooth.service.environmental_sensing
+_ENV_SENSE_UUID = bluetooth.UUID(0x181A)
+# org.bluetooth.characteristic.temperature
+_ENV_SENSE_TEMP_UUID = bluetooth.UUID(0x2A72)
+
+# Name of the peripheral you want to connect
+peripheral_name="RPi-Pico"
+
+red_pwm = Pulse(Pin(red_pin))
+red_pwm.freq(300)
+red_pwm.duty(100)
+green_pwm = Pulse(Pin(green_pin))
+green_pwm.freq(300)
+green_pwm.duty(100)
+blue_pwm = Pulse(Pin(blue_pin))
+blue_pwm.freq(300)
+blue_pwm.duty(99)
+red_pwm_2 = Pulse(Pin(red_pin_2))
+red_pwm_2.freq(300)
+red_pwm_2.duty(100)
+green_pwm_2 = Pulse(Pin(green_pin_2))
+green_pwm_2.freq(300)
+green_pwm_2.duty(100)
+blue_pwm_2 = Pulse(Pin(blue_pin_2))
+blue_pwm_2.freq(300)
+blue_pwm_2.duty(99)
+
+leds = PulseGroup(red_pwm, green_pwm, blue_pwm, red_pwm_2, green_pwm_2, blue_pwm_2)
+flicker_engine = FlickerEngine(palette=PALETTE)
+
+def render_frame():
+    # compose all six channels for one timestamp, then commit them back-to-back
+    factor = wind_manager.get_wind_factor()
+    frame = flicker_engine.compose(factor)
+    effects.apply(frame) # overlays posted from the asyncio side
+    leds.write(frame)
+    return factor
+
+def set_wind_tables(wind_factor, gust_factor):
+    flicker_engine.set_wind(wind_factor, gust_factor)
+
+candle = make_scheduler(RENDER_BACKEND, render_frame)
+effects = EffectStack()
+wind_manager = WindManager(on_change=set_wind_tables)
+blend = WindBlend(wind_manager, fade_ms=FADE_MS, stale_ms=STALE_MS)
+forecast = WindForecast()
+time_synced = False # the forecast is indexed by the clock, so it waits for NTP
+
+def open_config():
+    # location as saved by the NatureAPI lantern, if any
+    try:
+        with open('config.json', 'r') as f:
+            return json.loads(f.read())
+    except Exception as e:
+        print("No configuration file, using the default location:", e)
+    return None
+
+# Helper to decode the wind characteristic encoding (uint32, hundredths).
+def _decode_value(data):
+    try:
+        if data is not None:
+            return struct.unpack("<I", data)[0] / 100
+    except Exception as e:
+        print("Error decoding wind:", e)
+    return None
+
+async def find_wind_sensor():
+    # Scan for 5 seconds, in active mode, with a very low interval/window (to
+    # maximize detection rate).
+    async with aioble.scan(5000, interval_us=30000, window_us=30000, active=True) as scanner:
+        async for result in scanner:
+            # See if it matches our name and the environmental sensing service.
+            if result.name() == peripheral_name and _ENV_SENSE_UUID in result.services():
+                return result.device
+    return None
+
+async def follow_sensor():
+    # BLE side: feed sensor readings to the blend, it fades to the forecast on dropouts
+    while True:
+        device = await find_wind_sensor()
+        if not device:
+            print("Wind sensor not found. Retrying...")
+            await asyncio.sleep_ms(5000)  # Wait for 5 seconds before retrying
+            continue
+
+        try:
+            print("Connecting to", device)
+            connection = await device.connect()
+        except asyncio.TimeoutError:
+            print("Timeout during connection. Retrying...")
+            await asyncio.sleep_ms(5000)  # Wait for 5 seconds before retrying
+            continue
+
+        async with connection:
+            try:
+                wind_service = await connection.service(_ENV_SENSE_UUID)
+                wind_characteristic = await wind_service.characteristic(_ENV_SENSE_TEMP_UUID)
+                effects.post(Shimmer(flicker_engine)) # connected to the wind sensor
+            except asyncio.TimeoutError:
+                print("Timeout discovering services/characteristics. Retrying...")
+                await asyncio.sleep_ms(5000)  # Wait for 5 seconds before retrying
+                continue
+            except AttributeError:
+                print("Attribute error. Retrying...")
+                await asyncio.sleep_ms(1000)  # Wait for 1 seconds before retrying
+                continue
+
+            while True:
+                try:
+                    wind_speed = _decode_value(await wind_characteristic.read())
+                    if wind_speed is not None:
+                        blend.update_primary(wind_speed * SENSOR_SCALE)
+                    else:
+                        print("Invalid wind data")
+                except Exception as e:
+                    print("Sensor dropped out, fading to the forecast:", e)
+                    break  # Break out of the inner loop and attempt to reconnect
+                await asyncio.sleep_ms(1000)  # Read every 1 seconds
+
+async def go_online():
+    # connect if needed and set the clock from NTP, True once both have worked
+    global time_synced
+    if not await nature_client.connect_wifi_async():
+        return False
+    if nature_client.sync_time():
+        time_synced = True
+    else:
+        print('NTP sync failed, continuing with local time if available.')
+    return time_synced
+
+async def follow_forecast():
+    # Wi-Fi side: keep the hourly forecast filled, it is interpolated locally in between
+    while True:
+        wdt.feed()
+        if not time_synced or forecast.needs_refresh((latitude, longitude)):
+            if not await go_online():
+                print('No Wi-Fi or time, trying again at the next forecast check')
+                await asyncio.sleep_ms(FORECAST_CHECK_MS)
+                continue
+            try:
+                wdt.feed()
+                await forecast.fetch_async(nature_client, (latitude, longitude))
+                print(f"Forecast: {len(forecast)} hours of wind, {forecast.hours_left():.1f} ahead")
+            except Exception as e:
+                print('Error fetching the forecast:', e)
+            nature_client.pool.close() # the next fetch is hours away
+        await asyncio.sleep_ms(FORECAST_CHECK_MS)
+
+async def run_blend():
+    # publishes the blend to the wind manager; the render core only picks it up
+    # through the snapshot at its next frame, so it never waits on either source
+    printed = time.ticks_ms()
+    while True:
+        wdt.feed()
+        wind = forecast.wind_at()
+        if wind is not None:
+            blend.update_fallback(*wind)
+        wind = blend.step()
+        if wind is not None and time.ticks_diff(time.ticks_ms(), printed) >= 60 * 1000:
+            printed = time.ticks_ms()
+            source = "sensor" if blend.live else "forecast"
+            print(f"Wind {wind[0]:.2f} m/s, gusts {wind[1]:.2f} m/s, {blend.weight * 100:.0f}% sensor, following the {source}")
+            candle.report()
+        await asyncio.sleep_ms(BLEND_STEP_MS)
+
+async def main():
+    global address, latitude, longitude
+    wdt.feed()
+    settings = open_config()
+    if settings is not None:
+        address = settings.get('address', address)
+        latitude = settings.get('latitude', latitude)
+        longitude = settings.get('longitude', longitude)
+    nature_client.set_coordinates(latitude, longitude) # the forecast works without a lookup
+    asyncio.create_task(run_blend())
+    asyncio.create_task(follow_sensor()) # the sensor does not need Wi-Fi
+    await go_online()
+    if not nature_client.wifi_connected:
+        print('Could not connect to Wi-Fi, following the sensor only')
+    else:
+        await nature_client.resolve_hosts() # the first fetches skip DNS
+        try:
+            await nature_client.set_location(address)
+        except Exception as e:
+            print('Warning: initial location setup failed:', e)
+    await follow_forecast()
+
+# Create an Event Loop
+loop = asyncio.get_event_loop()
+# Create a task to run the main function
+loop.create_task(main())
+candle.start()
+
+try:
+    # Run the event loop indefinitely
+    loop.run_forever()
+except Exception as e:
+    print('Error occurred: ', e)
+except KeyboardInterrupt:
+    candle.stop()
+    red_pwm.duty(100)
+    red_pwm_2.duty(100)
+    green_pwm.duty(100)
+    green_pwm_2.duty(100)
+    print('Program Interrupted by the user')
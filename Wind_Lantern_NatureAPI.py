@@ -7,18 +7,22 @@
 
 from math import log
 import uasyncio as asyncio
-from machine import Pin, PWM, reset, WDT
+from machine import Pin, reset, WDT
 import time
-import random
-import _thread
-import requests
 import secrets
-import gc
 import json
 import network
-from nature_api import Client
-
-version = "1.0.28"
+from nature_api import AsyncClient
+from effects import EarthquakePulse, EffectStack, Shimmer
+from flicker import FlickerEngine
+from forecast import WindForecast
+from pulse import Pulse, PulseGroup
+from render import make_scheduler
+from solar import DayNight
+from strip import StripRenderer
+from wind import WindManager
+
+version = "1.0.53"
 print("Wind Lantern NatureAPI - Version:", version)
 
 # Wi-Fi credentials
@@ -27,7 +31,7 @@ password = secrets.WIFI_PASSWORD  # your WiFi password
 
 wdt = WDT(timeout=8388)  # 8-second watchdog timer
 
-nature_client = Client(ssid, password, debug_mode=False, watchdog=wdt)
+nature_client = AsyncClient(ssid, password, debug_mode=False, watchdog=wdt) # requests never block the event loop
 ipgeolocation_key = getattr(secrets, 'IPGEOLOCATION_API_KEY', None)
 if ipgeolocation_key:
     try:
@@ -51,14 +55,20 @@ green_pin_2 = 9
 blue_pin_2 = 10
 LED = Pin("LED", Pin.OUT)      # digital output for status LED
 
-GUST_INTERVAL_LOW = 15000  # 15 seconds
-GUST_INTERVAL_HIGH = 40000  # 40 seconds
-GUST_LENGTH_LOW = 3000  # 3 seconds
-GUST_LENGTH_HIGH = 15000  # 15 seconds
-WIND_FACTOR_MULTIPLIER = 1.2
-WIND_FACTOR_K = 0.03 # how strongly the wind factor is pulled towards the center value
-# A gentle breeze should have the most effect, and higher winds should have less effect to prevent the lantern from flickering too wildly in strong winds. 
-WIND_FACTOR_CENTER = 6 # increase wind effect below this speed, decrease effect above this speed.
+RENDER_BACKEND = 'thread' # 'thread', 'timer' or 'asyncio', see render.py
+PALETTE = 'candle' # see palette.py for the others
+FORECAST_STEP_MS = 60 * 1000 # how often the wind is interpolated from the hourly forecast
+FORECAST_RETRY_S = 10 * 60 # wait after a failed forecast fetch
+WIFI_RETRY_S = 5 * 60 # wait after failing to reconnect when waking from rest
+LOCATION_INTERVAL_S = 6 * 3600 # how often the settings server is asked for a new address
+EARTHQUAKE_RADIUS_KM = 500 # pulse the lantern for new earthquakes this close, None to not check
+EARTHQUAKE_INTERVAL_S = 3600 # how often to check for new earthquakes
+EARTHQUAKE_MIN_MAGNITUDE = 3
+DAY_NIGHT = True # rest during daylight: dimmer, slower frames, Wi-Fi off between requests, see solar.py
+QUIET_HOURS = None # local (start, end) hours to rest at night as well, e.g. (23, 6)
+SYNC_ROLE = None # None, 'leader' or 'follower' to flicker in step with other lanterns, see sync.py
+STRIP_PIN = None # GPIO of a WS2812 strip for larger lanterns, None if not fitted
+STRIP_PIXELS = 60
 
 errors = {
     'wifi_connection': True,
@@ -67,12 +77,6 @@ errors = {
     'location_fetch': False
 }
 
-terminateThread = False
-
-class Pulse(PWM):
-    def duty(self, percent_duty):
-        return self.duty_u16(int(percent_duty/100 *65535))
-    
 red_pwm = Pulse(Pin(red_pin))
 red_pwm.freq(300)
 red_pwm.duty(100)
@@ -92,12 +96,23 @@ blue_pwm_2 = Pulse(Pin(blue_pin_2))
 blue_pwm_2.freq(300)
 blue_pwm_2.duty(99)
 
+leds = PulseGroup(red_pwm, green_pwm, blue_pwm, red_pwm_2, green_pwm_2, blue_pwm_2)
+flicker_engine = FlickerEngine(palette=PALETTE)
+strip = StripRenderer(STRIP_PIN, STRIP_PIXELS, palette=PALETTE, seed=flicker_engine.seed) if STRIP_PIN is not None else None
+
 def connect_to_wifi():
     wdt.feed()
     connection_success = nature_client.connect_wifi()
     errors['wifi_connection'] = not connection_success
     return connection_success
 
+async def reconnect_wifi():
+    # like connect_to_wifi() but keeps the flicker running and never resets the board
+    wdt.feed()
+    connection_success = await nature_client.connect_wifi_async()
+    errors['wifi_connection'] = not connection_success
+    return connection_success
+
 def get_lantern_mac():
     wlan = network.WLAN(network.STA_IF)
     mac_bytes = wlan.config('mac')
@@ -117,26 +132,40 @@ def parse_datetime(timestamp):
     formatted_time = f"{month}/{day}/{year} {hour:2}:{minute:2} UTC"
     return(formatted_time)
 
-def fetch_weather_data():
+async def fetch_weather_data():
+    # refill the hourly forecast, the wind is then interpolated locally until it runs short
     try:
         wdt.feed()
-        forecast = nature_client.get_weather("current", "wind_speed_10m,wind_gusts_10m", forecast_days=1, expiry=300)
-        if not forecast or forecast.get('wind_speed_10m') is None:
-            errors['weather_fetch'] = True
-            return None
+        await forecast.fetch_async(nature_client, (latitude, longitude))
         errors['weather_fetch'] = False
-        timestamp = f"{time.gmtime()[0]:04}-{time.gmtime()[1]:02}-{time.gmtime()[2]:02}T{time.gmtime()[3]:02}:{time.gmtime()[4]:02}"
-        return {
-            'current': {
-                'wind_speed_10m': forecast.get('wind_speed_10m'),
-                'wind_gusts_10m': forecast.get('wind_gusts_10m'),
-                'time': timestamp
-            }
-        }
+        print(f"Forecast: {len(forecast)} hours of wind, {forecast.hours_left():.1f} ahead")
+        return True
     except Exception as e:
         print('Error fetching weather data:', e)
         errors['weather_fetch'] = True
-        return None
+        return False
+
+async def follow_forecast():
+    # keeps working from the stored series through Wi-Fi outages
+    while True:
+        wind = forecast.wind_at()
+        if wind is not None:
+            wind_manager.set_wind(*wind)
+        await asyncio.sleep_ms(FORECAST_STEP_MS)
+    
+async def check_earthquakes():
+    try:
+        wdt.feed()
+        quake = await nature_client.get_new_earthquake({"latitude": latitude, "longitude": longitude,
+                                                  "maxradiuskm": EARTHQUAKE_RADIUS_KM,
+                                                  "minmagnitude": EARTHQUAKE_MIN_MAGNITUDE,
+                                                  "orderby": "time", "limit": 1}, expiry=600)
+        if quake:
+            magnitude = quake['features'][0]['properties'].get('mag') or EARTHQUAKE_MIN_MAGNITUDE
+            print("New earthquake, magnitude", magnitude)
+            effects.post(EarthquakePulse(flicker_engine, magnitude))
+    except Exception as e:
+        print('Error checking earthquakes:', e)
     
 def open_config():
     try:
@@ -180,17 +209,11 @@ def save_config():
     except Exception as e:
         print("Error saving config:", e)
 
-def fetch_address(url):
+async def fetch_address(url):
     try:
         # Make GET request
         wdt.feed()
-        response = requests.get(url, timeout=8)
-        # Get response code
-        response_code = response.status_code
-        print('Response code: ', response_code)
-        # response_content = response.content
-        # print('Response content:', response_content)
-        config_raw = response.json()
+        config_raw = await nature_client.get_json(url)
         # Print results
         print('Configuration: ', config_raw)
         errors['config_fetch'] = False
@@ -203,20 +226,20 @@ def fetch_address(url):
     
 async def update_location():
     global address, latitude, longitude, settings_file_url
-    location = fetch_address(settings_file_url)
+    location = await fetch_address(settings_file_url)
     if location is not None:
         address = location.get('address')
         print("Using Address:", address)
         if address:
             try:
-                nature_client.set_location(address)
+                await nature_client.set_location(address)
                 client_location = nature_client.get_location()
                 if client_location:
                     latitude = float(client_location['latitude'])
                     longitude = float(client_location['longitude'])
                     errors['location_fetch'] = False
                     try:
-                        nature_client.set_timezone_from_location()
+                        await nature_client.set_timezone_from_location()
                     except Exception as e:
                         print('Warning: failed to set timezone from location:', e)
                     save_config()
@@ -234,7 +257,7 @@ async def error_led(milliseconds):
     # for example if config fetch and location fetch failed, blinks = 0b1100 = 12
     global errors
     start_time = time.ticks_ms()
-    while time.ticks_ms() - start_time < milliseconds:
+    while time.ticks_diff(time.ticks_ms(), start_time) < milliseconds:
         count = 0
         blinks = 0
         for error in errors.values():
@@ -253,89 +276,34 @@ async def error_led(milliseconds):
         await asyncio.sleep_ms(1000)
 
 
-class WindManager:
-    def __init__(self):
-        self.wind_factor = 0
-        self.gust_factor = 0
-        self.gust_ramp = random.randint(GUST_LENGTH_LOW, GUST_LENGTH_HIGH) * 0.25
-        self.speed = 0
-        self.gusts = 0
-        self.gusting = True
-        self.start_time = time.ticks_ms()
-        self.delay = 0
-
-    def set_wind(self, wind_speed, wind_gusts):
-        self.speed = wind_speed
-        self.gusts = wind_gusts
-        self._calc_wind_factor(self.speed, self.gusts)
-
-    def adjust(self, x, k=0.02, center=10):
-        return x - k * (x - center) * abs(x - center)
-
-    def _calc_wind_factor(self, wind_speed, wind_gusts):
-        self.wind_factor = max((wind_speed), 0) # protect against negative wind factor
-        # self.wind_factor = (self.wind_factor * WIND_FACTOR_MULTIPLIER)   # increase wind factor effect
-        self.wind_factor = self.adjust(self.wind_factor, k=0.02, center=10)
-        self.gust_factor = max((wind_gusts), 0) # protect against negative wind factor
-        # self.gust_factor = (self.gust_factor * WIND_FACTOR_MULTIPLIER)   # increase wind factor effect
-        self.gust_factor = self.adjust(self.gust_factor, k=0.02, center=10)
-
-    def _calc_gusting(self):
-        if time.ticks_ms() - self.start_time > self.delay:
-            self.start_time = time.ticks_ms()
-            self.gust_ramp = random.randint(GUST_LENGTH_LOW, GUST_LENGTH_HIGH) * 0.25
-            if not self.gusting:
-                self.gusting = True
-                self.gust_factor = self.gust_factor * random.uniform(0.8, 1.2) # add some randomness to gust factor
-                self.delay = random.randint(GUST_LENGTH_LOW, GUST_LENGTH_HIGH)
-                print("Gusting for", self.delay / 1000, "secs")
-            elif self.gusting:
-                self.gusting = False
-                self.delay = random.randint(GUST_INTERVAL_LOW, GUST_INTERVAL_HIGH)
-                print("Next gust in", self.delay / 1000, "secs") 
-        return self.wind_factor
-    
-    def get_wind_factor(self):
-        self._calc_gusting()
-        if self.gusting:
-            # gust, reduced by the full difference with wind at first, then down to no reduction at 1/4 time
-            difference = ( self.gust_factor - self.wind_factor )
-            percent = max(( 1- (time.ticks_ms() - self.start_time) / self.gust_ramp ), 0) 
-            factor = self.gust_factor - ( difference * percent )
-        else:
-            # wind, increased by the full difference with gusts at first, then down to no increase at 1/4 time
-            difference = ( self.gust_factor - self.wind_factor )
-            percent = max(( 1 - (time.ticks_ms() - self.start_time) / self.gust_ramp ), 0) 
-            factor = self.wind_factor + ( difference * percent )
-        # factor = factor * random.uniform(0.85, 1.0) # add some randomness
-        return factor
-    
-def red_light():
-        global wind_manager
-        factor = wind_manager.get_wind_factor()
-        red_pwm.duty( 100 - min(random.uniform(93-factor, 100), 100) )
-        red_pwm_2.duty(100 - min(random.uniform(93-factor, 100) , 100) ) 
-        rand_flicker_sleep()
- 
-def green_light():
-        global wind_manager
-        factor = wind_manager.get_wind_factor()
-        green_pwm.duty( 100 - min(random.uniform(33-factor, 34) ,100) )
-        green_pwm_2.duty(100 - min(random.uniform(33-factor, 34) ,100) )
-        rand_flicker_sleep()
- 
-def rand_flicker_sleep():
-    time.sleep(random.randint(3, 10) / 100.0)
-
-def light_candle():
-    gc.collect()
-    print("Starting candle thread")
-    while terminateThread == False:
-        red_light()
-        green_light()
-        time.sleep_ms(1)
-
-wind_manager = WindManager()
+def render_frame():
+    # compose all six channels for one timestamp, then commit them back-to-back
+    factor = wind_manager.get_wind_factor()
+    if sync:
+        factor = sync.shared_factor(factor)
+    frame = flicker_engine.compose(factor)
+    effects.apply(frame) # overlays posted from the asyncio side
+    leds.write(frame)
+    if strip:
+        strip.render(factor)
+    return factor
+
+def set_wind_tables(wind_factor, gust_factor):
+    if sync and sync.locked:
+        return # following the leader's tables
+    flicker_engine.set_wind(wind_factor, gust_factor)
+    if strip:
+        strip.set_wind(wind_factor, gust_factor)
+
+candle = make_scheduler(RENDER_BACKEND, render_frame)
+effects = EffectStack()
+wind_manager = WindManager(on_change=set_wind_tables)
+forecast = WindForecast()
+day_night = DayNight(latitude, longitude, QUIET_HOURS) if DAY_NIGHT else None
+sync = None
+if SYNC_ROLE:
+    from sync import LanternSync
+    sync = LanternSync(candle, [flicker_engine, strip] if strip else [flicker_engine], wind_manager, SYNC_ROLE)
 
 async def main():
     wdt.feed()
@@ -351,26 +319,45 @@ async def main():
     if not connection:
         print('Could not connect to Wi-Fi, exiting')
         reset()
+    effects.post(Shimmer(flicker_engine))
 
     lantern_mac = get_lantern_mac()
     settings_file_url = get_settings_url()
     print('Lantern MAC:', lantern_mac)
+    await nature_client.resolve_hosts(settings_file_url) # the first fetches skip DNS
 
     if address:
         try:
-            nature_client.set_location(address)
+            await nature_client.set_location(address)
         except Exception as e:
             print('Warning: initial location setup failed:', e)
 
     if not nature_client.sync_time():
         print('NTP sync failed, continuing with local time if available.')
+    if day_night:
+        asyncio.create_task(day_night.run([flicker_engine, strip] if strip else [flicker_engine], candle))
 
-    next_sync = time.time()
+    asyncio.create_task(follow_forecast())
+    # each kind of request has its own schedule, the loop sleeps until the next one is due
+    next_sync = next_location = next_forecast = next_quake = time.time()
+    refresh_wanted = False # forecast.needs_refresh() at the last check
     while True:
         wdt.feed()
+        if day_night and not day_night.radio_on:
+            day_night.set_radio(True)
+            if not await reconnect_wifi():
+                print(f'Could not reconnect to Wi-Fi, retrying in {WIFI_RETRY_S // 60} minutes')
+                network.WLAN(network.STA_IF).active(False)
+                day_night.set_radio(False)
+                await error_led(WIFI_RETRY_S * 1000) # the requests stay due until then
+                continue
         if not nature_client.wifi_connected:
             break # exit if no connection
-        await update_location()
+        if time.time() >= next_location:
+            await update_location()
+            next_location = time.time() + LOCATION_INTERVAL_S
+            if day_night:
+                day_night.set_location(latitude, longitude, nature_client.get_remote_offset())
         if (time.time() >= next_sync):
             try:
                 print('Syncing time via NTP...')
@@ -381,33 +368,62 @@ async def main():
             except Exception as e:
                 next_sync = time.time() + 600 # try again in 10 minutes
                 print("Failed to update NTP or solar data, retrying in 10 minutes.", e)
+        # Only fetch when the forecast runs short or the location has changed. A refresh
+        # becoming due brings the fetch forward, a failed one still waits FORECAST_RETRY_S
+        wanted = forecast.needs_refresh((latitude, longitude))
+        if wanted and not refresh_wanted:
+            next_forecast = min(next_forecast, time.time())
+        refresh_wanted = wanted
+        if time.time() >= next_forecast:
+            if await fetch_weather_data():
+                next_forecast = time.time() + forecast.seconds_to_refresh()
+            else:
+                next_forecast = time.time() + FORECAST_RETRY_S
+            refresh_wanted = forecast.needs_refresh((latitude, longitude))
         try:
-            # Fetch and display weather data using nature_api
-            weather = fetch_weather_data()
-            if weather is not None:
-                # print('Weather Data:', weather)
-                wind_speed = weather['current']['wind_speed_10m']*0.27778
-                wind_gusts = weather['current']['wind_gusts_10m']*0.27778
-                timestamp = weather['current']['time']
+            wind = forecast.wind_at()
+            if wind is not None:
+                wind_speed, wind_gusts = wind
+                timestamp = f"{time.gmtime()[0]:04}-{time.gmtime()[1]:02}-{time.gmtime()[2]:02}T{time.gmtime()[3]:02}:{time.gmtime()[4]:02}"
                 wind_manager.set_wind(wind_speed, wind_gusts)
                 print('Timestamp:', parse_datetime(timestamp))
-                print(f"Speed: {weather['current']['wind_speed_10m']} kph, Gusts: {weather['current']['wind_gusts_10m']} kph")
+                print(f"Speed: {wind_speed / 0.27778:.1f} kph, Gusts: {wind_gusts / 0.27778:.1f} kph")
                 print(f"Speed: {wind_speed * 2.23693629:.2f} mph, Gusts: {wind_gusts * 2.23693629:.2f} mph") 
                 print(f"Speed {wind_speed:.2f} m/s, Gusts {wind_gusts:.2f} m/s")
                 print("Wind factor:", wind_manager.wind_factor, "Gust factor:", wind_manager.gust_factor)
+                if day_night:
+                    day_night.account(candle) # take the render time before the report clears it
+                candle.report()
+                nature_client.pool.report()
+                nature_client.transfer_report()
+                if day_night:
+                    day_night.report()
+                if sync:
+                    sync.report()
             else:
                 print('No weather data available')
         except Exception as e:
             print('Error fetching weather data:', e)
-        await error_led(15*60*1000)
-        # await asyncio.sleep_ms(15*60*1000)  # Read every 15 minutes
+        due = [next_sync, next_location, next_forecast]
+        if EARTHQUAKE_RADIUS_KM:
+            if time.time() >= next_quake:
+                await check_earthquakes()
+                next_quake = time.time() + EARTHQUAKE_INTERVAL_S
+            due.append(next_quake)
+        nature_client.pool.close() # nothing is asked again before the next cycle
+        if day_night and day_night.resting and not sync: # BLE beacons share the radio
+            network.WLAN(network.STA_IF).active(False) # radio off until the next request is due
+            day_night.set_radio(False)
+        await error_led(int(max(1, min(due) - time.time()) * 1000))
 
 # Create an Event Loop
 wdt = WDT(timeout=8388)  # 8-second watchdog timer
 loop = asyncio.get_event_loop()
 # Create a task to run the main function
 loop.create_task(main())
-_thread.start_new_thread(light_candle, ())
+candle.start()
+if sync:
+    sync.start()
 
 try:
     # Run the event loop indefinitely
@@ -415,10 +431,10 @@ try:
 except Exception as e:
     print('Error occurred: ', e)
 except KeyboardInterrupt:
+    candle.stop()
     red_pwm.duty(100)
     red_pwm_2.duty(100)
     green_pwm.duty(100)
     green_pwm_2.duty(100)
     print('Program Interrupted by the user')
-    terminateThread = True
 
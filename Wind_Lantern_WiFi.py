@@ -7,18 +7,20 @@
 
 from math import log
 import uasyncio as asyncio
-from machine import Pin, PWM, reset, WDT
+from machine import Pin, reset, WDT
 import time
-import random
-import _thread
 import network
 import requests
 import secrets
-import gc
 import json
 import ntptime
+from flicker import FlickerEngine
+from jsonstream import extract_response
+from pulse import Pulse, PulseGroup
+from render import make_scheduler
+from wind import WindManager
 
-version = "1.0.26"
+version = "1.0.40"
 print("Wind Lantern WiFi - Version:", version)
 
 # Wi-Fi credentials
@@ -39,14 +41,9 @@ green_pin_2 = 9
 blue_pin_2 = 10
 LED = Pin("LED", Pin.OUT)      # digital output for status LED
 
-GUST_INTERVAL_LOW = 15000  # 15 seconds
-GUST_INTERVAL_HIGH = 40000  # 40 seconds
-GUST_LENGTH_LOW = 3000  # 3 seconds
-GUST_LENGTH_HIGH = 15000  # 15 seconds
-WIND_FACTOR_MULTIPLIER = 1.2
-WIND_FACTOR_K = 0.03 # how strongly the wind factor is pulled towards the center value
-# A gentle breeze should have the most effect, and higher winds should have less effect to prevent the lantern from flickering too wildly in strong winds. 
-WIND_FACTOR_CENTER = 6 # increase wind effect below this speed, decrease effect above this speed.
+RENDER_BACKEND = 'thread' # 'thread', 'timer' or 'asyncio', see render.py
+PALETTE = 'candle' # see palette.py for the others
+WEATHER_PATHS = ('current.wind_speed_10m', 'current.wind_gusts_10m', 'current.time') # the only values kept from the forecast response
 
 errors = {
     'wifi_connection': True,
@@ -55,12 +52,6 @@ errors = {
     'location_fetch': False
 }
 
-terminateThread = False
-
-class Pulse(PWM):
-    def duty(self, percent_duty):
-        return self.duty_u16(int(percent_duty/100 *65535))
-    
 red_pwm = Pulse(Pin(red_pin))
 red_pwm.freq(300)
 red_pwm.duty(100)
@@ -80,6 +71,9 @@ blue_pwm_2 = Pulse(Pin(blue_pin_2))
 blue_pwm_2.freq(300)
 blue_pwm_2.duty(99)
 
+leds = PulseGroup(red_pwm, green_pwm, blue_pwm, red_pwm_2, green_pwm_2, blue_pwm_2)
+flicker_engine = FlickerEngine(palette=PALETTE)
+
 def connect_to_wifi():
     wlan = network.WLAN(network.STA_IF)
     wlan.active(True)
@@ -121,14 +115,15 @@ def fetch_weather_data():
         # Make GET request
         wdt.feed()
         response = requests.get(f"https://api.open-meteo.com/v1/forecast?latitude={latitude}&longitude={longitude}&current=wind_speed_10m,wind_gusts_10m", timeout=8)
-        # Get response code
-        response_code = response.status_code
-        # Get response content
-        response_content = response.content
-        weather = response.json()
+        try:
+            # Get response code
+            response_code = response.status_code
+            # read the body off the socket in small chunks, keeping only these values
+            weather = extract_response(response, WEATHER_PATHS)
+        finally:
+            response.close()
         # Print results
         print('Response code: ', response_code)
-        # print('Response content:', response_content)
         if 'current' in weather:
             errors['weather_fetch'] = False
         else:
@@ -186,12 +181,13 @@ def fetch_address(url):
         # Make GET request
         wdt.feed()
         response = requests.get(url, timeout=8)
-        # Get response code
-        response_code = response.status_code
-        print('Response code: ', response_code)
-        # response_content = response.content
-        # print('Response content:', response_content)
-        config_raw = response.json()
+        try:
+            # Get response code
+            response_code = response.status_code
+            print('Response code: ', response_code)
+            config_raw = response.json()
+        finally:
+            response.close()
         # Print results
         print('Configuration: ', config_raw)
         errors['config_fetch'] = False
@@ -208,10 +204,11 @@ def fetch_location_from_address(address):
         }
         wdt.feed()
         response = requests.get(f"https://nominatim.openstreetmap.org/search?q={address}&format=json&limit=1", headers=headers, timeout=8)
-        # print(response.content)
-        response_code = response.status_code
-        response_content = response.content
-        location_data = response.json()
+        try:
+            response_code = response.status_code
+            location_data = response.json()
+        finally:
+            response.close()
         print('Response code: ', response_code)
         
         if location_data:
@@ -263,89 +260,14 @@ async def error_led(milliseconds):
         await asyncio.sleep_ms(1000)
 
 
-class WindManager:
-    def __init__(self):
-        self.wind_factor = 0
-        self.gust_factor = 0
-        self.gust_ramp = random.randint(GUST_LENGTH_LOW, GUST_LENGTH_HIGH) * 0.25
-        self.speed = 0
-        self.gusts = 0
-        self.gusting = True
-        self.start_time = time.ticks_ms()
-        self.delay = 0
-
-    def set_wind(self, wind_speed, wind_gusts):
-        self.speed = wind_speed
-        self.gusts = wind_gusts
-        self._calc_wind_factor(self.speed, self.gusts)
-
-    def adjust(self, x, k=0.02, center=10):
-        return x - k * (x - center) * abs(x - center)
-
-    def _calc_wind_factor(self, wind_speed, wind_gusts):
-        self.wind_factor = max((wind_speed), 0) # protect against negative wind factor
-        # self.wind_factor = (self.wind_factor * WIND_FACTOR_MULTIPLIER)   # increase wind factor effect
-        self.wind_factor = self.adjust(self.wind_factor, k=0.02, center=10)
-        self.gust_factor = max((wind_gusts), 0) # protect against negative wind factor
-        # self.gust_factor = (self.gust_factor * WIND_FACTOR_MULTIPLIER)   # increase wind factor effect
-        self.gust_factor = self.adjust(self.gust_factor, k=0.02, center=10)
-
-    def _calc_gusting(self):
-        if time.ticks_ms() - self.start_time > self.delay:
-            self.start_time = time.ticks_ms()
-            self.gust_ramp = random.randint(GUST_LENGTH_LOW, GUST_LENGTH_HIGH) * 0.25
-            if not self.gusting:
-                self.gusting = True
-                self.gust_factor = self.gust_factor * random.uniform(0.8, 1.2) # add some randomness to gust factor
-                self.delay = random.randint(GUST_LENGTH_LOW, GUST_LENGTH_HIGH)
-                print("Gusting for", self.delay / 1000, "secs")
-            elif self.gusting:
-                self.gusting = False
-                self.delay = random.randint(GUST_INTERVAL_LOW, GUST_INTERVAL_HIGH)
-                print("Next gust in", self.delay / 1000, "secs") 
-        return self.wind_factor
-    
-    def get_wind_factor(self):
-        self._calc_gusting()
-        if self.gusting:
-            # gust, reduced by the full difference with wind at first, then down to no reduction at 1/4 time
-            difference = ( self.gust_factor - self.wind_factor )
-            percent = max(( 1- (time.ticks_ms() - self.start_time) / self.gust_ramp ), 0) 
-            factor = self.gust_factor - ( difference * percent )
-        else:
-            # wind, increased by the full difference with gusts at first, then down to no increase at 1/4 time
-            difference = ( self.gust_factor - self.wind_factor )
-            percent = max(( 1 - (time.ticks_ms() - self.start_time) / self.gust_ramp ), 0) 
-            factor = self.wind_factor + ( difference * percent )
-        # factor = factor * random.uniform(0.85, 1.0) # add some randomness
-        return factor
-    
-def red_light():
-        global wind_manager
-        factor = wind_manager.get_wind_factor()
-        red_pwm.duty( 100 - min(random.uniform(93-factor, 100), 100) )
-        red_pwm_2.duty(100 - min(random.uniform(93-factor, 100) , 100) ) 
-        rand_flicker_sleep()
- 
-def green_light():
-        global wind_manager
-        factor = wind_manager.get_wind_factor()
-        green_pwm.duty( 100 - min(random.uniform(33-factor, 34) ,100) )
-        green_pwm_2.duty(100 - min(random.uniform(33-factor, 34) ,100) )
-        rand_flicker_sleep()
- 
-def rand_flicker_sleep():
-    time.sleep(random.randint(3, 10) / 100.0)
-
-def light_candle():
-    gc.collect()
-    print("Starting candle thread")
-    while terminateThread == False:
-        red_light()
-        green_light()
-        time.sleep_ms(1)
+def render_frame():
+    # compose all six channels for one timestamp, then commit them back-to-back
+    factor = wind_manager.get_wind_factor()
+    leds.write(flicker_engine.compose(factor))
+    return factor
 
-wind_manager = WindManager()
+candle = make_scheduler(RENDER_BACKEND, render_frame)
+wind_manager = WindManager(on_change=flicker_engine.set_wind)
 
 async def main():
     wdt.feed()
@@ -394,6 +316,7 @@ async def main():
                 print(f"Speed: {wind_speed * 2.23693629:.2f} mph, Gusts: {wind_gusts * 2.23693629:.2f} mph") 
                 print(f"Speed {wind_speed:.2f} m/s, Gusts {wind_gusts:.2f} m/s")
                 print("Wind factor:", wind_manager.wind_factor, "Gust factor:", wind_manager.gust_factor)
+                candle.report()
             else:
                 print('No weather data available')
         except Exception as e:
@@ -406,7 +329,7 @@ wdt = WDT(timeout=8388)  # 8-second watchdog timer
 loop = asyncio.get_event_loop()
 # Create a task to run the main function
 loop.create_task(main())
-_thread.start_new_thread(light_candle, ())
+candle.start()
 
 try:
     # Run the event loop indefinitely
@@ -414,10 +337,10 @@ try:
 except Exception as e:
     print('Error occurred: ', e)
 except KeyboardInterrupt:
+    candle.stop()
     red_pwm.duty(100)
     red_pwm_2.duty(100)
     green_pwm.duty(100)
     green_pwm_2.duty(100)
     print('Program Interrupted by the user')
-    terminateThread = True
 
@@ -11,8 +11,10 @@ import struct
 from machine import ADC, Timer, Pin, WDT
 import _thread
 import gc
+from array import array
+from snapshot import Snapshot
 
-version = "1.0.14"
+version = "1.0.17"
 print("Wind Sensor BLE - Version:", version)
 
 wdt = WDT(timeout=8388)  # enable watchdog timer - max timeout
@@ -26,7 +28,9 @@ if switch_pin.value() == True:
 else:
     mode = 'modern_device_rev_C'
 
-lock = _thread.allocate_lock()
+# anemometer thread -> sensor task handoff, wind speed in hundredths of m/s
+wind_state = Snapshot(1)
+wind_reading = array('i', [0])
 
 terminateThread = False
 
@@ -82,39 +86,42 @@ if mode == 'modern_device_rev_C':
 
 wind_speed_meters_per_second = 0.0
 
-def read_anemometer():
-    global wind_speed_meters_per_second
-    global terminateThread
-    global lock
+def count_pulses(pin, state, window_ms, poll_ms=10):
+    # Falling edges over one window. Left as bytecode: the loop spends nearly all
+    # of its time in sleep_ms(), so native code would not make it faster.
     import time
     pulse_count = 0
+    last_state = state[0]
+    start = time.ticks_ms()
+    while time.ticks_diff(time.ticks_ms(), start) <= window_ms:
+        current_state = pin.value()
+        if last_state == 1 and current_state == 0:
+            pulse_count += 1
+        last_state = current_state
+        time.sleep_ms(poll_ms)  # Small delay to avoid busy-waiting
+    state[0] = last_state
+    return pulse_count
+
+def read_anemometer():
+    global terminateThread
     sample_interval_ms = 1000  # Sample every 1 second
-    last_time = time.ticks_ms()
 
     anemometer_pin = Pin(15, Pin.IN, Pin.PULL_UP)
 
-    last_state = anemometer_pin.value()
+    state = bytearray(1)  # last pin level, carried across sample windows
+    state[0] = anemometer_pin.value()
     
     while not terminateThread:
-        gc.collect()
-        current_state = anemometer_pin.value()
-        if last_state == 1 and current_state == 0:
-            pulse_count += 1
-        last_state = current_state
-        time.sleep(0.01)  # Small delay to avoid busy-waiting
-        if time.ticks_diff(time.ticks_ms(), last_time) > sample_interval_ms:
-            last_time = time.ticks_ms()
-            lock.acquire()   # try to acquire lock - wait if in use
-            # Calculate wind speed in m/s 
-            wind_speed_meters_per_second = pulse_count / (sample_interval_ms/1000) * 2 # double windspeed for effect
-            wind_speed_meters_per_second = round(wind_speed_meters_per_second, 2)
-            lock.release()   # release lock
-            print("Anemometer - Pulses:", pulse_count, "Wind Speed (m/s):", wind_speed_meters_per_second)
-            pulse_count = 0  # Reset count for next interval   
+        gc.collect()  # once per window, the polling itself does not allocate
+        pulse_count = count_pulses(anemometer_pin, state, sample_interval_ms)
+        # Calculate wind speed in m/s 
+        wind_speed = pulse_count / (sample_interval_ms/1000) * 2 # double windspeed for effect
+        wind_state.publish((round(wind_speed * 100),)) # never waits for the sensor task
+        print("Anemometer - Pulses:", pulse_count, "Wind Speed (m/s):", round(wind_speed, 2))
 
 # Get wind and update characteristic
 async def sensor_task():
-    global zero_offset, wind_speed_meters_per_second, lock
+    global zero_offset, wind_speed_meters_per_second
     while True:
         gc.collect()
         wdt.feed()
@@ -129,11 +136,10 @@ async def sensor_task():
             wind_speed_meters_per_second = round(wind_speed_meters_per_second, 2) # round to 2 decimal places
             print("Calibrated raw wind:", wind, "Wind speed (m/s):", wind_speed_meters_per_second)
         elif mode == 'anemometer':
-            pass
-        lock.acquire() # try to acquire lock - wait if in use
+            if wind_state.read(wind_reading) >= 0: # otherwise keep the last speed, a new one is on its way
+                wind_speed_meters_per_second = wind_reading[0] / 100
         wind_characteristic.write(_encode_value(wind_speed_meters_per_second), send_update=True)
         print("Sent:", wind_speed_meters_per_second)
-        lock.release()   # release lock
         await asyncio.sleep_ms(1000)
         
 # Serially wait for connections. Don't advertise while a central is connected.
@@ -0,0 +1,192 @@
+# Rob Faludi 2025
+# Short overlay effects on top of the candle, composited on the render core.
+# The asyncio side posts overlays into a single-producer single-consumer ring,
+# the render loop adopts them at its next frame, keeps them in a small stack
+# ordered by priority and blends each one into the composed duty values before
+# they are written. Overlays are time-bounded and have a per-frame time budget,
+# nothing here touches the PWM channels directly.
+
+from array import array
+import time
+from palette import level_index
+
+QUEUE_SLOTS = 8  # overlays posted but not yet adopted by the render loop
+MAX_ACTIVE = 4  # overlays running at once, lower priorities make way for higher ones
+EFFECT_BUDGET_US = 1500  # render time per frame all running overlays may claim together
+OVERRUN_LIMIT = 3  # frames over its own budget before an overlay is dropped
+CHANNELS_PER_SET = 3
+
+PRIORITY_STATUS = 10
+PRIORITY_ALERT = 20
+
+
+class Overlay:
+    # Base class. apply() runs on the render core every frame: it must only do
+    # small int arithmetic, so it never allocates.
+    priority = 0
+    budget_us = 300  # declared cost of one apply(), checked every frame
+
+    def __init__(self, duration_ms, priority=None):
+        self.duration_ms = duration_ms
+        if priority is not None:
+            self.priority = priority
+        self.started = 0
+        self.admitted = False  # fits the stack budget, set by EffectStack
+        self.overruns = 0
+
+    def apply(self, frame, elapsed_ms):
+        raise NotImplementedError
+
+
+def color_targets(engine, red, green, blue):
+    # perceived brightness percent per channel to the engine's output values
+    gamma = engine.gamma
+    return array('H', (gamma[level_index(red)], gamma[level_index(green)], gamma[level_index(blue)]))
+
+
+def _blend(frame, start, targets, weight):
+    # move one LED set towards targets, weight 0..256
+    value = frame[start]
+    frame[start] = value + (((targets[0] - value) * weight) >> 8)
+    value = frame[start + 1]
+    frame[start + 1] = value + (((targets[1] - value) * weight) >> 8)
+    value = frame[start + 2]
+    frame[start + 2] = value + (((targets[2] - value) * weight) >> 8)
+
+
+def _triangle(phase, period):
+    # 0..256..0 over one period
+    half = period >> 1
+    if phase < half:
+        return (phase << 8) // half
+    return ((period - phase) << 8) // (period - half)
+
+
+class EarthquakePulse(Overlay):
+    # Slow red pulses over the whole lantern, more and stronger for bigger quakes
+    priority = PRIORITY_ALERT
+    PULSE_MS = 900
+
+    def __init__(self, engine, magnitude, color=(100, 25, 0)):
+        pulses = min(max(int(magnitude) - 1, 1), 6)
+        super().__init__(pulses * self.PULSE_MS)
+        self.targets = color_targets(engine, *color)
+        self.strength = min(max(int((magnitude - 2) * 48), 96), 256)
+        self.channels = len(engine.frame)
+
+    def apply(self, frame, elapsed_ms):
+        weight = (_triangle(elapsed_ms % self.PULSE_MS, self.PULSE_MS) * self.strength) >> 8
+        targets = self.targets
+        for start in range(0, self.channels, 3):  # literal step keeps the loop allocation-free
+            _blend(frame, start, targets, weight)
+
+
+class Shimmer(Overlay):
+    # A soft wave running across the LED sets, e.g. when a connection comes up
+    priority = PRIORITY_STATUS
+    PERIOD_MS = 500
+
+    def __init__(self, engine, duration_ms=1500, color=(0, 40, 100), strength=160):
+        super().__init__(duration_ms)
+        self.targets = color_targets(engine, *color)
+        self.strength = strength
+        self.channels = len(engine.frame)
+        self.step = self.PERIOD_MS * CHANNELS_PER_SET // self.channels  # phase offset between sets
+
+    def apply(self, frame, elapsed_ms):
+        targets = self.targets
+        period = self.PERIOD_MS
+        phase = elapsed_ms
+        for start in range(0, self.channels, 3):  # literal step keeps the loop allocation-free
+            weight = (_triangle(phase % period, period) * self.strength) >> 8
+            _blend(frame, start, targets, weight)
+            phase += self.step
+
+
+class EffectStack:
+    def __init__(self, slots=QUEUE_SLOTS, max_active=MAX_ACTIVE, budget_us=EFFECT_BUDGET_US):
+        # ring written only by post() (asyncio side), read only by apply() (render core)
+        self.queue = [None] * slots
+        self.head = 0  # next slot to adopt, advanced by the render core
+        self.tail = 0  # next slot to fill, advanced by the asyncio side
+        self.active = [None] * max_active  # ascending priority, so higher ones blend last
+        self.count = 0
+        self.budget_us = budget_us
+        self.rejected = 0  # posts refused because the ring was full
+        self.dropped = 0  # overlays displaced by higher priorities or dropped for overruns
+
+    def post(self, overlay):
+        """Queue an overlay from the asyncio side. Returns False if the ring is full."""
+        tail = self.tail
+        following = (tail + 1) % len(self.queue)
+        if following == self.head:
+            self.rejected += 1
+            return False
+        self.queue[tail] = overlay
+        self.tail = following  # publish only once the slot is filled
+        return True
+
+    def _adopt(self, overlay, now):
+        active = self.active
+        if self.count == len(active):
+            if overlay.priority <= active[0].priority:
+                self.dropped += 1
+                return
+            self._remove(0)
+        overlay.started = now
+        i = self.count
+        while i > 0 and active[i - 1].priority > overlay.priority:
+            active[i] = active[i - 1]
+            i -= 1
+        active[i] = overlay
+        self.count += 1
+        self._admit()
+
+    def _remove(self, index):
+        active = self.active
+        for i in range(index, self.count - 1):
+            active[i] = active[i + 1]
+        self.count -= 1
+        active[self.count] = None
+        self._admit()
+
+    def _admit(self):
+        # hand out the frame budget from the highest priority down
+        remaining = self.budget_us
+        for i in range(self.count - 1, -1, -1):
+            overlay = self.active[i]
+            overlay.admitted = overlay.budget_us <= remaining
+            if overlay.admitted:
+                remaining -= overlay.budget_us
+
+    def apply(self, frame):
+        # render core: blend every running overlay into the composed frame
+        queue = self.queue
+        if self.count == 0 and self.head == self.tail:
+            return frame
+        now = time.ticks_ms()
+        while self.head != self.tail:
+            head = self.head
+            overlay = queue[head]
+            queue[head] = None
+            self.head = (head + 1) % len(queue)
+            self._adopt(overlay, now)
+        active = self.active
+        i = 0
+        while i < self.count:
+            overlay = active[i]
+            elapsed = time.ticks_diff(now, overlay.started)
+            if elapsed >= overlay.duration_ms:
+                self._remove(i)
+                continue
+            if overlay.admitted:
+                start = time.ticks_us()
+                overlay.apply(frame, elapsed)
+                if time.ticks_diff(time.ticks_us(), start) > overlay.budget_us:
+                    overlay.overruns += 1
+                    if overlay.overruns >= OVERRUN_LIMIT:
+                        self.dropped += 1
+                        self._remove(i)
+                        continue
+            i += 1
+        return frame
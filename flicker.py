@@ -0,0 +1,261 @@
+# Rob Faludi 2025
+# Precomputed candle flicker waveforms for the Wind Lantern render loop.
+# Flicker based on code from Grant Whitney
+# https://grantwinney.com/raspberry-pi-flickering-candle/
+
+from array import array
+import gc
+import random
+import time
+from effects import EarthquakePulse, EffectStack, Shimmer
+from palette import GAMMA, gamma_table, get_palette, level_index
+from render import FrameStats, ThreadScheduler
+from wind import FACTOR_ONE, FACTOR_SHIFT, SteppingClock, WindManager, to_fixed
+from xorshift import XorShift16
+
+FACTOR_BUCKETS = 32  # one bucket per whole unit of wind factor, 0..31
+_HALF = FACTOR_ONE // 2
+TABLE_LENGTH = 64  # flicker samples stored per bucket and channel
+LED_SETS = 2
+CHANNELS_PER_SET = 3  # frame order is red, green, blue for each LED set
+
+
+def percent_to_u16(percent_duty):
+    return int(percent_duty / 100 * 65535)
+
+
+def _compose_frame(engine, index, offset):
+    # Pure Python fallback for hotpath.compose_frame
+    length = engine.table_length
+    frame = engine.frame
+    phases = engine.phases
+    red, green, blue = engine.tables
+    channel = 0
+    for i in range(engine.sets):
+        position = offset + (index + phases[i]) % length
+        frame[channel] = red[position]
+        frame[channel + 1] = green[position]
+        frame[channel + 2] = blue[position]
+        channel += CHANNELS_PER_SET
+
+
+try:
+    from hotpath import compose_frame
+except (ImportError, SyntaxError):  # CPython, or a port without the native emitter
+    compose_frame = _compose_frame
+
+
+class _NullChannel:
+    # Stand-in for a PWM channel, used for benchmarking without touching pins
+    def duty_u16(self, value):
+        pass
+
+
+class FlickerEngine:
+    # Compiles a palette and a gamma curve into duty_u16 waveform tables, one per
+    # colour channel. LED sets share the tables at different phases.
+    FULL_SCALE = 65535
+    INVERTED = True  # common anode LEDs, full duty is off
+
+    def __init__(self, sets=LED_SETS, palette='candle', gamma=GAMMA,
+                 table_length=TABLE_LENGTH, buckets=FACTOR_BUCKETS, seed=None):
+        self.sets = sets
+        self.rng = XorShift16(seed)
+        self.seed = self.rng.state  # table rows are drawn from this, see _fill()
+        self.table_length = table_length
+        self.buckets = buckets
+        self.levels = get_palette(palette)
+        self.curve = gamma
+        self.brightness = FACTOR_ONE
+        self.gamma = gamma_table(gamma, self.FULL_SCALE, self.INVERTED)
+        size = table_length * buckets
+        if self.FULL_SCALE > 255:
+            self.tables = [array('H', bytes(2 * size)) for _ in range(CHANNELS_PER_SET)]
+        else:
+            self.tables = [bytearray(size) for _ in range(CHANNELS_PER_SET)]
+        self.frame = self._frame_buffer()
+        self._scratch = array('H', bytes(2 * table_length))  # one row of level indexes, see _fill()
+        self.phases = array('H', [table_length * i // sets for i in range(sets)])
+        self.low_bucket = 0
+        self.high_bucket = buckets - 1
+        self.index = 0
+        self.rebuild(0, (buckets - 1) << FACTOR_SHIFT)
+
+    def _frame_buffer(self):
+        return array('H', bytes(2 * CHANNELS_PER_SET * self.sets))  # composed duty_u16 values
+
+    def bucket(self, factor):
+        # quantize a fixed-point wind factor to a table row
+        row = (factor + _HALF) >> FACTOR_SHIFT
+        if row <= 0:
+            return 0
+        if row >= self.buckets:
+            return self.buckets - 1
+        return row
+
+    def _fill(self, table, row, channel, low, high):
+        # draw gamma table indexes in one batch into the scratch row, then write their
+        # duty values over the live row. The render core may be reading that row, so it
+        # must only ever hold finished duty values, never raw indexes.
+        # Each row restarts from its own seed, so engines sharing a seed build the
+        # same tables however their wind history differs.
+        start = row * self.table_length
+        scratch = self._scratch
+        self.rng.seed(self.seed + row * 0x9E37 + channel * 0x61C9)
+        self.rng.fill(scratch, level_index(low), level_index(high))
+        gamma = self.gamma
+        for i in range(self.table_length):
+            table[start + i] = gamma[scratch[i]]
+
+    def rebuild(self, low_factor, high_factor):
+        """Refill the waveform rows covering low_factor..high_factor (fixed point)."""
+        low = self.bucket(low_factor)
+        high = self.bucket(high_factor)
+        if low > high:
+            low, high = high, low
+        for row in range(low, high + 1):
+            for channel in range(CHANNELS_PER_SET):
+                level_low, level_high, slope = self.levels[channel]
+                self._fill(self.tables[channel], row, channel, level_low - slope * row, level_high)
+        self.low_bucket = low
+        self.high_bucket = high
+
+    def set_wind(self, wind_factor, gust_factor):
+        # cover everything the gust model can reach, gusts vary up to 20% at random
+        low = min(wind_factor, gust_factor)
+        high = max(wind_factor, gust_factor) * 6 // 5 + FACTOR_ONE
+        if self.bucket(low) == self.low_bucket and self.bucket(high) == self.high_bucket:
+            return  # tables already cover this wind
+        self.rebuild(low, high)
+
+    def reseed(self, seed):
+        # draw the tables from a new seed, e.g. one shared by synchronized lanterns
+        self.seed = seed & 0xFFFF
+        self._recompile()
+
+    def _recompile(self):
+        self.rebuild(self.low_bucket << FACTOR_SHIFT, self.high_bucket << FACTOR_SHIFT)
+
+    def set_brightness(self, brightness):
+        # 0..FACTOR_ONE, dims the gamma curve so dimming costs nothing per frame
+        self.brightness = brightness
+        self.gamma = gamma_table(self.curve, self.FULL_SCALE, self.INVERTED, brightness / FACTOR_ONE)
+        self._recompile()
+
+    def set_palette(self, palette):
+        self.levels = get_palette(palette)
+        self._recompile()
+
+    def set_level(self, channel, low, high=None, slope=0):
+        # override one channel of the palette, e.g. set_level(BLUE, 0) turns blue off
+        self.levels[channel] = (low, low if high is None else high, slope)
+        self._recompile()
+
+    def compose(self, factor):
+        # Fill self.frame with every channel of every LED set for one wind factor
+        length = self.table_length
+        self.index = (self.index + 1) % length
+        compose_frame(self, self.index, self.bucket(factor) * length)
+        return self.frame
+
+
+def _legacy_frame(red, green, factor):
+    # The original per-frame work, kept for comparison in benchmark()
+    factor = factor / FACTOR_ONE
+    for channel in red:
+        channel.duty_u16(percent_to_u16(100 - min(random.uniform(93 - factor, 100), 100)))
+    random.randint(3, 10) / 100.0
+    for channel in green:
+        channel.duty_u16(percent_to_u16(100 - min(random.uniform(33 - factor, 34), 100)))
+    random.randint(3, 10) / 100.0
+
+
+def _null_group():
+    from pulse import PulseGroup
+    return PulseGroup(*[_NullChannel() for _ in range(LED_SETS * CHANNELS_PER_SET)])
+
+
+def benchmark(frames=2000, factor=6):
+    """Compare the legacy random/float frame with the composed table frame.
+    Uses null channels and no sleeps, so the numbers are pure CPU cost."""
+    red = (_NullChannel(), _NullChannel())
+    green = (_NullChannel(), _NullChannel())
+    engine = FlickerEngine()
+    leds = _null_group()
+    factor = to_fixed(factor)
+    engine.set_wind(factor, factor)
+    results = {}
+
+    start = time.ticks_us()
+    for _ in range(frames):
+        _legacy_frame(red, green, factor)
+    results['legacy'] = time.ticks_diff(time.ticks_us(), start)
+
+    start = time.ticks_us()
+    for _ in range(frames):
+        leds.write(engine.compose(factor))
+    results['tables'] = time.ticks_diff(time.ticks_us(), start)
+
+    def render_frame():
+        leds.write(engine.compose(factor))
+        return factor
+
+    # the same frame through a scheduler, to show the cost of the render statistics
+    for name, stats in (('scheduled', FrameStats()), ('scheduled, stats off', FrameStats(enabled=False))):
+        frame = ThreadScheduler(render_frame, stats=stats)._frame
+        start = time.ticks_us()
+        for _ in range(frames):
+            frame()
+        results[name] = time.ticks_diff(time.ticks_us(), start)
+
+    for name, elapsed in results.items():
+        per_frame = elapsed / frames
+        print(f"{name}: {frames} frames, {per_frame:.1f} us/frame, {1000000 / per_frame:.0f} frames/s")
+    print(f"commit: {leds.max_commit_us} us max from first to last channel write")
+    return results
+
+
+def check_allocations(frames=3000, step_ms=100, min_phases=4):
+    """Run the render path for a number of frames and fail if it touched the heap.
+    The wind follows a SteppingClock, so the frames cross several gust phases and
+    adopt a wind change halfway through one, with overlays blended in throughout.
+    Run on the device, e.g. `import flicker; flicker.check_allocations()`."""
+    engine = FlickerEngine()
+    leds = _null_group()
+    manager = WindManager(on_change=engine.set_wind, seed=1, clock=SteppingClock(step_ms))
+    manager.set_wind(4.5, 9.2)
+    effects = EffectStack()
+
+    def render_frame():
+        factor = manager.get_wind_factor()
+        leds.write(effects.apply(engine.compose(factor)))
+        return factor
+
+    # run frames through a scheduler so its stats and the frame governor are covered too
+    frame = ThreadScheduler(render_frame)._frame
+    frame()  # first call starts a gust phase
+    effects.post(Shimmer(engine, duration_ms=frames * step_ms))  # adopted by the first counted frame
+    allocated = 0
+    phases = 0
+    gc.collect()
+    gc.disable()
+    try:
+        for count in range(frames):
+            if count == frames // 2:
+                # asyncio side work, not counted: the render side adopts both next frame
+                manager.set_wind(9.8, 16.5)
+                effects.post(EarthquakePulse(engine, 5.5))
+            started = manager.start_time
+            before = gc.mem_alloc()
+            frame()
+            allocated += gc.mem_alloc() - before
+            if manager.start_time != started:
+                phases += 1
+    finally:
+        gc.enable()
+    if allocated:
+        raise AssertionError(f"render path allocated {allocated} bytes over {frames} frames")
+    if phases < min_phases:
+        raise AssertionError(f"only {phases} gust phases in {frames} frames, run more frames")
+    print(f"No allocations over {frames} frames and {phases} gust phases")
+    return True
@@ -0,0 +1,99 @@
+# Rob Faludi 2025
+# Hourly wind forecast buffer for the NatureAPI lantern.
+# One get_weather call pulls FORECAST_DAYS of hourly wind speed and gusts, kept
+# as two small integer arrays. The lantern interpolates its wind locally between
+# the hours and only goes back to the network when the series runs short or the
+# location changes, so it keeps following the weather through Wi-Fi outages.
+
+from array import array
+import time
+
+FORECAST_DAYS = 2  # Open-Meteo hourly series start at midnight UTC today
+REFRESH_HOURS = 6  # refetch once fewer hours than this are left
+KPH_TO_CMS = 27.778  # km/h to hundredths of m/s
+SECONDS_PER_HOUR = 3600
+
+
+class WindForecast:
+    def __init__(self):
+        self.speeds = array('H')  # hundredths of m/s, one per hour
+        self.gusts = array('H')
+        self.start = 0  # UTC seconds of the first hour
+        self.location = None  # (latitude, longitude) the series is for
+        self.fetched_at = None
+        self.fetches = 0
+
+    def __len__(self):
+        return len(self.speeds)
+
+    def load(self, speeds_kph, gusts_kph, start, location=None):
+        """Store an hourly series in km/h, as returned by Open-Meteo, from UTC seconds start."""
+        count = min(len(speeds_kph), len(gusts_kph))
+        speeds = array('H', bytes(2 * count))
+        gusts = array('H', bytes(2 * count))
+        last_speed = last_gust = 0
+        for i in range(count):
+            # the odd missing hour takes the one before it
+            if speeds_kph[i] is not None:
+                last_speed = min(int(speeds_kph[i] * KPH_TO_CMS + 0.5), 0xFFFF)
+            if gusts_kph[i] is not None:
+                last_gust = min(int(gusts_kph[i] * KPH_TO_CMS + 0.5), 0xFFFF)
+            speeds[i] = last_speed
+            gusts[i] = last_gust
+        self.speeds = speeds
+        self.gusts = gusts
+        self.start = start
+        self.location = location
+
+    def fetch(self, client, location=None, now=None):
+        # one request for the whole series; raises if there is nothing usable
+        self._store(client.get_weather(*self._request()), location, now)
+
+    async def fetch_async(self, client, location=None, now=None):
+        # the same with a nature_api.AsyncClient
+        self._store(await client.get_weather(*self._request()), location, now)
+
+    def _request(self):
+        return "hourly", "wind_speed_10m,wind_gusts_10m", FORECAST_DAYS, SECONDS_PER_HOUR
+
+    def _store(self, series, location, now):
+        now = time.time() if now is None else now
+        speeds = series.get('wind_speed_10m') if series else None
+        gusts = series.get('wind_gusts_10m') if series else None
+        if not speeds or not gusts:
+            raise ValueError("No hourly wind in the forecast")
+        self.load(speeds, gusts, now - now % 86400, location)
+        self.fetched_at = now
+        self.fetches += 1
+
+    def hours_left(self, now=None):
+        now = time.time() if now is None else now
+        return len(self.speeds) - 1 - (now - self.start) / SECONDS_PER_HOUR
+
+    def needs_refresh(self, location=None, now=None):
+        if not self.speeds:
+            return True
+        if location is not None and location != self.location:
+            return True
+        return self.hours_left(now) < REFRESH_HOURS
+
+    def seconds_to_refresh(self, now=None):
+        # until needs_refresh() turns true for the same location
+        if not self.speeds:
+            return 0
+        return max(0, (self.hours_left(now) - REFRESH_HOURS) * SECONDS_PER_HOUR)
+
+    def wind_at(self, now=None):
+        """(speed, gusts) in m/s for UTC seconds now, interpolated between the hours.
+        Returns None outside the series."""
+        now = time.time() if now is None else now
+        offset = now - self.start
+        hour = int(offset // SECONDS_PER_HOUR)
+        if offset < 0 or hour >= len(self.speeds) - 1:
+            return None
+        fraction = (offset - hour * SECONDS_PER_HOUR) / SECONDS_PER_HOUR
+        speeds = self.speeds
+        gusts = self.gusts
+        speed = speeds[hour] + (speeds[hour + 1] - speeds[hour]) * fraction
+        gust = gusts[hour] + (gusts[hour + 1] - gusts[hour]) * fraction
+        return speed / 100, gust / 100
@@ -0,0 +1,14 @@
+# Rob Faludi 2025
+# Tools that run on a computer rather than on the lantern. They import the
+# firmware modules from the repository root, so run them from there, e.g.
+# python -m host.wind_sim
+
+import time
+
+if not hasattr(time, 'ticks_ms'):
+    # MicroPython's tick functions, so the firmware modules run unchanged
+    _TICKS_PERIOD = 1 << 30
+    time.ticks_ms = lambda: time.monotonic_ns() // 1000000 % _TICKS_PERIOD
+    time.ticks_us = lambda: time.monotonic_ns() // 1000 % _TICKS_PERIOD
+    time.ticks_add = lambda ticks, delta: (ticks + delta) % _TICKS_PERIOD
+    time.ticks_diff = lambda end, start: (end - start + _TICKS_PERIOD // 2) % _TICKS_PERIOD - _TICKS_PERIOD // 2
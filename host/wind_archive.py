@@ -0,0 +1,167 @@
+# Rob Faludi 2025
+# Years of hourly wind for lantern addresses, to check flicker tuning against
+# real weather. Downloads the Open-Meteo archive through nature_api a chunk at a
+# time and writes each chunk straight into a columnar file per site: a small
+# header, an int32 column of UTC hours since 1970 and a float32 column per
+# variable. Files are read back through numpy.memmap, so a sweep over many sites
+# only pages in the hours it touches. Needs NumPy and requests.
+# Run from the repository root, e.g.
+# python -m host.wind_archive archive "350 5th Avenue, New York, NY" 2015-01-01 2024-12-31
+
+import argparse
+import datetime
+import os
+import re
+import struct
+import numpy as np
+from nature_api import Client
+
+COLUMNS = ('wind_speed_10m', 'wind_gusts_10m')  # stored in m/s
+CHUNK_DAYS = 92  # archive days per request
+KPH_TO_MS = 1 / 3.6
+MAGIC = b'WLWA'
+FORMAT_VERSION = 1
+# magic, version, columns, rows, rows filled, first hour, latitude, longitude, address
+HEADER = struct.Struct('<4sHHiiidd128s')
+HEADER_SIZE = 256  # columns start here
+_FILLED_OFFSET = 12  # of rows filled in the header
+_EPOCH = datetime.date(1970, 1, 1)
+
+
+def hour_of(date):
+    # UTC hours since 1970 at the start of a date
+    return (date - _EPOCH).days * 24
+
+
+class WindArchive:
+    # One site's hourly series. time and each column are memmaps over the file.
+    def __init__(self, path, mode='r'):
+        self.path = path
+        self.mode = mode
+        with open(path, 'rb') as f:
+            fields = HEADER.unpack(f.read(HEADER.size))
+        magic, version, columns, self.rows, self.filled, self.first_hour, self.latitude, self.longitude, address = fields
+        if magic != MAGIC or version != FORMAT_VERSION or columns != len(COLUMNS):
+            raise ValueError(f"{path} is not a version {FORMAT_VERSION} wind archive")
+        self.address = address.rstrip(b'\0').decode()
+        shape = (self.rows,)
+        self.time = np.memmap(path, np.int32, mode, HEADER_SIZE, shape)
+        self.columns = {name: np.memmap(path, np.float32, mode, HEADER_SIZE + 4 * self.rows * (i + 1), shape)
+                        for i, name in enumerate(COLUMNS)}
+
+    @classmethod
+    def create(cls, path, address, latitude, longitude, start, end):
+        """A new file for the dates start..end inclusive, all hours missing (NaN)."""
+        first_hour = hour_of(start)
+        rows = hour_of(end) + 24 - first_hour
+        with open(path, 'wb') as f:
+            f.write(HEADER.pack(MAGIC, FORMAT_VERSION, len(COLUMNS), rows, 0, first_hour,
+                                latitude, longitude, address.encode()[:128]).ljust(HEADER_SIZE, b'\0'))
+            f.truncate(HEADER_SIZE + 4 * rows * (len(COLUMNS) + 1))
+        archive = cls(path, 'r+')
+        archive.time[:] = first_hour + np.arange(rows, dtype=np.int32)
+        for column in archive.columns.values():
+            column[:] = np.nan
+        archive.flush()
+        return archive
+
+    @property
+    def speed(self):
+        return self.columns['wind_speed_10m']
+
+    @property
+    def gusts(self):
+        return self.columns['wind_gusts_10m']
+
+    @property
+    def start(self):
+        return _EPOCH + datetime.timedelta(hours=self.first_hour)
+
+    def flush(self):
+        # data first, then the header that says how much of it there is
+        self.time.flush()
+        for column in self.columns.values():
+            column.flush()
+        with open(self.path, 'r+b') as f:
+            f.seek(_FILLED_OFFSET)
+            f.write(struct.pack('<i', self.filled))
+
+    def write(self, row, values):
+        """Store a chunk of rows from row, values maps column names to sequences (None is missing)."""
+        count = 0
+        for name in COLUMNS:
+            chunk = np.array([np.nan if value is None else value for value in values[name]], np.float32)
+            count = min(len(chunk), self.rows - row)
+            self.columns[name][row:row + count] = chunk[:count]
+        self.filled = max(self.filled, row + count)
+        self.flush()
+        return count
+
+
+def site_path(directory, address):
+    return os.path.join(directory, re.sub(r'[^a-z0-9]+', '_', address.lower()).strip('_') + '.wind')
+
+
+def download(client, directory, address, start, end, chunk_days=CHUNK_DAYS):
+    """Fill the archive file for an address with hourly wind for start..end (dates),
+    picking up where an earlier, interrupted download of the same range stopped."""
+    client.location = None  # set_location() keeps the last one if the lookup fails
+    client.set_location(address)
+    if not client.location:
+        raise ValueError(f"Could not find {address}")
+    latitude = float(client.location['latitude'])
+    longitude = float(client.location['longitude'])
+    path = site_path(directory, address)
+    archive = None
+    if os.path.exists(path):
+        archive = WindArchive(path, 'r+')
+        if archive.first_hour != hour_of(start) or archive.rows != hour_of(end) + 24 - hour_of(start):
+            archive = None  # a different range, start again
+    if archive is None:
+        os.makedirs(directory, exist_ok=True)
+        archive = WindArchive.create(path, address, latitude, longitude, start, end)
+    while archive.filled < archive.rows:
+        first = start + datetime.timedelta(days=archive.filled // 24)
+        last = min(first + datetime.timedelta(days=chunk_days - 1), end)
+        data = client.get_archive('hourly', list(COLUMNS), first.isoformat(), last.isoformat())
+        for name in COLUMNS:
+            data[name] = [None if value is None else value * KPH_TO_MS for value in data[name] or ()]
+        expected = hour_of(last) + 24 - hour_of(first)
+        if len(data[COLUMNS[0]]) != expected:
+            raise ValueError(f"Expected {expected} hours for {first}..{last}, got {len(data[COLUMNS[0]])}")
+        archive.write(hour_of(first) - archive.first_hour, data)
+        print(f"{address}: {first}..{last}, {archive.filled * 100 // archive.rows}%")
+    return archive
+
+
+def open_sites(directory):
+    """Every archive in a directory, read only."""
+    return [WindArchive(os.path.join(directory, name))
+            for name in sorted(os.listdir(directory)) if name.endswith('.wind')]
+
+
+def sample(archives, count, seed=1):
+    """(speeds, gusts) for count random site-hours with both values present,
+    e.g. as the inputs of host.wind_sim.duty_stats()."""
+    rng = np.random.default_rng(seed)
+    bounds = np.cumsum([0] + [archive.filled for archive in archives])
+    picks = np.sort(rng.integers(0, bounds[-1], count * 2))  # sorted, so reads go through each file in order
+    site = np.searchsorted(bounds, picks, side='right') - 1
+    speeds = np.concatenate([archive.speed[picks[site == i] - bounds[i]] for i, archive in enumerate(archives)])
+    gusts = np.concatenate([archive.gusts[picks[site == i] - bounds[i]] for i, archive in enumerate(archives)])
+    chosen = rng.permutation(np.flatnonzero(~(np.isnan(speeds) | np.isnan(gusts))))[:count]
+    return speeds[chosen].astype(np.float64), gusts[chosen].astype(np.float64)
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Download hourly wind history for lantern addresses.")
+    parser.add_argument('directory')
+    parser.add_argument('address', nargs='+')
+    parser.add_argument('start', type=datetime.date.fromisoformat)
+    parser.add_argument('end', type=datetime.date.fromisoformat)
+    args = parser.parse_args()
+    client = Client(None, None)
+    for address in args.address:
+        archive = download(client, args.directory, address, args.start, args.end)
+        print(f"{address}: {archive.rows} hours, mean wind {np.nanmean(archive.speed):.1f} m/s, "
+              f"mean gusts {np.nanmean(archive.gusts):.1f} m/s")
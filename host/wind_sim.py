@@ -0,0 +1,270 @@
+# Rob Faludi 2025
+# Batch simulator of the lantern's gust model and flicker tables, for tuning the
+# constants in wind.py on a computer instead of flashing a Pico and watching it.
+# Needs NumPy. Frames are on a fixed step like wind.SteppingClock, the wind is set
+# once at the start, and for a shared seed the duty values match WindManager and
+# FlickerEngine frame for frame (see verify()). The frame governor's slower
+# calm-wind frame rate is not modelled, the statistics show how often it applies.
+
+from concurrent.futures import ProcessPoolExecutor
+import contextlib
+import io
+import itertools
+import time
+import numpy as np
+import wind
+from flicker import CHANNELS_PER_SET, FACTOR_BUCKETS, LED_SETS, TABLE_LENGTH, FlickerEngine
+from palette import GAMMA, gamma_table, get_palette, level_index
+from render import CALM_FACTOR
+from xorshift import MAX_RANGE
+
+DEFAULTS = {
+    'GUST_INTERVAL_LOW': wind.GUST_INTERVAL_LOW,
+    'GUST_INTERVAL_HIGH': wind.GUST_INTERVAL_HIGH,
+    'GUST_LENGTH_LOW': wind.GUST_LENGTH_LOW,
+    'GUST_LENGTH_HIGH': wind.GUST_LENGTH_HIGH,
+    'COMPRESS_K': 0.02,  # WindManager.adjust() defaults, the curve compress() follows
+    'COMPRESS_CENTER': 10,
+}
+STEP_MS = 100  # render.FRAME_INTERVAL_MS
+CHUNK_VALUES = 1 << 22  # duty values worked out at once, bounds memory
+CHANNEL_NAMES = ('red', 'green', 'blue')
+_PERIOD = 0xFFFF
+_cycle = None
+
+
+def xorshift_cycle():
+    """Every XorShift16 state in the order next() visits them, and the position of each."""
+    global _cycle
+    if _cycle is None:
+        states = np.empty(_PERIOD, np.int64)
+        x = 1
+        for i in range(_PERIOD):
+            states[i] = x
+            x ^= (x << 7) & 0xFFFF
+            x ^= x >> 9
+            x ^= (x << 8) & 0xFFFF
+        positions = np.zeros(0x10000, np.int64)
+        positions[states] = np.arange(_PERIOD)
+        _cycle = (states, positions)
+    return _cycle
+
+
+def draws(seed, count):
+    # the first count next() results after XorShift16.seed(seed)
+    states, positions = xorshift_cycle()
+    seed &= 0xFFFF
+    start = positions[seed or 0xACE1]
+    return states[(start + 1 + np.arange(count)) % _PERIOD]
+
+
+def _randint(values, low, high):
+    # XorShift16.randint on a batch of next() results
+    span = high - low + 1
+    if not 0 < span <= MAX_RANGE:
+        raise ValueError(f"randint range {low}..{high} is more than XorShift16 can draw")
+    return low + (((values >> 2) * span) >> 14)
+
+
+def flicker_tables(seed, palette='candle', gamma=GAMMA):
+    """FlickerEngine's duty tables for a seed, one (buckets * length) row per channel."""
+    seed = (seed & 0xFFFF) or 0xACE1
+    duty = np.asarray(gamma_table(gamma, FlickerEngine.FULL_SCALE, FlickerEngine.INVERTED), np.int64)
+    tables = np.empty((CHANNELS_PER_SET, FACTOR_BUCKETS * TABLE_LENGTH), np.int64)
+    for channel, (level_low, level_high, slope) in enumerate(get_palette(palette)):
+        for row in range(FACTOR_BUCKETS):
+            low = level_index(level_low - slope * row)
+            high = level_index(level_high)
+            values = draws(seed + row * 0x9E37 + channel * 0x61C9, TABLE_LENGTH)
+            start = row * TABLE_LENGTH
+            tables[channel, start:start + TABLE_LENGTH] = duty[_randint(values, low, high)]
+    return tables
+
+
+def compress(speeds, k=DEFAULTS['COMPRESS_K'], center=DEFAULTS['COMPRESS_CENTER']):
+    """WindManager.compress() for an array of speeds in m/s, fixed point."""
+    def adjust(x):
+        return x - k * (x - center) * np.abs(x - center)
+
+    def to_fixed(x):
+        return np.trunc(x * wind.FACTOR_ONE).astype(np.int64)
+
+    table = to_fixed(adjust(np.arange(wind.COMPRESS_ENTRIES + 1) / (1 << wind.COMPRESS_SHIFT)))
+    speeds = np.maximum(np.asarray(speeds, np.float64), 0)
+    inside = speeds < wind.COMPRESS_MAX
+    position = np.trunc(np.where(inside, speeds, 0) * (1 << wind.COMPRESS_SHIFT) * wind.FACTOR_ONE).astype(np.int64)
+    index = position >> wind.FACTOR_SHIFT
+    low = table[index]
+    fitted = low + (((table[np.minimum(index + 1, wind.COMPRESS_ENTRIES)] - low) * (position & (wind.FACTOR_ONE - 1))) >> wind.FACTOR_SHIFT)
+    return np.where(inside, fitted, to_fixed(adjust(speeds)))
+
+
+class GustSchedule:
+    # The gust phases WindManager steps through for a seed, for a batch of winds.
+    # The draws do not depend on the wind, so all inputs share the phase timing.
+    def __init__(self, wind_fp, gust_fp, duration_ms, seed=1, step_ms=STEP_MS, params=None):
+        p = dict(DEFAULTS, **(params or {}))
+        shortest = max(min(p['GUST_INTERVAL_LOW'], p['GUST_LENGTH_LOW']), 1)
+        phases = duration_ms // shortest + 2
+        # the constructor draws a ramp, then calm phases draw (ramp, delay) and
+        # gust phases (ramp, gust randomness, delay), starting with a calm one
+        values = draws(seed, 1 + 5 * (phases // 2 + 1))[1:]
+        pairs = values[:5 * (phases // 2 + 1)].reshape(-1, 5)
+        ramp = np.empty(2 * len(pairs), np.int64)
+        delay = np.empty(2 * len(pairs), np.int64)
+        ramp[0::2] = _randint(pairs[:, 0], p['GUST_LENGTH_LOW'], p['GUST_LENGTH_HIGH']) // 4
+        delay[0::2] = _randint(pairs[:, 1], p['GUST_INTERVAL_LOW'], p['GUST_INTERVAL_HIGH'])
+        ramp[1::2] = _randint(pairs[:, 2], p['GUST_LENGTH_LOW'], p['GUST_LENGTH_HIGH']) // 4
+        multiplier = _randint(pairs[:, 3], 80, 120)
+        delay[1::2] = _randint(pairs[:, 4], p['GUST_LENGTH_LOW'], p['GUST_LENGTH_HIGH'])
+        ramp = ramp[:phases]
+        delay = delay[:phases]
+        # a phase ends at the first frame past its delay, the first starts on frame 1
+        self.starts = step_ms + np.concatenate(([0], np.cumsum((delay // step_ms + 1) * step_ms)[:-1]))
+        self.gusting = np.arange(phases) % 2 == 1
+
+        # the gust level compounds its randomness from gust to gust, with integer division
+        wind_fp = np.asarray(wind_fp, np.int64)[:, None]
+        gust = np.empty((len(wind_fp), phases), np.int64)
+        level = np.asarray(gust_fp, np.int64).copy()
+        for i in range(phases):
+            if i % 2:
+                level = level * multiplier[i // 2] // 100
+            gust[:, i] = level
+        start = np.where(self.gusting, wind_fp, gust)
+        target = np.where(self.gusting, gust, wind_fp)
+        # WindManager._compile(): ramp then hold, or only part of the ramp if the phase is shorter
+        ramped = ramp < delay
+        end = np.where(ramped, target, start + (target - start) * delay // np.maximum(ramp, 1))
+        length = np.where(ramped, ramp, delay)
+        self.slope = ((end - start) << wind.SLOPE_SHIFT) // np.maximum(length, 1)
+        self.slope[:, length == 0] = 0
+        self.start = start
+        self.target = target
+        self.cut = np.where(ramped, ramp, np.iinfo(np.int64).max)  # from here on, hold target
+
+    def factors(self, times):
+        """Wind factors at frame times in ms, one row per input."""
+        phase = np.searchsorted(self.starts, times, side='right') - 1
+        elapsed = times - self.starts[phase]
+        ramping = elapsed < self.cut[phase]
+        ramp = self.start[:, phase] + ((elapsed * self.slope[:, phase]) >> wind.SLOPE_SHIFT)
+        return np.where(ramping, ramp, self.target[:, phase]), self.gusting[phase]
+
+
+def simulate(speeds, gusts, frames, seed=1, step_ms=STEP_MS, params=None, palette='candle'):
+    """Yield (factors, gusting, duties) for successive chunks of frames.
+    factors is (inputs, chunk), duties (inputs, chunk, channels) as written to the PWM."""
+    p = dict(DEFAULTS, **(params or {}))
+    wind_fp = compress(np.atleast_1d(speeds), p['COMPRESS_K'], p['COMPRESS_CENTER'])
+    gust_fp = compress(np.atleast_1d(gusts), p['COMPRESS_K'], p['COMPRESS_CENTER'])
+    schedule = GustSchedule(wind_fp, gust_fp, frames * step_ms, seed, step_ms, p)
+    tables = flicker_tables(seed, palette)
+    phases = np.array([TABLE_LENGTH * i // LED_SETS for i in range(LED_SETS)])
+    chunk = max(CHUNK_VALUES // (len(wind_fp) * LED_SETS * CHANNELS_PER_SET), 1)
+    for first in range(1, frames + 1, chunk):
+        numbers = np.arange(first, min(first + chunk, frames + 1))
+        factors, gusting = schedule.factors(numbers * step_ms)
+        # FlickerEngine.compose(): bucket the factor, then read each set at its phase
+        rows = np.clip((factors + (wind.FACTOR_ONE >> 1)) >> wind.FACTOR_SHIFT, 0, FACTOR_BUCKETS - 1)
+        columns = (numbers[:, None] + phases) % TABLE_LENGTH
+        positions = rows[:, :, None] * TABLE_LENGTH + columns
+        duties = np.stack([tables[channel][positions] for channel in range(CHANNELS_PER_SET)], axis=-1)
+        yield factors, gusting, duties.reshape(len(wind_fp), len(numbers), LED_SETS * CHANNELS_PER_SET)
+
+
+def duty_stats(speeds, gusts, days=1, seed=1, step_ms=STEP_MS, params=None, palette='candle'):
+    """Duty cycle statistics per input and colour over days of frames, in percent."""
+    frames = int(days * 86400000 // step_ms)
+    inputs = len(np.atleast_1d(speeds))
+    shape = (inputs, CHANNELS_PER_SET)
+    total = np.zeros(shape)
+    squares = np.zeros(shape)
+    change = np.zeros(shape)
+    low = np.full(shape, np.inf)
+    high = np.zeros(shape)
+    factor_total = np.zeros(inputs)
+    calm = np.zeros(inputs)
+    gusting_frames = 0
+    previous = None
+    for factors, gusting, duties in simulate(speeds, gusts, frames, seed, step_ms, params, palette):
+        # both LED sets count towards their colour
+        duties = duties.reshape(inputs, -1, LED_SETS, CHANNELS_PER_SET)
+        flat = duties.reshape(inputs, -1, CHANNELS_PER_SET)
+        total += flat.sum(axis=1)
+        squares += (flat * flat).sum(axis=1)
+        low = np.minimum(low, flat.min(axis=1))
+        high = np.maximum(high, flat.max(axis=1))
+        if previous is not None:
+            duties = np.concatenate((previous, duties), axis=1)
+        change += np.abs(np.diff(duties, axis=1)).reshape(inputs, -1, CHANNELS_PER_SET).sum(axis=1)
+        previous = duties[:, -1:]
+        factor_total += factors.sum(axis=1)
+        calm += (factors < CALM_FACTOR).sum(axis=1)
+        gusting_frames += int(gusting.sum())
+    samples = frames * LED_SETS
+    scale = 100 / FlickerEngine.FULL_SCALE
+    mean = total / samples
+    return {
+        'mean': mean * scale,
+        'std': np.sqrt(np.maximum(squares / samples - mean ** 2, 0)) * scale,
+        'min': low * scale,
+        'max': high * scale,
+        'flicker': change / max((frames - 1) * LED_SETS, 1) * scale,  # mean change from frame to frame
+        'factor': factor_total / frames / wind.FACTOR_ONE,
+        'calm': calm / frames,  # share of frames the governor would slow down for
+        'gusting': gusting_frames / frames,
+    }
+
+
+def _run(job):
+    params, speeds, gusts, days, seed, step_ms, palette = job
+    return params, duty_stats(speeds, gusts, days, seed, step_ms, params, palette)
+
+
+def sweep(grid, speeds, gusts, days=1, seed=1, step_ms=STEP_MS, palette='candle', workers=None):
+    """Run duty_stats() for every combination of the values in grid across a process pool,
+    e.g. sweep({'GUST_LENGTH_HIGH': [10000, 15000]}, speeds, gusts), and print a line per configuration."""
+    names = sorted(grid)
+    configs = [dict(zip(names, values)) for values in itertools.product(*(grid[name] for name in names))]
+    jobs = [(config, speeds, gusts, days, seed, step_ms, palette) for config in configs]
+    start = time.perf_counter()
+    with ProcessPoolExecutor(workers) as pool:
+        results = list(pool.map(_run, jobs))
+    for params, stats in results:
+        setting = ", ".join(f"{name}={value}" for name, value in params.items())
+        duty = " ".join(f"{name} {stats['mean'][:, i].mean():.1f}%±{stats['std'][:, i].mean():.1f} "
+                        f"(flicker {stats['flicker'][:, i].mean():.2f})"
+                        for i, name in enumerate(CHANNEL_NAMES))
+        print(f"{setting}: {duty}, gusting {stats['gusting'] * 100:.0f}%, calm {stats['calm'].mean() * 100:.0f}%")
+    frames = int(len(configs) * len(np.atleast_1d(speeds)) * days * 86400000 // step_ms)
+    print(f"{len(configs)} configurations, {frames} frames in {time.perf_counter() - start:.1f} s")
+    return results
+
+
+def verify(seed=1, speed=4.5, gusts=9.2, frames=5000, step_ms=STEP_MS, palette='candle'):
+    """Compare simulate() with WindManager and FlickerEngine run frame by frame."""
+    manager = wind.WindManager(seed=seed, clock=wind.SteppingClock(step_ms))
+    engine = FlickerEngine(palette=palette, seed=seed)
+    manager.set_wind(speed, gusts)
+    expected = np.empty((frames, LED_SETS * CHANNELS_PER_SET), np.int64)
+    factors = np.empty(frames, np.int64)
+    with contextlib.redirect_stdout(io.StringIO()):  # the gust model prints every phase
+        for i in range(frames):
+            factors[i] = manager.get_wind_factor()
+            expected[i] = engine.compose(factors[i])
+    simulated = [chunk for chunk in simulate(speed, gusts, frames, seed, step_ms, palette=palette)]
+    got_factors = np.concatenate([chunk[0][0] for chunk in simulated])
+    got = np.concatenate([chunk[2][0] for chunk in simulated])
+    mismatched = np.flatnonzero((got_factors != factors) | (got != expected).any(axis=1))
+    if len(mismatched):
+        raise AssertionError(f"simulation differs from the firmware from frame {mismatched[0] + 1}")
+    print(f"Simulation matches the firmware over {frames} frames")
+    return True
+
+
+if __name__ == '__main__':
+    verify()
+    winds = np.array([1, 3, 5, 8, 12, 18], np.float64)
+    sweep({'GUST_LENGTH_HIGH': [10000, 15000, 20000], 'COMPRESS_K': [0.01, 0.02, 0.03]},
+          winds, winds * 1.8, days=1)
@@ -0,0 +1,125 @@
+# Rob Faludi 2025
+# Native and viper compiled versions of the Wind Lantern hot paths.
+# Modules import these with a fallback to their own pure Python versions:
+#     try:
+#         from hotpath import compose_frame
+#     except (ImportError, SyntaxError):
+#         compose_frame = _compose_frame
+# CPython has no micropython module (ImportError), and ports built without the
+# native emitter refuse the decorators when this file is compiled (SyntaxError).
+# Each function here must behave exactly like its fallback.
+# Left as bytecode: the anemometer polling loop sleeps for nearly all of each
+# 10 ms poll, and aioble's ScanResult._decode_field runs a few times per
+# advertisement while scanning, not per frame, and belongs to the vendored
+# library in lib/. Neither is expected to show a measurable gain.
+# Measure on the Pico with `import hotpath; hotpath.benchmark()`, which also times
+# _decode_field against the frame interval; no Pico W figures are recorded yet.
+
+import micropython
+import time
+
+
+@micropython.viper
+def compose_frame(engine, index: int, offset: int):
+    # FlickerEngine.compose inner loop, duty_u16 tables
+    frame = ptr16(engine.frame)
+    red, green, blue = engine.tables
+    red_table = ptr16(red)
+    green_table = ptr16(green)
+    blue_table = ptr16(blue)
+    phases = ptr16(engine.phases)
+    sets = int(engine.sets)
+    length = int(engine.table_length)
+    channel = 0
+    i = 0
+    while i < sets:
+        position = index + phases[i]
+        if position >= length:
+            position -= length
+        position += offset
+        frame[channel] = red_table[position]
+        frame[channel + 1] = green_table[position]
+        frame[channel + 2] = blue_table[position]
+        channel += 3
+        i += 1
+
+
+@micropython.viper
+def compose_strip(renderer, index: int, offset: int):
+    # StripRenderer.compose inner loop, byte tables into the strip buffer
+    frame = ptr8(renderer.frame)
+    red, green, blue = renderer.tables
+    red_table = ptr8(red)
+    green_table = ptr8(green)
+    blue_table = ptr8(blue)
+    phases = ptr16(renderer.phases)
+    pixels = int(renderer.sets)
+    length = int(renderer.table_length)
+    red_at = int(renderer.red_at)
+    green_at = int(renderer.green_at)
+    blue_at = int(renderer.blue_at)
+    pixel = 0
+    i = 0
+    while i < pixels:
+        position = index + phases[i]
+        if position >= length:
+            position -= length
+        position += offset
+        frame[pixel + red_at] = red_table[position]
+        frame[pixel + green_at] = green_table[position]
+        frame[pixel + blue_at] = blue_table[position]
+        pixel += 3
+        i += 1
+
+
+def _time_us(fn, args, count):
+    start = time.ticks_us()
+    for _ in range(count):
+        fn(*args)
+    return time.ticks_diff(time.ticks_us(), start) / count
+
+
+class _Advertisement:
+    # the fields ScanResult._decode_field reads
+    def __init__(self, adv_data, resp_data):
+        self.adv_data = adv_data
+        self.resp_data = resp_data
+
+
+def _drain(generator_fn, *args):
+    for _ in generator_fn(*args):
+        pass
+
+
+def benchmark(count=1000):
+    """Print us per call for each hot path, pure Python fallback against compiled,
+    and the share of a frame interval each takes. Then the same for the code left
+    as bytecode, so one run gives every figure the choice of what to compile rests on."""
+    import flicker
+    import strip
+    from render import FRAME_INTERVAL_MS
+    frame_us = FRAME_INTERVAL_MS * 1000
+    engine = flicker.FlickerEngine()
+    renderer = strip.StripRenderer(None, 60)
+    cases = (
+        ('FlickerEngine.compose', flicker._compose_frame, compose_frame, (engine, 3, 256)),
+        ('StripRenderer.compose (60 px)', strip._compose_strip, compose_strip, (renderer, 3, 512)),
+    )
+    results = {}
+    for name, python_fn, compiled_fn, args in cases:
+        before = _time_us(python_fn, args, count)
+        after = _time_us(compiled_fn, args, count)
+        results[name] = (before, after)
+        print(f"{name}: {before:.1f} us -> {after:.1f} us, "
+              f"{before * 100 / frame_us:.2f}% -> {after * 100 / frame_us:.2f}% of a frame")
+    try:
+        from aioble.central import ScanResult
+    except ImportError:
+        print("aioble not available, _decode_field not timed")  # e.g. a build without Bluetooth
+    else:
+        # flags, a complete name and a 16-bit service UUID, as the wind sensor advertises
+        advertisement = _Advertisement(b'\x02\x01\x06\x09\x09RPi-Pico\x03\x03\x1a\x18', b'')
+        elapsed = _time_us(_drain, (ScanResult._decode_field, advertisement, 0x09, 0x08), count)
+        results['ScanResult._decode_field'] = (elapsed, None)
+        print(f"ScanResult._decode_field: {elapsed:.1f} us, bytecode, once per advertisement")
+    return results
@@ -0,0 +1,106 @@
+# Rob Faludi 2025
+# Incremental gzip and deflate decoding of HTTP bodies for nature_api.
+# Compressed chunks go in with feed() as they come off the socket and the decoded
+# bytes go straight on to a sink, e.g. a JsonExtractor, so neither the compressed nor
+# the decoded body is held whole. Uses zlib.decompressobj on a computer and the
+# deflate module on MicroPython 1.21 and later, where the decoder pulls its input
+# from a stream instead: enough compressed bytes are kept ahead of it that it never
+# reaches the end of what has arrived before the body is complete.
+
+import io
+
+try:
+    import zlib
+    if not hasattr(zlib, 'decompressobj'):
+        zlib = None  # the MicroPython zlib has no incremental decoder
+except ImportError:
+    zlib = None
+try:
+    import deflate
+except ImportError:
+    deflate = None
+
+ACCEPT_ENCODING = "gzip, deflate" if zlib or deflate else None  # None: ask for plain bodies
+OUTPUT_CHUNK = 512  # decoded bytes handed on at a time
+INPUT_MARGIN = 2048  # compressed bytes kept ahead of the MicroPython decoder, covers
+                     # two block headers and the input of one OUTPUT_CHUNK
+_WBITS = 32 + 15  # zlib: detect a gzip or zlib header; HTTP deflate is zlib wrapped
+
+
+class _Pending(io.IOBase):
+    # compressed bytes received but not decoded yet, read by deflate.DeflateIO
+    def __init__(self):
+        self.data = bytearray()
+        self.offset = 0
+
+    def add(self, chunk):
+        if self.offset:
+            self.data = self.data[self.offset:]
+            self.offset = 0
+        self.data.extend(chunk)
+
+    def available(self):
+        return len(self.data) - self.offset
+
+    def readinto(self, buffer):
+        count = min(len(buffer), len(self.data) - self.offset)
+        buffer[:count] = self.data[self.offset:self.offset + count]
+        self.offset += count
+        return count
+
+
+class Inflater:
+    # Decodes one body with a Content-Encoding of gzip, deflate or none, and
+    # counts the bytes on each side.
+    def __init__(self, encoding, sink):
+        self.sink = sink
+        self.compressed = 0
+        self.uncompressed = 0
+        self.decoder = None
+        self.stream = None
+        encoding = (encoding or 'identity').lower()
+        if encoding in ('gzip', 'x-gzip', 'deflate'):
+            if zlib:
+                self.decoder = zlib.decompressobj(_WBITS)
+            elif deflate:
+                self.pending = _Pending()
+                self.stream = deflate.DeflateIO(self.pending, deflate.AUTO)
+            else:
+                raise ValueError(f"Cannot decode {encoding} bodies here")
+        elif encoding != 'identity':
+            raise ValueError(f"Unsupported content encoding: {encoding}")
+
+    def _emit(self, data):
+        if data:
+            self.uncompressed += len(data)
+            self.sink(data)
+
+    def feed(self, chunk):
+        self.compressed += len(chunk)
+        if self.decoder:
+            data = self.decoder.decompress(chunk, OUTPUT_CHUNK)
+            self._emit(data)
+            while self.decoder.unconsumed_tail:
+                self._emit(self.decoder.decompress(self.decoder.unconsumed_tail, OUTPUT_CHUNK))
+        elif self.stream:
+            self.pending.add(chunk)
+            while self.pending.available() > INPUT_MARGIN:
+                data = self.stream.read(OUTPUT_CHUNK)
+                if not data:
+                    break  # end of the compressed data
+                self._emit(data)
+        else:
+            self._emit(chunk)
+
+    def finish(self):
+        """Decode what is left once the whole body has arrived."""
+        if self.decoder:
+            self._emit(self.decoder.flush())
+            if not self.decoder.eof:
+                raise ValueError("Compressed body ended early")
+        elif self.stream:
+            while True:
+                data = self.stream.read(OUTPUT_CHUNK)  # EOFError if the body was cut short
+                if not data:
+                    break
+                self._emit(data)
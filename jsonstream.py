@@ -0,0 +1,267 @@
+# Rob Faludi 2025
+# Streaming JSON extraction for nature_api responses.
+# Reads a body a small chunk at a time and keeps only the values at the requested
+# key paths, e.g. "current.wind_speed_10m" or "features[*].properties.time", so a
+# GeoJSON or multi-day forecast never has to fit in the heap at once. The result
+# has the shape of the full document with everything else left out, so parse
+# functions written for response.json() work on it unchanged. Everything kept
+# while parsing counts against a hard memory ceiling.
+
+import json
+
+READ_CHUNK = 512  # bytes read from the socket at a time
+MEMORY_LIMIT = 16 * 1024  # bytes of kept values and partial tokens per response
+_ITEM_BYTES = 8  # rough heap cost of a kept value beyond its text
+
+_VALUE = 0  # expecting a value
+_KEY = 1  # in an object, expecting a key or }
+_COLON = 2
+_NEXT = 3  # after a value, expecting , or a closing bracket
+_STRING = 4
+_BARE = 5  # number, true, false or null
+_DONE = 6
+
+_KEEP = 0  # the whole value is wanted
+_WALK = 1  # something inside it may be wanted
+_SKIP = 2
+
+_WHITESPACE = (0x20, 0x09, 0x0D, 0x0A)  # tuples, `int in bytes` is not in MicroPython
+_DELIMITERS = _WHITESPACE + (0x2C, 0x5D, 0x7D)  # , ] }
+_QUOTE = 0x22
+
+
+def compile_path(path):
+    # "features[*].properties.time" -> ['features', '*', 'properties', 'time']
+    parts = []
+    for name in path.split('.'):
+        while '[' in name:
+            head, _, rest = name.partition('[')
+            if head:
+                parts.append(head)
+            index, _, name = rest.partition(']')
+            parts.append('*' if index == '*' else int(index))
+        if name:
+            parts.append(name)
+    return parts
+
+
+def _put(container, key, value):
+    if isinstance(container, dict):
+        container[key] = value
+    else:
+        while len(container) < key:
+            container.append(None)  # keeps the positions of later elements
+        if len(container) == key:
+            container.append(value)
+        else:
+            container[key] = value
+
+
+class JsonExtractor:
+    # Feed it the body with feed(), then call finish() for the pruned document.
+    def __init__(self, paths, limit=MEMORY_LIMIT):
+        self.patterns = [compile_path(path) for path in paths]
+        self.limit = limit
+        self.used = 0  # bytes kept so far
+        self.result = None
+        # open containers, outermost first: [is_object, key or index, node, mode]
+        # node is the matching container in the result, made once something is kept
+        self.frames = []
+        self.state = _VALUE
+        self.token = bytearray()
+        self.keep = False  # the string or bare token being read is kept
+        self.key = False  # the string being read is an object key
+        self.escape = False
+
+    def _mode(self):
+        # what to do with a value starting at the current position
+        frames = self.frames
+        if frames and frames[-1][3] != _WALK:
+            return frames[-1][3]
+        path = [frame[1] for frame in frames]
+        longer = False
+        for pattern in self.patterns:
+            if len(pattern) < len(path):
+                continue
+            for i in range(len(path)):
+                part = pattern[i]
+                if part != path[i] and not (part == '*' and isinstance(path[i], int)):
+                    break
+            else:
+                if len(pattern) == len(path):
+                    return _KEEP
+                longer = True
+        return _WALK if longer else _SKIP
+
+    def _charge(self, size):
+        self.used += size
+        if self.used + len(self.token) > self.limit:
+            raise ValueError(f"JSON values need more than {self.limit} bytes")
+
+    def _node(self, depth):
+        # the result container for frames[depth], made along with its parents if needed
+        frame = self.frames[depth]
+        if frame[2] is None:
+            frame[2] = {} if frame[0] else []
+            self._charge(_ITEM_BYTES * 4)
+            if depth == 0:
+                self.result = frame[2]
+            else:
+                parent = self.frames[depth - 1]
+                _put(self._node(depth - 1), parent[1], frame[2])
+        return frame[2]
+
+    def _value(self, value):
+        # a kept scalar at the current position
+        if self.frames:
+            _put(self._node(len(self.frames) - 1), self.frames[-1][1], value)
+        else:
+            self.result = value
+
+    def _open(self, is_object):
+        mode = self._mode()
+        self.frames.append([is_object, None if is_object else 0, None, mode])
+        if mode == _KEEP:
+            self._node(len(self.frames) - 1)
+        self.state = _KEY if is_object else _VALUE
+
+    def _close(self):
+        self.frames.pop()
+        self.state = _NEXT if self.frames else _DONE
+
+    def _end_token(self, text):
+        if self.key:
+            self.frames[-1][1] = json.loads(text)
+            self.state = _COLON
+        else:
+            if self.keep:
+                self._charge(len(text) + _ITEM_BYTES)
+                self._value(json.loads(text))
+            self.state = _NEXT if self.frames else _DONE
+        self.token = bytearray()
+
+    def feed(self, chunk):
+        i = 0
+        n = len(chunk)
+        token = self.token
+        while i < n:
+            state = self.state
+            if state == _STRING:
+                # jump to the next quote or backslash
+                if self.escape:
+                    self.escape = False
+                    if self.keep:
+                        token.append(chunk[i])
+                    i += 1
+                    continue
+                quote = chunk.find(b'"', i)
+                backslash = chunk.find(b'\\', i)
+                if backslash != -1 and (quote == -1 or backslash < quote):
+                    if self.keep:
+                        token.extend(chunk[i:backslash + 1])
+                    self.escape = True
+                    i = backslash + 1
+                elif quote == -1:
+                    if self.keep:
+                        token.extend(chunk[i:])
+                    i = n
+                else:
+                    if self.keep:
+                        token.extend(chunk[i:quote])
+                    i = quote + 1
+                    self._end_token(b'"' + token + b'"' if self.keep else b'')
+                    token = self.token
+                if self.keep and len(token) + self.used > self.limit:
+                    self._charge(0)
+                continue
+            c = chunk[i]
+            if state == _BARE:
+                if c in _DELIMITERS:
+                    self._end_token(bytes(token) if self.keep else b'')
+                    token = self.token
+                    continue  # the delimiter is handled in the next state
+                if self.keep:
+                    token.append(c)
+                    if len(token) + self.used > self.limit:
+                        self._charge(0)
+                i += 1
+                continue
+            i += 1
+            if c in _WHITESPACE:
+                continue
+            if state == _VALUE:
+                if c == 0x7B:  # {
+                    self._open(True)
+                elif c == 0x5B:  # [
+                    self._open(False)
+                elif c == 0x5D and self.frames and not self.frames[-1][0]:  # ] of an empty array
+                    self._close()
+                else:
+                    self.keep = self._mode() == _KEEP
+                    self.key = False
+                    if c == _QUOTE:
+                        self.state = _STRING
+                    else:
+                        self.state = _BARE
+                        if self.keep:
+                            token.append(c)
+            elif state == _KEY:
+                if c == _QUOTE:
+                    self.keep = True
+                    self.key = True
+                    self.state = _STRING
+                elif c == 0x7D:  # }
+                    self._close()
+                else:
+                    raise ValueError("Expected an object key")
+            elif state == _COLON:
+                if c != 0x3A:
+                    raise ValueError("Expected ':'")
+                self.state = _VALUE
+            elif state == _NEXT:
+                frame = self.frames[-1]
+                if c == 0x2C:  # ,
+                    if frame[0]:
+                        self.state = _KEY
+                    else:
+                        frame[1] += 1
+                        self.state = _VALUE
+                elif c == (0x7D if frame[0] else 0x5D):
+                    self._close()
+                else:
+                    raise ValueError("Expected ',' or a closing bracket")
+            elif state == _DONE:
+                raise ValueError("Data after the end of the JSON document")
+
+    def finish(self):
+        """The pruned document. Raises ValueError if the body ended early."""
+        if self.state == _BARE and not self.frames:
+            self._end_token(bytes(self.token) if self.keep else b'')
+        if self.state != _DONE:
+            raise ValueError("JSON body ended early")
+        return self.result
+
+
+def extract(chunks, paths, limit=MEMORY_LIMIT):
+    """Run an iterable of byte chunks through a JsonExtractor for paths."""
+    extractor = JsonExtractor(paths, limit)
+    for chunk in chunks:
+        extractor.feed(chunk)
+    return extractor.finish()
+
+
+def response_chunks(response, size=READ_CHUNK):
+    # body chunks of a requests response, on MicroPython and CPython
+    if hasattr(response, 'iter_content'):
+        yield from response.iter_content(size)
+        return
+    while True:
+        chunk = response.raw.read(size)
+        if not chunk:
+            return
+        yield chunk
+
+
+def extract_response(response, paths, limit=MEMORY_LIMIT):
+    """The values at paths from a requests response, read from its socket in chunks."""
+    return extract(response_chunks(response), paths, limit)
@@ -1,26 +1,136 @@
 # A library that connects to realtime weather and natural events data, using open-meteo and other sources.
 
+import _thread
+import asyncio
+import json
+import socket
 import time
-import network
 import requests
 from Url_encode import url_encode
-import machine
-import ntptime
+from inflate import ACCEPT_ENCODING, Inflater
+from jsonstream import JsonExtractor, MEMORY_LIMIT
+
+try:
+    import network
+    import machine
+    import ntptime
+except ImportError:
+    # on a computer, for the host tools: no Wi-Fi or clock handling, the computer has its own
+    network = machine = ntptime = None
+
+__version__ = "0.1.21"
+
+# kept from a USGS GeoJSON response by get_new_earthquake(), the geometry and metadata are skipped
+EARTHQUAKE_PATHS = ("features[*].id", "features[*].properties")
+
+SESSION_POOL_SIZE = 16  # connections per host kept by SessionTransport, at least get_many() workers
+GET_MANY_WORKERS = 8
+
+
+class DeviceTransport:
+    # MicroPython: requests from micropython-lib over the Pico W's Wi-Fi, NTP for the clock
+    def get(self, url, headers, timeout):
+        return requests.get(url, headers=headers, timeout=timeout, stream=True)
+
+    def connect(self, ssid, password, watchdog, attempts_per_cycle, max_cycles):
+        while max_cycles > 0:
+            wlan = network.WLAN(network.STA_IF)
+            wlan.active(True)
+            # Connect to network
+            wlan.connect(ssid, password)
+            tries = attempts_per_cycle
+            while tries > 0:
+                if wlan.status() >= 3:
+                    break
+                tries -= 1
+                if watchdog: watchdog.feed()  # Feed the watchdog if configured
+                print('Waiting for Wi-Fi connection...')
+                time.sleep(1)
+            # Check if connection is successful
+            if wlan.status() != 3:
+                print('Failed to establish a network connection')
+                max_cycles -= 1
+            else:
+                print('Connection successful!')
+                network_info = wlan.ifconfig()
+                print('IP address:', network_info[0])
+                return True
+        print('Exceeded maximum connection attempts, resetting device...')
+        machine.reset()
+
+    async def connect_async(self, ssid, password, watchdog, tries):
+        # one short attempt that yields to the event loop and never resets, for
+        # lanterns that carry on without Wi-Fi
+        wlan = network.WLAN(network.STA_IF)
+        if wlan.isconnected():
+            return True
+        wlan.active(True)
+        wlan.connect(ssid, password)
+        while tries > 0 and wlan.status() >= 0:  # below 0 the attempt has failed
+            if wlan.status() == 3:
+                print('IP address:', wlan.ifconfig()[0])
+                return True
+            tries -= 1
+            if watchdog: watchdog.feed()  # Feed the watchdog if configured
+            await asyncio.sleep(1)
+        print('Failed to establish a network connection')
+        return False
+
+    def set_clock(self):
+        ntptime.settime()
+
+    def close(self):
+        pass
+
+
+class SessionTransport:
+    # CPython, e.g. pre-fetching for many lanterns on a server: one requests.Session
+    # whose keep-alive connections are shared by every Client given this transport
+    # and by the threads of get_many(). The computer is online and keeps its own time.
+    def __init__(self, pool_size=SESSION_POOL_SIZE):
+        self.session = requests.Session()
+        adapter = requests.adapters.HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size)
+        self.session.mount('https://', adapter)
+        self.session.mount('http://', adapter)
+
+    def get(self, url, headers, timeout):
+        return self.session.get(url, headers=headers, timeout=timeout, stream=True)
+
+    def connect(self, ssid, password, watchdog, attempts_per_cycle, max_cycles):
+        return True
+
+    async def connect_async(self, ssid, password, watchdog, tries):
+        return True
+
+    def set_clock(self):
+        pass
+
+    def close(self):
+        self.session.close()
 
-__version__ = "0.1.14"
 
 class Client:
-    def __init__(self, ssid, password, debug_mode=False, watchdog=None):
+    def __init__(self, ssid, password, debug_mode=False, watchdog=None, transport=None):
         self.ssid = ssid
         self.password = password
         self.ipgeolocation_api_key = None
         self.watchdog = watchdog
-        self.wifi_connected = False
+        # how requests go out and the device gets online, DeviceTransport or SessionTransport;
+        # pass one SessionTransport to many clients to share its connections
+        if transport is None:
+            transport = DeviceTransport() if network else SessionTransport()
+        self.transport = transport
+        self.wifi_connected = network is None  # a computer is already online
+        self._lock = _thread.allocate_lock()  # get_many() threads share the counters
         self.address = None
         self.location = None
         self.utc_offset = 0
         self.headers = {"User-Agent": "rp2"}  # Add a custom user agent
+        if ACCEPT_ENCODING:
+            self.headers["Accept-Encoding"] = ACCEPT_ENCODING  # bodies are decoded as they arrive, see inflate.py
+        self.transfers = {}  # endpoint -> [responses, bytes received, bytes decoded]
         self.debug_mode = debug_mode
+        self.memory_limit = MEMORY_LIMIT  # per response read with key paths, see jsonstream.py
         # In-memory TTL cache for fetched data: key -> { 'value': ..., 'expires_at': ... }
         self._cache = {}
         # Endpoint specifications for generic request handling
@@ -31,6 +141,12 @@ class Client:
                 "requires_location": True,
                 "requires_key": False,
             },
+            "archive": {
+                "base": "https://archive-api.open-meteo.com/v1/archive",
+                "param_style": "csv",
+                "requires_location": True,
+                "requires_key": False,
+            },
             "marine": {
                 "base": "https://marine-api.open-meteo.com/v1/marine",
                 "param_style": "csv",
@@ -52,38 +168,17 @@ class Client:
         }
 
     def connect_wifi(self, attempts_per_cycle=10, max_cycles=10):
-        while max_cycles > 0:
-            wlan = network.WLAN(network.STA_IF)
-            wlan.active(True)
-            # Connect to network
-            wlan.connect(self.ssid, self.password)
-            tries = attempts_per_cycle
-            while tries > 0:
-                if wlan.status() >= 3:
-                    self.wifi_connected = True
-                    break
-                tries -= 1
-                if self.watchdog: self.watchdog.feed()  # Feed the watchdog if configured
-                print('Waiting for Wi-Fi connection...')
-                time.sleep(1)
-            # Check if connection is successful
-            if wlan.status() != 3:
-                print('Failed to establish a network connection')
-                max_cycles -= 1
-            else:
-                print('Connection successful!')
-                network_info = wlan.ifconfig()
-                print('IP address:', network_info[0])
-                return True
-        print('Exceeded maximum connection attempts, resetting device...')
-        machine.reset()
+        if self.transport.connect(self.ssid, self.password, self.watchdog, attempts_per_cycle, max_cycles):
+            self.wifi_connected = True
+            return True
+        return False
 
     def sync_time(self, max_retries=5):
         for _ in range(max_retries):
             try:
                 print('Syncing time via NTP...')
                 if self.watchdog: self.watchdog.feed()  # Feed the watchdog if configured
-                ntptime.settime()
+                self.transport.set_clock()
                 return True
             except Exception as e:
                 print("Error syncing time:", e)
@@ -92,75 +187,68 @@ class Client:
     
     def get_local_timezone_offset(self):
         try:
-            if self.watchdog: self.watchdog.feed()  # Feed the watchdog if configured
-            response = requests.get(f"https://api.ipgeolocation.io/v3/timezone?apiKey={self.ipgeolocation_api_key}&ip=", headers=self.headers, timeout=10)
-            if self.debug_mode:
-                print(f"Response: {response.content}")
-            timezone_data = response.json()
-            if self.debug_mode:
-                print(f"Timezone data: {timezone_data}")  # Debugging line to check the timezone data  
-            if 'time_zone' in timezone_data and 'offset_with_dst' in timezone_data['time_zone']:
-                offset_str = timezone_data['time_zone']['offset_with_dst']
-                return int(offset_str) * 60 * 60
+            return self._local_offset(self.get_json(self._local_timezone_url()))
         except Exception as e:
             print('Error fetching local timezone offset:', e)
         return 0 # if not available, assume UTC
 
+    def _local_timezone_url(self):
+        return f"https://api.ipgeolocation.io/v3/timezone?apiKey={self.ipgeolocation_api_key}&ip="
+
+    def _local_offset(self, timezone_data):
+        if self.debug_mode:
+            print(f"Timezone data: {timezone_data}")  # Debugging line to check the timezone data
+        if 'time_zone' in timezone_data and 'offset_with_dst' in timezone_data['time_zone']:
+            offset_str = timezone_data['time_zone']['offset_with_dst']
+            return int(offset_str) * 60 * 60
+        return 0
+
     def set_timezone_from_location(self):
         if not self.location:
             raise ValueError("Location is not set.")
         
         try:
-            if self.watchdog: self.watchdog.feed()  # Feed the watchdog if configured
-            if self.ipgeolocation_api_key: 
-                response = requests.get(f"https://api.ipgeolocation.io/v3/timezone?apiKey={self.ipgeolocation_api_key}&lat={self.location['latitude']}&long={self.location['longitude']}", headers=self.headers, timeout=10)
-            else:        
-                response = requests.get(f"https://timeapi.io/api/v1/time/current/coordinate?latitude={self.location['latitude']}&longitude={self.location['longitude']}", headers=self.headers, timeout=10)
-            if self.debug_mode:
-                print(response.content)
-                print('Response code: ', response.status_code)
-            timezone_data = response.json()
-                
-            if 'utc_offset_seconds' in timezone_data:
-                self.utc_offset = timezone_data['utc_offset_seconds']
-            elif 'time_zone' in timezone_data and 'offset_with_dst' in timezone_data['time_zone']:
-                offset_str = timezone_data['time_zone']['offset_with_dst']
-                self.utc_offset = int(offset_str) * 60 * 60
-            else:
-                raise ValueError("UTC offset not found in timezone data.")
+            self._store_timezone(self.get_json(self._timezone_url()))
         except Exception as e:
             print('Error fetching timezone data:', e)
             return False
-        
+
+    def _timezone_url(self):
+        if self.ipgeolocation_api_key:
+            return f"https://api.ipgeolocation.io/v3/timezone?apiKey={self.ipgeolocation_api_key}&lat={self.location['latitude']}&long={self.location['longitude']}"
+        return f"https://timeapi.io/api/v1/time/current/coordinate?latitude={self.location['latitude']}&longitude={self.location['longitude']}"
+
+    def _store_timezone(self, timezone_data):
+        if 'utc_offset_seconds' in timezone_data:
+            self.utc_offset = timezone_data['utc_offset_seconds']
+        elif 'time_zone' in timezone_data and 'offset_with_dst' in timezone_data['time_zone']:
+            offset_str = timezone_data['time_zone']['offset_with_dst']
+            self.utc_offset = int(offset_str) * 60 * 60
+        else:
+            raise ValueError("UTC offset not found in timezone data.")
+
     def set_location(self, address):
+        url = self._geocode_url(address)
+        try:
+            self._store_location(self.get_json(url))
+        except Exception as e:
+            print('Error fetching location data:', e)
+
+    def _geocode_url(self, address):
         self.address = address
-        url=url_encode()
-        encoded_address = url.encode(address)
+        encoded_address = url_encode().encode(address)
         if self.debug_mode:
             print(f"Encoded address: {encoded_address}")  # Debugging line to check the encoded address
-        try:
-            headers = {
-                "User-Agent": "rp2"  # Add a custom user agent
-            }
-            if self.watchdog: self.watchdog.feed()  # Feed the watchdog if configured
-            response = requests.get(f"https://nominatim.openstreetmap.org/search?q={encoded_address}&format=json&limit=1", headers=self.headers, timeout=10)
-            if self.debug_mode:
-                print(response.content)
-            response_code = response.status_code
-            location_data = response.json()
-            if self.debug_mode:
-                print('Response code: ', response_code)
-            
-            if location_data:
-                self.location = {
-                    "latitude": location_data[0]["lat"],
-                    "longitude": location_data[0]["lon"]
-                }
+        return f"https://nominatim.openstreetmap.org/search?q={encoded_address}&format=json&limit=1"
 
-            else:
-                raise ValueError("Location not found")
-        except Exception as e:
-            print('Error fetching location data:', e)
+    def _store_location(self, location_data):
+        if location_data:
+            self.location = {
+                "latitude": location_data[0]["lat"],
+                "longitude": location_data[0]["lon"]
+            }
+        else:
+            raise ValueError("Location not found")
 
     def set_coordinates(self, latitude, longitude):
         self.location = {
@@ -220,50 +308,118 @@ class Client:
                 params_to_fetch.append(param)
         return results, params_to_fetch
 
-    def _execute_request(self, url, expiry=900, cache_category=None, cache_key=None):
-        if cache_category is not None and cache_key is not None:
-            cache_return = self.check_cache(cache_category, cache_key, expiry)
-            if cache_return is not None and cache_return != "expired":
-                if self.debug_mode:
-                    print(f"Cache hit for {cache_category}:{cache_key}")
-                return cache_return
-            if cache_return == "expired" and self.debug_mode:
-                print(f"Cache expired for {cache_category}:{cache_key}")
-
-        if self.debug_mode:
-            print(f"Requesting URL: {url}")
-        if self.watchdog: self.watchdog.feed()  # Feed the watchdog if configured
-        response = requests.get(url, headers=self.headers, timeout=10)
-        data = response.json()
-        if self.debug_mode:
-            print(f"Response data: {data}")
-            print('Response code: ', response.status_code)
+    def _cached_response(self, cache_category, cache_key, expiry):
+        if cache_category is None or cache_key is None:
+            return None
+        cache_return = self.check_cache(cache_category, cache_key, expiry)
+        if cache_return is not None and cache_return != "expired":
+            if self.debug_mode:
+                print(f"Cache hit for {cache_category}:{cache_key}")
+            return cache_return
+        if cache_return == "expired" and self.debug_mode:
+            print(f"Cache expired for {cache_category}:{cache_key}")
+        return None
 
+    def _store_response(self, cache_category, cache_key, data, expiry):
         if cache_category is not None and cache_key is not None:
             try:
                 self.set_cache(cache_category, cache_key, data, expiry)
             except Exception:
                 pass
 
+    def _execute_request(self, url, expiry=900, cache_category=None, cache_key=None, paths=None):
+        cached = self._cached_response(cache_category, cache_key, expiry)
+        if cached is not None:
+            return cached
+
+        data = self.get_json(url, paths)
+        if self.debug_mode:
+            print(f"Response data: {data}")
+        self._store_response(cache_category, cache_key, data, expiry)
         return data
 
-    def _execute_parameterized_request(self, category, parameters, expiry, build_url_fn, parse_fn):
+    def get_json(self, url, paths=None):
+        """Fetch and decode a JSON document. The response is always closed, so its
+        socket and buffers are freed even when decoding fails. With key paths, e.g.
+        ["current.wind_speed_10m"], the body is streamed and only those values are
+        kept, see jsonstream.py."""
+        if self.debug_mode:
+            print(f"Requesting URL: {url}")
+        if self.watchdog: self.watchdog.feed()  # Feed the watchdog if configured
+        response = self.transport.get(url, self.headers, REQUEST_TIMEOUT_S)
+        try:
+            if self.debug_mode:
+                print('Response code: ', response.status_code)
+            return self._read_json(url, response, paths)
+        finally:
+            response.close()
+
+    def _read_json(self, url, response, paths):
+        # the body a chunk at a time, decompressed as it arrives, into json or a JsonExtractor
+        if paths:
+            extractor = JsonExtractor(paths, self.memory_limit)
+            sink = extractor.feed
+        else:
+            body = []
+            sink = body.append
+        inflater = Inflater(_header(response.headers, 'content-encoding'), sink)
+        for chunk in _raw_chunks(response):
+            inflater.feed(chunk)
+        inflater.finish()
+        self._count_transfer(url, inflater.compressed, inflater.uncompressed)
+        return extractor.finish() if paths else json.loads(b''.join(body))
+
+    def _count_transfer(self, url, received, decoded):
+        endpoint = url.split('?', 1)[0].split('//', 1)[-1]
+        with self._lock:
+            counts = self.transfers.get(endpoint)
+            if counts is None:
+                counts = self.transfers[endpoint] = [0, 0, 0]
+            counts[0] += 1
+            counts[1] += received
+            counts[2] += decoded
+
+    def transfer_report(self):
+        """Print the body bytes received and decoded per endpoint."""
+        for endpoint, (responses, received, decoded) in sorted(self.transfers.items()):
+            saved = 100 - received * 100 // decoded if decoded else 0
+            print(f"{endpoint}: {responses} responses, {received} bytes received, {decoded} decoded, {saved}% saved")
+
+    def get_many(self, calls, workers=GET_MANY_WORKERS):
+        """CPython only: run independent calls over a thread pool, e.g.
+        get_many([lambda c=c: c.get_weather('hourly', 'wind_speed_10m') for c in clients]).
+        Returns their results in order, with the exception in place of any that failed."""
+        from concurrent.futures import ThreadPoolExecutor  # not on MicroPython
+
+        def run(call):
+            try:
+                return call()
+            except Exception as e:
+                return e
+
+        with ThreadPoolExecutor(workers) as executor:
+            return list(executor.map(run, calls))
+
+    def _execute_parameterized_request(self, category, parameters, expiry, build_url_fn, parse_fn, paths_fn=None):
         parameters = self._normalize_parameter_list(parameters)
-        single_parameter = len(parameters) == 1
         results, params_to_fetch = self._fetch_cached_parameters(category, parameters, expiry)
 
         if params_to_fetch:
-            url = build_url_fn(params_to_fetch)
-            data = self._execute_request(url, expiry=expiry)
-            parsed = parse_fn(data, params_to_fetch)
-            for param, val in parsed.items():
-                results[param] = val
-                try:
-                    self.set_cache(category, param, val, expiry)
-                except Exception:
-                    pass
+            paths = paths_fn(params_to_fetch) if paths_fn else None
+            data = self._execute_request(build_url_fn(params_to_fetch), expiry=expiry, paths=paths)
+            self._store_parsed(category, results, parse_fn(data, params_to_fetch), expiry)
+        return self._select_results(parameters, results)
+
+    def _store_parsed(self, category, results, parsed, expiry):
+        for param, val in parsed.items():
+            results[param] = val
+            try:
+                self.set_cache(category, param, val, expiry)
+            except Exception:
+                pass
 
-        if single_parameter:
+    def _select_results(self, parameters, results):
+        if len(parameters) == 1:
             return results[parameters[0]]
         return results
 
@@ -279,8 +435,9 @@ class Client:
             params_fetch_string = ",".join(params_to_fetch)
             url = f"{spec['base']}?latitude={lat}&longitude={lon}&{category}={params_fetch_string}"
             # pass-through common extras like forecast_days
-            if extra_opts and 'forecast_days' in extra_opts:
-                url += f"&forecast_days={extra_opts['forecast_days']}"
+            for option in ('forecast_days', 'start_date', 'end_date'):
+                if extra_opts and option in extra_opts:
+                    url += f"&{option}={extra_opts[option]}"
             return url
 
         if spec.get('param_style') == 'apiKey+coords':
@@ -291,7 +448,9 @@ class Client:
         # Fallback: return base URL
         return spec.get('base')
 
-    def _generic_get(self, endpoint_name, category, parameters, expiry=900, parse_fn=None, **opts):
+    def _generic_get(self, endpoint_name, category, parameters, expiry=900, parse_fn=None, paths=None, **opts):
+        # paths: key paths parse_fn needs, a list or a function of the parameters being
+        # fetched; the default parser needs just category.parameter for csv endpoints
         spec = self._endpoint_specs.get(endpoint_name)
         if not spec:
             raise ValueError(f"Unknown endpoint: {endpoint_name}")
@@ -320,15 +479,26 @@ class Client:
                     for parameter in params_to_fetch
                 }
 
+            def default_paths_fn(params_to_fetch):
+                return [f"{category}.{parameter}" for parameter in params_to_fetch]
+
+            if paths is None:
+                paths_fn = default_paths_fn if parse_fn is None and style == 'csv' else None
+            elif callable(paths):
+                paths_fn = paths
+            else:
+                paths_fn = lambda params_to_fetch: paths
+
             chosen_parser = parse_fn if parse_fn is not None else default_parse_fn
-            return self._execute_parameterized_request(category, parameters, expiry, build_url_fn, chosen_parser)
+            return self._execute_parameterized_request(category, parameters, expiry, build_url_fn, chosen_parser, paths_fn)
 
         if style == 'usgs':
             # parameters in this case is expected to be a dict of query params
             if not isinstance(parameters, dict):
                 raise ValueError('For USGS style endpoints, parameters must be a dict')
             url, query_string = self._build_usgs_url(parameters)
-            return self._execute_request(url, expiry=expiry, cache_category='earthquakes', cache_key=query_string)
+            return self._execute_request(url, expiry=expiry, cache_category='earthquakes',
+                                         cache_key=self._paths_key(query_string, paths), paths=paths)
 
         raise NotImplementedError(f"Unsupported param_style: {style}")
 
@@ -356,6 +526,25 @@ class Client:
         print(('"get_forecast" is deprecated, use "get_weather" instead.'))
         return self.get_weather(category, parameters, forecast_days=forecast_days, expiry=expiry)
     
+    def get_archive(self, category, parameters, start_date, end_date):
+        """Historical data between two ISO dates, inclusive. Not cached: archive
+        responses are large, and the host tools write them to disk as they arrive."""
+        if not self.wifi_connected:
+            raise ConnectionError("Wi-Fi is not connected.")
+        if not self.location:
+            raise ValueError("Location is not set.")
+        parameters = self._normalize_parameter_list(parameters)
+        url = self._build_url_from_spec(self._endpoint_specs['archive'], category, parameters,
+                                        {'start_date': start_date, 'end_date': end_date})
+        return self._archive_columns(self._execute_request(url), category, parameters)
+
+    def _archive_columns(self, data, category, parameters):
+        category_data = data.get(category) if isinstance(data, dict) else None
+        if not isinstance(category_data, dict):
+            reason = data.get('reason') if isinstance(data, dict) else None
+            raise ValueError(f"No {category} archive data: {reason}")
+        return {parameter: category_data.get(parameter) for parameter in parameters}
+
     def get_marine(self, category, parameters, forecast_days=1, expiry=900):
         if not self.wifi_connected:
             raise ConnectionError("Wi-Fi is not connected.")
@@ -470,14 +659,18 @@ class Client:
 
         return newest if newest is not None else features[0]
 
-    def get_new_earthquake(self, params, expiry=900, state_file="earthquake_ids.txt"):
+    def get_new_earthquake(self, params, expiry=900, state_file="earthquake_ids.txt", paths=EARTHQUAKE_PATHS):
         if not self.wifi_connected:
             raise ConnectionError("Wi-Fi is not connected.")
 
         if not isinstance(params, dict):
             raise ValueError("params must be a dict of USGS query parameters")
 
-        quake_data = self.get_earthquakes(params, expiry=expiry)
+        quake_data = self.get_earthquakes(params, expiry=expiry, paths=paths)
+        return self._check_new_earthquake(params, quake_data, state_file)
+
+    def _check_new_earthquake(self, params, quake_data, state_file):
+        # the quake data if its newest quake was not seen before for these params
         newest_feature = self._get_newest_earthquake(quake_data)
         if not newest_feature:
             return None
@@ -501,7 +694,11 @@ class Client:
 
         return quake_data
 
-    def get_earthquakes(self, params, expiry=900):
+    def _paths_key(self, cache_key, paths):
+        # a pruned response is cached apart from the full one
+        return f"{cache_key}|{','.join(paths)}" if paths else cache_key
+
+    def get_earthquakes(self, params, expiry=900, paths=None):
         if not self.wifi_connected:
             raise ConnectionError("Wi-Fi is not connected.")
 
@@ -515,6 +712,463 @@ class Client:
         if self.debug_mode:
             print(f"Requesting earthquakes with query: {query_string}")
 
-        return self._execute_request(quake_url, expiry=expiry, cache_category='earthquakes', cache_key=query_string)
+        return self._execute_request(quake_url, expiry=expiry, cache_category='earthquakes',
+                                     cache_key=self._paths_key(query_string, paths), paths=paths)
+
+       
+
+REQUEST_TIMEOUT_S = 10  # whole request, from connecting to the last byte
+READ_CHUNK = 512  # bytes read at a time, keeps each step of a large response short
+POOL_IDLE_MAX = 2  # idle connections kept open, each TLS one holds tens of KB of buffers
+POOL_IDLE_S = 30  # idle connections older than this are closed rather than reused, servers
+                 # drop them after about a minute and each TLS one holds heap
+DNS_TTL_S = 600  # getaddrinfo() does not give the record TTL, so every address is kept this long
+# looked up by AsyncClient.resolve_hosts() before the first requests
+KNOWN_HOSTS = ("api.open-meteo.com", "nominatim.openstreetmap.org", "timeapi.io", "earthquake.usgs.gov")
+
+try:
+    _ticks_ms = time.ticks_ms
+    _ticks_diff = time.ticks_diff
+except AttributeError:
+    # on a computer
+    def _ticks_ms():
+        return int(time.monotonic() * 1000)
+
+    def _ticks_diff(end, start):
+        return end - start
+
+
+def _header(headers, name):
+    # MicroPython requests keeps header names as sent
+    for key, value in headers.items():
+        if key.lower() == name:
+            return value
+    return None
+
+
+def _raw_chunks(response):
+    # the body of a requests response as sent, still compressed
+    if hasattr(response.raw, 'stream'):
+        # urllib3 under CPython requests, which would otherwise decompress it itself
+        yield from response.raw.stream(READ_CHUNK, decode_content=False)
+        return
+    while True:
+        chunk = response.raw.read(READ_CHUNK)
+        if not chunk:
+            return
+        yield chunk
+
+
+def _split_url(url):
+    # (host, port, tls, path without the leading /)
+    scheme, _, rest = url.split('/', 2)
+    host, _, path = rest.partition('/')
+    tls = scheme == 'https:'
+    port = 443 if tls else 80
+    if ':' in host:
+        host, port = host.split(':', 1)
+        port = int(port)
+    return host, port, tls, path
+
+
+async def _lookup(host, port):
+    loop = asyncio.get_event_loop()
+    if hasattr(loop, 'getaddrinfo'):
+        info = await loop.getaddrinfo(host, port, type=socket.SOCK_STREAM)
+    else:
+        info = socket.getaddrinfo(host, port, 0, socket.SOCK_STREAM)  # blocks on MicroPython
+    return info[0][-1][0]
+
+
+def _close(writer):
+    try:
+        writer.close()
+    except Exception:
+        pass
+
+
+class Response:
+    # One HTTP/1.1 response on a pooled connection. Use it as `async with response:`,
+    # the connection goes back to the pool if the body was read to the end and the
+    # server keeps it open, otherwise it is closed, also on errors and cancellation.
+    def __init__(self, pool, key, reader, writer):
+        self.pool = pool
+        self.key = key
+        self.reader = reader
+        self.writer = writer
+        self.status = 0
+        self.headers = {}
+        self.keep_alive = False
+        self.received = 0  # body bytes, before and after decompression
+        self.decoded = 0
+        self.sent = _ticks_ms()  # set by the pool when the request goes out
+        self._complete = False
+
+    async def _start(self, status_line):
+        version, status = status_line.split(None, 2)[:2]
+        self.status = int(status)
+        while True:
+            line = await self.reader.readline()
+            if line in (b'\r\n', b''):
+                break
+            name, _, value = line.decode().partition(':')
+            self.headers[name.strip().lower()] = value.strip()
+        framed = 'content-length' in self.headers or self.headers.get('transfer-encoding') == 'chunked'
+        self.keep_alive = framed and version == b'HTTP/1.1' and self.headers.get('connection', '').lower() != 'close'
+
+    async def _read_exactly(self, count, sink):
+        while count > 0:
+            chunk = await self.reader.readexactly(min(count, READ_CHUNK))
+            sink(chunk)
+            count -= len(chunk)
+
+    async def _body(self, sink):
+        # hands the body to sink a chunk at a time, as it arrives, decompressed if need be
+        inflater = Inflater(self.headers.get('content-encoding'), sink)
+        sink = inflater.feed
+        if self.headers.get('transfer-encoding') == 'chunked':
+            while True:
+                size = int((await self.reader.readline()).split(b';')[0], 16)
+                if size == 0:
+                    while (await self.reader.readline()) not in (b'\r\n', b''):
+                        pass  # trailers
+                    break
+                await self._read_exactly(size, sink)
+                await self.reader.readline()
+        elif 'content-length' in self.headers:
+            await self._read_exactly(int(self.headers['content-length']), sink)
+        else:
+            while True:
+                chunk = await self.reader.read(READ_CHUNK)
+                if not chunk:
+                    break
+                sink(chunk)
+        inflater.finish()
+        self.received = inflater.compressed
+        self.decoded = inflater.uncompressed
+        self._complete = True
+        self.pool.transfer_ms += _ticks_diff(_ticks_ms(), self.sent)
+        self.pool.transfers += 1
+
+    async def read(self):
+        """The whole body, as bytes."""
+        body = []
+        await self._body(body.append)
+        return b''.join(body)
+
+    async def json(self):
+        return json.loads(await self.read())
+
+    async def extract(self, paths, limit=MEMORY_LIMIT):
+        """Only the values at key paths, parsed as the body arrives, see jsonstream.py."""
+        extractor = JsonExtractor(paths, limit)
+        await self._body(extractor.feed)
+        return extractor.finish()
+
+    def release(self):
+        if self.writer is None:
+            return
+        if self._complete and self.keep_alive:
+            self.pool._put(self.key, self.reader, self.writer)
+        else:
+            _close(self.writer)
+        self.writer = None
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, exc_type, exc, traceback):
+        if exc_type is not None:
+            self._complete = False  # may be part way through the body
+        self.release()
+
+
+class Resolver:
+    # Host name -> address cache for the pool. An address is used for ttl_s, then
+    # looked up again; if that lookup fails the last known address is used instead,
+    # home routers often drop DNS for a while with the hosts themselves still reachable.
+    def __init__(self, ttl_s=DNS_TTL_S):
+        self.ttl_s = ttl_s
+        self.entries = {}  # host -> (address, time looked up)
+        self.lookups = 0
+        self.hits = 0
+        self.fallbacks = 0  # stale addresses used because a lookup failed
+
+    async def resolve(self, host, port):
+        entry = self.entries.get(host)
+        if entry and time.time() - entry[1] < self.ttl_s:
+            self.hits += 1
+            return entry[0]
+        self.lookups += 1
+        try:
+            address = await _lookup(host, port)
+        except OSError:
+            if entry is None:
+                raise
+            self.fallbacks += 1
+            return entry[0]
+        self.entries[host] = (address, time.time())
+        return address
+
+    def expire(self, host):
+        # look it up again next time, but keep it as the fallback
+        entry = self.entries.get(host)
+        if entry:
+            self.entries[host] = (entry[0], 0)
+
+
+class ConnectionPool:
+    # Keep-alive connections per (host, port, tls), so requests to the same host in
+    # quick succession skip the TCP and TLS handshakes. A connection is used by one
+    # request at a time; up to POOL_IDLE_MAX wait between requests, for at most
+    # POOL_IDLE_S, checked at the end of every request. The lanterns ask each host once
+    # per cycle, minutes to hours apart, and close() the pool when a cycle is done;
+    # report() shows the reuse.
+    def __init__(self, max_idle=POOL_IDLE_MAX, idle_s=POOL_IDLE_S, resolver=None):
+        self.max_idle = max_idle
+        self.idle_s = idle_s
+        self.resolver = resolver or Resolver()
+        self.idle = []  # (key, reader, writer, time released), oldest first
+        self.opened = 0
+        self.reused = 0  # handshakes avoided
+        # time spent, in ms: looking up hosts, opening connections and on the
+        # requests themselves, from sending one to the end of its body
+        self.dns_ms = 0
+        self.connect_ms = 0
+        self.transfer_ms = 0
+        self.transfers = 0
+
+    def _put(self, key, reader, writer):
+        self.idle.append((key, reader, writer, time.time()))
+        while len(self.idle) > self.max_idle:
+            _close(self.idle.pop(0)[2])
+
+    def prune(self):
+        """Close connections idle for longer than idle_s."""
+        expired = time.time() - self.idle_s
+        while self.idle and self.idle[0][3] < expired:
+            _close(self.idle.pop(0)[2])
+
+    def close(self):
+        """Close every idle connection, e.g. before switching Wi-Fi off."""
+        while self.idle:
+            _close(self.idle.pop()[2])
+
+    async def _connect(self, key):
+        self.prune()
+        for i in range(len(self.idle) - 1, -1, -1):
+            if self.idle[i][0] == key:
+                entry = self.idle.pop(i)
+                return entry[1], entry[2], True
+        host, port, tls = key
+        start = _ticks_ms()
+        address = await self.resolver.resolve(host, port)
+        resolved = _ticks_ms()
+        self.dns_ms += _ticks_diff(resolved, start)
+        try:
+            if tls:
+                reader, writer = await asyncio.open_connection(address, port, ssl=True, server_hostname=host)
+            else:
+                reader, writer = await asyncio.open_connection(address, port)
+        except OSError:
+            self.resolver.expire(host)  # the host may have moved
+            raise
+        finally:
+            self.connect_ms += _ticks_diff(_ticks_ms(), resolved)
+        self.opened += 1
+        return reader, writer, False
+
+    async def request(self, url, headers):
+        """Send a GET and return its Response once the status line and headers are in."""
+        host, port, tls, path = _split_url(url)
+        key = (host, port, tls)
+        lines = [f"GET /{path} HTTP/1.1", f"Host: {host}"]
+        lines.extend(f"{name}: {value}" for name, value in headers.items())
+        request = ("\r\n".join(lines) + "\r\n\r\n").encode()
+        while True:
+            reader, writer, reused = await self._connect(key)
+            sent = _ticks_ms()
+            try:
+                writer.write(request)
+                await writer.drain()
+                status_line = await reader.readline()
+            except OSError:
+                if not reused:
+                    _close(writer)
+                    raise
+                status_line = b''
+            except BaseException:  # cancelled, or timed out
+                _close(writer)
+                raise
+            if status_line:
+                break
+            _close(writer)
+            if not reused:
+                raise OSError("Connection closed before a response")
+            # the server had already dropped the idle connection, open a new one
+        if reused:
+            self.reused += 1
+        response = Response(self, key, reader, writer)
+        response.sent = sent
+        try:
+            await response._start(status_line)
+        except BaseException:
+            _close(writer)
+            raise
+        return response
+
+    def report(self):
+        print(f"HTTP pool: {self.opened} connections opened, {self.reused} handshakes avoided, {len(self.idle)} idle")
+        resolver = self.resolver
+        print(f"HTTP time: DNS {self.dns_ms} ms, connecting {self.connect_ms} ms, "
+              f"{self.transfers} requests {self.transfer_ms} ms")
+        print(f"DNS: {resolver.lookups} lookups, {resolver.hits} cached, {resolver.fallbacks} stale fallbacks")
+
+
+class AsyncClient(Client):
+    # The same calls as Client, as coroutines on asyncio streams, so a slow server
+    # never stops the event loop: the error LED and the watchdog keep running.
+    # Requests time out and are cancelled after REQUEST_TIMEOUT_S, and independent
+    # ones can run together with fetch_all(). Connections are kept alive in self.pool
+    # and reused for the next request to the same host, host addresses are cached in
+    # self.pool.resolver. Only the requests themselves are non-blocking here;
+    # connect_wifi() and sync_time() are still the Client ones.
+    # Most of the surface comes from Client: its get_* methods validate their
+    # arguments, then return _execute_request() or _execute_parameterized_request(),
+    # which are coroutines here, so they are awaited in the same way.
+
+    def __init__(self, ssid, password, debug_mode=False, watchdog=None, timeout=REQUEST_TIMEOUT_S):
+        super().__init__(ssid, password, debug_mode=debug_mode, watchdog=watchdog)
+        self.timeout = timeout
+        self.pool = ConnectionPool()
+
+    async def _get(self, url, paths):
+        response = await self.pool.request(url, self.headers)
+        async with response:
+            if self.debug_mode:
+                print('Response code: ', response.status)
+            if paths:
+                data = await response.extract(paths, self.memory_limit)
+            else:
+                data = await response.json()
+        self._count_transfer(url, response.received, response.decoded)
+        return data
+
+    async def get_json(self, url, paths=None):
+        """Fetch and decode a JSON document, cancelled after self.timeout seconds.
+        With key paths only those values are kept, as in Client.get_json()."""
+        if self.debug_mode:
+            print(f"Requesting URL: {url}")
+        if self.watchdog: self.watchdog.feed()  # Feed the watchdog if configured
+        try:
+            return await asyncio.wait_for(self._get(url, paths), self.timeout)
+        finally:
+            self.pool.prune()  # connections left idle by earlier requests
+
+    async def connect_wifi_async(self, attempts=10):
+        """Try to get online for up to attempts seconds without stopping the event loop.
+        Unlike connect_wifi() it never resets the board, it returns False instead so
+        the caller can carry on offline and try again later."""
+        self.wifi_connected = await self.transport.connect_async(self.ssid, self.password, self.watchdog, attempts)
+        return self.wifi_connected
+
+    async def resolve_hosts(self, *urls):
+        """Look up the KNOWN_HOSTS and the hosts of any other URLs, e.g. right after
+        connecting, so the first requests do not wait on DNS."""
+        hosts = list(KNOWN_HOSTS)
+        if self.ipgeolocation_api_key:
+            hosts.append("api.ipgeolocation.io")
+        hosts.extend(_split_url(url)[0] for url in urls)
+        for host in hosts:
+            if self.watchdog: self.watchdog.feed()  # Feed the watchdog if configured
+            try:
+                await self.pool.resolver.resolve(host, 443)
+            except OSError as e:
+                print(f"Could not look up {host}:", e)
+
+    async def get_many(self, calls, workers=GET_MANY_WORKERS):
+        """Client.get_many() for coroutines: each call returns one, e.g.
+        await get_many([lambda: client.get_weather('hourly', 'wind_speed_10m'), ...]).
+        At most workers run at once, through fetch_all(). Returns their results in
+        order, with the exception in place of any that failed."""
+        calls = list(calls)
+        results = [None] * len(calls)
+        pending = iter(range(len(calls)))  # shared, each worker takes the next call
+
+        async def worker():
+            for i in pending:
+                try:
+                    results[i] = await calls[i]()
+                except Exception as e:
+                    results[i] = e
+
+        await self.fetch_all(*[worker() for _ in range(min(workers, len(calls)))])
+        return results
+
+    async def fetch_all(self, *requests):
+        """Run independent requests together, e.g. fetch_all(client.get_weather(...), client.get_marine(...)).
+        Returns their results in order, with the exception in place of any that failed."""
+        return await asyncio.gather(*requests, return_exceptions=True)
+
+    async def _execute_request(self, url, expiry=900, cache_category=None, cache_key=None, paths=None):
+        cached = self._cached_response(cache_category, cache_key, expiry)
+        if cached is not None:
+            return cached
+        data = await self.get_json(url, paths)
+        if self.debug_mode:
+            print(f"Response data: {data}")
+        self._store_response(cache_category, cache_key, data, expiry)
+        return data
+
+    async def _execute_parameterized_request(self, category, parameters, expiry, build_url_fn, parse_fn, paths_fn=None):
+        parameters = self._normalize_parameter_list(parameters)
+        results, params_to_fetch = self._fetch_cached_parameters(category, parameters, expiry)
+
+        if params_to_fetch:
+            paths = paths_fn(params_to_fetch) if paths_fn else None
+            data = await self._execute_request(build_url_fn(params_to_fetch), expiry=expiry, paths=paths)
+            self._store_parsed(category, results, parse_fn(data, params_to_fetch), expiry)
+        return self._select_results(parameters, results)
+
+    async def set_location(self, address):
+        url = self._geocode_url(address)
+        try:
+            self._store_location(await self.get_json(url))
+        except Exception as e:
+            print('Error fetching location data:', e)
+
+    async def get_local_timezone_offset(self):
+        try:
+            return self._local_offset(await self.get_json(self._local_timezone_url()))
+        except Exception as e:
+            print('Error fetching local timezone offset:', e)
+        return 0 # if not available, assume UTC
+
+    async def set_timezone_from_location(self):
+        if not self.location:
+            raise ValueError("Location is not set.")
+        try:
+            self._store_timezone(await self.get_json(self._timezone_url()))
+        except Exception as e:
+            print('Error fetching timezone data:', e)
+            return False
+
+    async def get_archive(self, category, parameters, start_date, end_date):
+        if not self.wifi_connected:
+            raise ConnectionError("Wi-Fi is not connected.")
+        if not self.location:
+            raise ValueError("Location is not set.")
+        parameters = self._normalize_parameter_list(parameters)
+        url = self._build_url_from_spec(self._endpoint_specs['archive'], category, parameters,
+                                        {'start_date': start_date, 'end_date': end_date})
+        return self._archive_columns(await self._execute_request(url), category, parameters)
+
+    async def get_new_earthquake(self, params, expiry=900, state_file="earthquake_ids.txt", paths=EARTHQUAKE_PATHS):
+        if not self.wifi_connected:
+            raise ConnectionError("Wi-Fi is not connected.")
+
+        if not isinstance(params, dict):
+            raise ValueError("params must be a dict of USGS query parameters")
 
-       
\ No newline at end of file
+        quake_data = await self.get_earthquakes(params, expiry=expiry, paths=paths)
+        return self._check_new_earthquake(params, quake_data, state_file)
@@ -0,0 +1,49 @@
+# Rob Faludi 2025
+# Colour palettes and gamma curves for the Wind Lantern.
+# Palette levels are perceived brightness in percent. Each channel is
+# (low, high, wind_slope): a frame picks a level between low - wind_slope * factor
+# and high, so stronger wind widens the flicker downwards.
+
+from array import array
+
+RED = 0
+GREEN = 1
+BLUE = 2
+
+GAMMA = 2.2
+LEVELS = 256  # gamma tables map level 0..255 to an output value
+
+PALETTES = {
+    # the original candle look, levels chosen so that after gamma they match the old linear ranges
+    'candle': ((97, 100, 0.5), (60, 61, 1.0), (12, 12, 0)),
+    'ember': ((70, 90, 1.5), (20, 28, 0.8), (0, 0, 0)),
+    'lantern_blue': ((10, 14, 0.3), (35, 45, 1.0), (85, 100, 1.0)),
+    'warm_white': ((90, 100, 0.5), (70, 80, 0.8), (40, 48, 0.6)),
+}
+
+
+def get_palette(name):
+    palette = PALETTES.get(name)
+    if palette is None:
+        raise ValueError(f"Unknown palette: {name}. Choose one of {sorted(PALETTES)}")
+    return [tuple(channel) for channel in palette]
+
+
+def level_index(percent):
+    # perceived brightness percent to a gamma table index
+    if percent <= 0:
+        return 0
+    if percent >= 100:
+        return LEVELS - 1
+    return int(percent * (LEVELS - 1) / 100 + 0.5)
+
+
+def gamma_table(gamma=GAMMA, full_scale=65535, inverted=True, scale=1.0):
+    """Compile a gamma curve into an integer table indexed by level_index().
+    inverted tables are for the common anode LEDs, where full duty is off.
+    scale dims the whole curve, 1.0 is full brightness."""
+    table = array('H' if full_scale > 255 else 'B', bytes((2 if full_scale > 255 else 1) * LEVELS))
+    for i in range(LEVELS):
+        value = int((i / (LEVELS - 1)) ** gamma * full_scale * scale + 0.5)
+        table[i] = full_scale - value if inverted else value
+    return table
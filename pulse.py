@@ -0,0 +1,33 @@
+# Rob Faludi 2025
+# PWM helpers shared by the Wind Lantern firmwares.
+
+from machine import PWM
+import time
+
+
+class Pulse(PWM):
+    def duty(self, percent_duty):
+        return self.duty_u16(int(percent_duty/100 *65535))
+
+
+class PulseGroup:
+    # Writes a whole frame of duty_u16 values to a fixed set of channels back-to-back
+    def __init__(self, *channels):
+        self.channels = channels
+        self.count = len(channels)
+        self.commit_us = 0  # time from first to last channel write in the last frame
+        self.max_commit_us = 0
+
+    def write(self, duties):
+        channels = self.channels
+        start = time.ticks_us()
+        for i in range(self.count):
+            channels[i].duty_u16(duties[i])
+        elapsed = time.ticks_diff(time.ticks_us(), start)
+        self.commit_us = elapsed
+        if elapsed > self.max_commit_us:
+            self.max_commit_us = elapsed
+
+    def off(self):
+        for channel in self.channels:
+            channel.duty_u16(65535)
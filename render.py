@@ -0,0 +1,334 @@
+# Rob Faludi 2025
+# Render schedulers for the Wind Lantern candle.
+# Each backend calls the same frame function, which draws one frame and returns
+# the wind factor it used, so all of them produce the same frames. Frame timing
+# comes from a FrameGovernor shared by all backends.
+
+from array import array
+import gc
+import time
+from wind import FACTOR_ONE
+
+try:
+    import micropython
+    from machine import Timer
+except ImportError:
+    # Timer backend is only available on MicroPython boards
+    micropython = None
+    Timer = None
+
+BACKENDS = ('thread', 'timer', 'asyncio')
+
+FRAME_INTERVAL_MS = 100  # target frame interval in normal wind
+CALM_INTERVAL_MS = 200  # target frame interval in calm wind
+MAX_INTERVAL_MS = 250  # slowest the governor will go when frames overrun
+CALM_FACTOR = 2 * FACTOR_ONE  # wind factors below this count as calm
+OVERRUN_LIMIT = 3  # consecutive overruns before slowing down
+HEADROOM_FRAMES = 16  # consecutive quick frames before speeding up again
+
+
+class FrameGovernor:
+    # Paces frames against absolute deadlines on the microsecond clock, so the
+    # time a frame takes to render is subtracted from the wait that follows it.
+    def __init__(self, interval_ms=FRAME_INTERVAL_MS, calm_interval_ms=CALM_INTERVAL_MS,
+                 max_interval_ms=MAX_INTERVAL_MS, calm_factor=CALM_FACTOR):
+        self.base_us = interval_ms * 1000
+        self.calm_us = calm_interval_ms * 1000
+        self.max_us = max_interval_ms * 1000
+        self.calm_factor = calm_factor
+        self.interval_us = self.base_us
+        self.deadline = time.ticks_us()
+        self.misses = 0  # frames that finished after their deadline
+        self._overruns = 0
+        self._headroom = 0
+
+    def set_interval(self, interval_ms, calm_interval_ms=None):
+        self.base_us = interval_ms * 1000
+        self.calm_us = (calm_interval_ms or interval_ms * 2) * 1000
+        if self.max_us < self.calm_us:
+            self.max_us = self.calm_us
+
+    def align(self, deadline, interval_us):
+        # follow an external frame clock: next frame due at deadline, fixed interval
+        self.base_us = self.calm_us = self.interval_us = interval_us
+        if self.max_us < interval_us:
+            self.max_us = interval_us
+        self.deadline = deadline
+        self._overruns = 0
+        self._headroom = 0
+
+    def reset(self):
+        self.deadline = time.ticks_us()
+        self._overruns = 0
+        self._headroom = 0
+
+    def next(self, factor, start, end):
+        # Returns the wait in us from `end` until the next frame should start
+        target = self.calm_us if factor < self.calm_factor else self.base_us
+        if self.interval_us < target:
+            self.interval_us = target  # calm wind, drop the frame rate straight away
+        self.deadline = time.ticks_add(self.deadline, self.interval_us)
+        remaining = time.ticks_diff(self.deadline, end)
+        if remaining < 0:
+            # overran, skip the missed slots rather than rushing to catch up
+            self.misses += 1
+            self.deadline = end
+            self._headroom = 0
+            self._overruns += 1
+            if self._overruns >= OVERRUN_LIMIT:
+                self._overruns = 0
+                self.interval_us = min(self.interval_us + (self.interval_us >> 2), self.max_us)
+            return 0
+        self._overruns = 0
+        if self.interval_us > target and time.ticks_diff(end, start) * 4 < target:
+            self._headroom += 1
+            if self._headroom >= HEADROOM_FRAMES:
+                self._headroom = 0
+                self.interval_us = max(self.interval_us - (self.interval_us >> 3), target)
+        else:
+            self._headroom = 0
+        return remaining
+
+    def interval_ms(self):
+        return self.interval_us // 1000
+
+
+# FrameStats block layout
+SEQUENCE = 0  # odd while the render loop is writing
+FRAMES = 1
+FRAME_MIN_US = 2
+FRAME_AVG_US = 3  # moving average, weight 1/16
+FRAME_MAX_US = 4
+JITTER_AVG_US = 5  # lateness of frame start against its deadline
+JITTER_MAX_US = 6
+MISSES = 7  # deadline misses since the last reset
+GC_FRAMES = 8  # frames that overlapped a garbage collection
+BUSY_S = 9  # time spent rendering, whole seconds plus BUSY_US
+BUSY_US = 10
+HISTOGRAM = 11
+HISTOGRAM_BINS = 8  # frame time bins <256us, <512us, <1ms ... <16ms, >=16ms
+_STATS_SIZE = HISTOGRAM + HISTOGRAM_BINS
+_NO_MIN = 0x3FFFFFFF
+
+
+class FrameStats:
+    # Fixed-size render statistics. The render loop is the only writer and never
+    # allocates or blocks; readers on the asyncio side copy the block and retry
+    # if the sequence number shows a write happened during the copy.
+    def __init__(self, enabled=True):
+        self.enabled = enabled
+        self.block = array('i', bytes(4 * _STATS_SIZE))
+        self.started_at = time.ticks_ms()
+        self._misses_base = 0
+        self._reset_requested = False
+        self._clear()
+
+    def _clear(self):
+        block = self.block
+        sequence = block[SEQUENCE]
+        for i in range(_STATS_SIZE):
+            block[i] = 0
+        block[SEQUENCE] = sequence
+        block[FRAME_MIN_US] = _NO_MIN
+        self.started_at = time.ticks_ms()
+
+    def reset(self):
+        # The writer clears the block at its next frame, so readers never race a clear
+        self._reset_requested = True
+
+    def record(self, frame_us, late_us, misses, collected):
+        block = self.block
+        block[SEQUENCE] += 1
+        if self._reset_requested:
+            self._reset_requested = False
+            self._misses_base = misses
+            self._clear()
+        if late_us < 0:
+            late_us = 0
+        if block[FRAMES] == 0:
+            # seed the moving averages with the first frame
+            block[FRAME_AVG_US] = frame_us
+            block[JITTER_AVG_US] = late_us
+        block[FRAMES] += 1
+        if frame_us < block[FRAME_MIN_US]:
+            block[FRAME_MIN_US] = frame_us
+        if frame_us > block[FRAME_MAX_US]:
+            block[FRAME_MAX_US] = frame_us
+        block[FRAME_AVG_US] += (frame_us - block[FRAME_AVG_US]) >> 4
+        block[JITTER_AVG_US] += (late_us - block[JITTER_AVG_US]) >> 4
+        if late_us > block[JITTER_MAX_US]:
+            block[JITTER_MAX_US] = late_us
+        block[MISSES] = misses - self._misses_base
+        if collected:
+            block[GC_FRAMES] += 1
+        # carry into seconds so the counters stay small ints and never allocate
+        busy = block[BUSY_US] + frame_us
+        if busy >= 1000000:
+            busy -= 1000000
+            block[BUSY_S] += 1
+        block[BUSY_US] = busy
+        slot = 0
+        scaled = frame_us >> 8
+        while scaled and slot < HISTOGRAM_BINS - 1:
+            scaled >>= 1
+            slot += 1
+        block[HISTOGRAM + slot] += 1
+        block[SEQUENCE] += 1
+
+    def read(self, retries=10):
+        """Return a consistent copy of the stats block, without locking the writer."""
+        block = self.block
+        values = None
+        for _ in range(retries):
+            sequence = block[SEQUENCE]
+            values = array('i', block)
+            if not sequence & 1 and block[SEQUENCE] == sequence:
+                break
+        if values[FRAME_MIN_US] == _NO_MIN:
+            values[FRAME_MIN_US] = 0
+        return values
+
+
+class _Scheduler:
+    name = None
+
+    def __init__(self, frame_fn, governor=None, stats=None):
+        self.frame_fn = frame_fn
+        self.governor = governor or FrameGovernor()
+        self.stats = stats if stats is not None else FrameStats()
+        self.running = False
+        self.frame_number = 0  # wraps at 16 bits, shared with other lanterns by sync.py
+        self.frame_start = time.ticks_us()
+
+    def _frame(self):
+        # Render one frame and return the wait in ms until the next one
+        start = time.ticks_us()
+        self.frame_start = start
+        self.frame_number = (self.frame_number + 1) & 0xFFFF
+        late = time.ticks_diff(start, self.governor.deadline)
+        if self.stats.enabled:
+            allocated = gc.mem_alloc()
+            factor = self.frame_fn()
+            end = time.ticks_us()
+            wait = self.governor.next(factor, start, end)
+            # a drop in allocated memory means a collection ran during this frame
+            self.stats.record(time.ticks_diff(end, start), late, self.governor.misses,
+                              gc.mem_alloc() < allocated)
+        else:
+            factor = self.frame_fn()
+            wait = self.governor.next(factor, start, time.ticks_us())
+        return wait // 1000
+
+    def start(self):
+        self.running = True
+        self.stats.reset()
+        self.governor.reset()
+
+    def stop(self):
+        self.running = False
+
+    def report(self, reset=True):
+        # Called from the asyncio side, reads the stats without stopping the render loop
+        values = self.stats.read()
+        elapsed_ms = max(time.ticks_diff(time.ticks_ms(), self.stats.started_at), 1)
+        busy_ms = values[BUSY_S] * 1000 + values[BUSY_US] / 1000
+        print(f"Render {self.name}: {values[FRAMES]} frames, "
+              f"CPU {busy_ms * 100 / elapsed_ms:.1f}%, "
+              f"frame min {values[FRAME_MIN_US]} avg {values[FRAME_AVG_US]} max {values[FRAME_MAX_US]} us, "
+              f"jitter avg {values[JITTER_AVG_US]} max {values[JITTER_MAX_US]} us, "
+              f"interval {self.governor.interval_ms()} ms, "
+              f"{values[MISSES]} missed deadlines, {values[GC_FRAMES]} frames with GC")
+        print("Frame time histogram (<256us, <512us, ... >=16ms):",
+              list(values[HISTOGRAM:HISTOGRAM + HISTOGRAM_BINS]))
+        if reset:
+            self.stats.reset()
+
+
+class ThreadScheduler(_Scheduler):
+    # The original loop, running on the second core
+    name = 'thread'
+
+    def start(self):
+        import _thread
+        super().start()
+        _thread.start_new_thread(self._run, ())
+
+    def _run(self):
+        gc.collect()
+        print("Starting candle thread")
+        while self.running:
+            time.sleep_ms(self._frame())
+
+
+class TimerScheduler(_Scheduler):
+    # A one-shot machine.Timer per frame; the frame itself runs from micropython.schedule
+    name = 'timer'
+
+    def __init__(self, frame_fn, governor=None, stats=None, timer_id=-1):
+        super().__init__(frame_fn, governor, stats)
+        self.timer_id = timer_id
+        self.timer = None
+        self.missed = 0  # ticks dropped because the schedule queue was full
+        # bind once, allocating in the timer callback is not allowed
+        self._tick_ref = self._tick
+        self._run_ref = self._run
+
+    def start(self):
+        if Timer is None:
+            raise RuntimeError("Timer render backend needs machine.Timer")
+        super().start()
+        self.timer = Timer(self.timer_id)
+        self._arm(1)
+
+    def stop(self):
+        super().stop()
+        if self.timer:
+            self.timer.deinit()
+
+    def _arm(self, delay):
+        self.timer.init(mode=Timer.ONE_SHOT, period=max(delay, 1), callback=self._tick_ref)
+
+    def _tick(self, timer):
+        try:
+            micropython.schedule(self._run_ref, None)
+        except RuntimeError:
+            self.missed += 1
+            self._arm(1)
+
+    def _run(self, _):
+        if self.running:
+            self._arm(self._frame())
+
+
+class AsyncioScheduler(_Scheduler):
+    # An asyncio task that sleeps to the next frame deadline
+    name = 'asyncio'
+
+    def __init__(self, frame_fn, governor=None, stats=None):
+        super().__init__(frame_fn, governor, stats)
+        self.task = None
+
+    def start(self):
+        import asyncio
+        super().start()
+        self.task = asyncio.create_task(self._run())
+
+    def stop(self):
+        super().stop()
+        if self.task:
+            self.task.cancel()
+
+    async def _run(self):
+        import asyncio
+        while self.running:
+            await asyncio.sleep_ms(self._frame())
+
+
+def make_scheduler(backend, frame_fn, governor=None, stats=None):
+    if backend == 'thread':
+        return ThreadScheduler(frame_fn, governor, stats)
+    if backend == 'timer':
+        return TimerScheduler(frame_fn, governor, stats)
+    if backend == 'asyncio':
+        return AsyncioScheduler(frame_fn, governor, stats)
+    raise ValueError(f"Unknown render backend: {backend}. Choose one of {BACKENDS}")
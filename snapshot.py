@@ -0,0 +1,40 @@
+# Rob Faludi 2025
+# Lock-free handoff of a small set of integers from one core to the other.
+# The writer fills the buffer readers are not using, then bumps a sequence
+# counter that selects it. Readers copy the current buffer and check that the
+# counter did not move meanwhile, so they never block and only retry if a
+# write landed during their copy. There must be a single writer.
+
+from array import array
+
+_SEQUENCE_MASK = 0x3FFFFFFF  # keeps the counter a small int
+
+
+class Snapshot:
+    def __init__(self, size, values=None):
+        self.size = size
+        self.buffers = (array('i', bytes(4 * size)), array('i', bytes(4 * size)))
+        self.sequence = 0  # even and odd select the buffer readers should copy
+        if values is not None:
+            self.publish(values)
+
+    def publish(self, values):
+        """Writer side: make a whole new set of values visible at once."""
+        sequence = self.sequence
+        buffer = self.buffers[(sequence + 1) & 1]
+        for i in range(self.size):
+            buffer[i] = int(values[i])
+        self.sequence = (sequence + 1) & _SEQUENCE_MASK  # publish only once the buffer is full
+
+    def read(self, out, retries=10):
+        """Reader side: copy the latest values into out without allocating.
+        Returns the sequence number read, or -1 if writes kept landing during the copy."""
+        size = self.size
+        for _ in range(retries):
+            sequence = self.sequence
+            buffer = self.buffers[sequence & 1]
+            for i in range(size):
+                out[i] = buffer[i]
+            if self.sequence == sequence:
+                return sequence
+        return -1
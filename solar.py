@@ -0,0 +1,186 @@
+# Rob Faludi 2025
+# Day/night power saving for the Wind Lantern.
+# Works out sunrise and sunset for the lantern's coordinates (NOAA general solar
+# position equations, good to a minute or two), then rests the lantern during
+# daylight and optional quiet hours: dimmer tables, a slower frame rate and Wi-Fi
+# off between requests, which keep their own schedules. It ramps back to full over
+# TWILIGHT_MIN before sunset.
+
+import asyncio
+import math
+import time
+from render import BUSY_S, BUSY_US, FRAME_INTERVAL_MS
+from wind import FACTOR_ONE
+
+TWILIGHT_MIN = 45  # length of the ramp between resting and full, minutes
+REST_BRIGHTNESS = FACTOR_ONE // 4  # table brightness while resting, FACTOR_ONE is full
+REST_INTERVAL_MS = 250  # frame interval while resting
+UPDATE_MS = 60 * 1000  # how often the level is worked out again
+BRIGHTNESS_STEP = FACTOR_ONE // 32  # smallest brightness change worth rebuilding the tables for
+SECONDS_PER_DAY = 86400
+_DAYS_BEFORE = (0, 31, 59, 90, 120, 151, 181, 212, 243, 273, 304, 334)
+
+
+def _solar(year, month, day, latitude):
+    # cosine of the sunrise hour angle and the equation of time in minutes, at noon
+    leap = year % 4 == 0 and (year % 100 != 0 or year % 400 == 0)
+    day_of_year = _DAYS_BEFORE[month - 1] + day + (1 if leap and month > 2 else 0)
+    g = 2 * math.pi / 365 * (day_of_year - 1)  # fractional year
+    eqtime = 229.18 * (0.000075 + 0.001868 * math.cos(g) - 0.032077 * math.sin(g)
+                       - 0.014615 * math.cos(2 * g) - 0.040849 * math.sin(2 * g))
+    decl = (0.006918 - 0.399912 * math.cos(g) + 0.070257 * math.sin(g)
+            - 0.006758 * math.cos(2 * g) + 0.000907 * math.sin(2 * g)
+            - 0.002697 * math.cos(3 * g) + 0.00148 * math.sin(3 * g))
+    lat = math.radians(latitude)
+    cos_ha = (math.cos(math.radians(90.833)) / (math.cos(lat) * math.cos(decl))
+              - math.tan(lat) * math.tan(decl))
+    return cos_ha, eqtime
+
+
+def sun_times(year, month, day, latitude, longitude):
+    """Sunrise and sunset in minutes after UTC midnight, possibly outside 0..1440.
+    Returns None during polar day or polar night."""
+    cos_ha, eqtime = _solar(year, month, day, latitude)
+    if cos_ha > 1 or cos_ha < -1:
+        return None
+    ha = math.degrees(math.acos(cos_ha))
+    return 720 - 4 * (longitude + ha) - eqtime, 720 - 4 * (longitude - ha) - eqtime
+
+
+def _ramp(value):
+    # minutes into a ramp to 0..FACTOR_ONE
+    if value <= 0:
+        return 0
+    if value >= TWILIGHT_MIN:
+        return FACTOR_ONE
+    return int(value * FACTOR_ONE / TWILIGHT_MIN)
+
+
+class DayNight:
+    def __init__(self, latitude, longitude, quiet_hours=None, utc_offset=0):
+        self.latitude = latitude
+        self.longitude = longitude
+        self.quiet_hours = quiet_hours  # (start, end) local hours to rest at night, e.g. (23, 6)
+        self.utc_offset = utc_offset  # seconds, for quiet hours
+        self.level = FACTOR_ONE  # 0 resting .. FACTOR_ONE full
+        self.brightness = FACTOR_ONE
+        self.interval_ms = FRAME_INTERVAL_MS
+        self.times = None  # today's (sunrise, sunset), UTC minutes
+        self.polar_day = False
+        self._date = None
+        # accounting, full and resting: [seconds observed, render busy us, radio on ms]
+        self.usage = {'full': [0, 0, 0], 'rest': [0, 0, 0]}
+        self.radio_on = True
+        self._radio_since = time.ticks_ms()
+        self._last_account = time.ticks_ms()
+        self._busy_taken = 0  # render time already counted from the current stats window
+        self._stats_started = None
+
+    def set_location(self, latitude, longitude, utc_offset=None):
+        self.latitude = latitude
+        self.longitude = longitude
+        if utc_offset is not None:
+            self.utc_offset = utc_offset
+        self._date = None
+
+    @property
+    def resting(self):
+        return self.level == 0
+
+    def level_at(self, utc_seconds):
+        # 0..FACTOR_ONE for a UTC time in seconds
+        year, month, day, hour, minute = time.gmtime(utc_seconds)[:5]
+        if self._date != (year, month, day):
+            self._date = (year, month, day)
+            self.times = sun_times(year, month, day, self.latitude, self.longitude)
+            self.polar_day = self.times is None and _solar(year, month, day, self.latitude)[0] < -1
+        minute_of_day = hour * 60 + minute
+        if self.times is None:
+            level = 0 if self.polar_day else FACTOR_ONE
+        else:
+            sunrise, sunset = self.times
+            after_sunrise = (minute_of_day - sunrise) % 1440
+            before_sunset = (sunset - minute_of_day) % 1440
+            if after_sunrise < (sunset - sunrise) % 1440:  # daytime
+                level = max(_ramp(TWILIGHT_MIN - after_sunrise), _ramp(TWILIGHT_MIN - before_sunset))
+            else:
+                level = FACTOR_ONE
+        if self.quiet_hours:
+            start, end = self.quiet_hours
+            local = (minute_of_day + self.utc_offset // 60) % 1440
+            into = (local - start * 60) % 1440
+            length = (end - start) * 60 % 1440
+            if into < length:
+                # ramp down over the first TWILIGHT_MIN, back up over the last
+                level = min(level, max(FACTOR_ONE - _ramp(into), FACTOR_ONE - _ramp(length - into)))
+        return level
+
+    def _apply(self, engines, governor):
+        level = self.level
+        brightness = REST_BRIGHTNESS + ((FACTOR_ONE - REST_BRIGHTNESS) * level >> 8)
+        if abs(brightness - self.brightness) >= BRIGHTNESS_STEP or \
+                (brightness != self.brightness and level in (0, FACTOR_ONE)):
+            self.brightness = brightness
+            for engine in engines:
+                engine.set_brightness(brightness)
+        interval = REST_INTERVAL_MS - ((REST_INTERVAL_MS - FRAME_INTERVAL_MS) * level >> 8)
+        if interval != self.interval_ms:
+            self.interval_ms = interval
+            governor.set_interval(interval)
+
+    def update(self, engines, governor, utc_seconds=None):
+        self.level = self.level_at(time.time() if utc_seconds is None else utc_seconds)
+        self._apply(engines, governor)
+        return self.level
+
+    async def run(self, engines, scheduler):
+        # asyncio task: follow the sun, and count render time for the report
+        while True:
+            self.account(scheduler)
+            self.update(engines, scheduler.governor)
+            await asyncio.sleep_ms(UPDATE_MS)
+
+    def set_radio(self, on):
+        # call when Wi-Fi is switched on or off
+        if on != self.radio_on:
+            self.account()
+            self.radio_on = on
+
+    def account(self, scheduler=None):
+        # add the time since the last call to the current mode; pass the scheduler
+        # to also take its render time (the stats are left as they are)
+        now = time.ticks_ms()
+        usage = self.usage['rest' if self.resting else 'full']
+        usage[0] += time.ticks_diff(now, self._last_account) / 1000
+        if self.radio_on:
+            usage[2] += time.ticks_diff(now, self._radio_since)
+        self._radio_since = now
+        self._last_account = now
+        if scheduler is not None:
+            values = scheduler.stats.read()
+            busy_us = values[BUSY_S] * 1000000 + values[BUSY_US]
+            # the stats are reset by scheduler.report(), only count what is new
+            if scheduler.stats.started_at != self._stats_started:
+                self._stats_started = scheduler.stats.started_at
+                self._busy_taken = 0
+            usage[1] += busy_us - self._busy_taken
+            self._busy_taken = busy_us
+
+    def report(self):
+        """Print CPU awake and radio on time per day, as run and as if always at full."""
+        full_s, full_busy, full_radio = self.usage['full']
+        rest_s, rest_busy, rest_radio = self.usage['rest']
+        observed = full_s + rest_s
+        if not observed:
+            return
+        scale = SECONDS_PER_DAY / observed
+        cpu = (full_busy + rest_busy) / 1000000 * scale
+        radio = (full_radio + rest_radio) / 1000 * scale
+        line = f"Day/night: level {self.level * 100 // FACTOR_ONE}%, resting {rest_s * 100 / observed:.0f}% of the time, " \
+               f"CPU awake {cpu / 60:.1f} min/day, radio on {radio / 3600:.1f} h/day"
+        if full_s:
+            # baseline from the time spent at full, as the lantern ran before
+            cpu_full = full_busy / 1000000 / full_s * SECONDS_PER_DAY
+            radio_full = full_radio / 1000 / full_s * SECONDS_PER_DAY
+            line += f" (always full: {cpu_full / 60:.1f} min, {radio_full / 3600:.1f} h)"
+        print(line)
@@ -0,0 +1,102 @@
+# Rob Faludi 2025
+# WS2812 (NeoPixel) strip backend for larger Wind Lanterns.
+# Renders every pixel of a frame from the same wind factor and waveform tables as
+# the PWM lantern, straight into the strip's preallocated buffer, then pushes the
+# whole buffer in a single write.
+
+import time
+from flicker import FlickerEngine, TABLE_LENGTH
+from palette import GAMMA
+
+STRIP_TABLE_LENGTH = 2 * TABLE_LENGTH  # more phases, so neighbouring pixels differ
+GRB = (1, 0, 2)  # byte offset of red, green and blue within a pixel, WS2812 order
+
+
+def _compose_strip(renderer, index, offset):
+    # Pure Python fallback for hotpath.compose_strip
+    length = renderer.table_length
+    frame = renderer.frame
+    phases = renderer.phases
+    red, green, blue = renderer.tables
+    red_at = renderer.red_at
+    green_at = renderer.green_at
+    blue_at = renderer.blue_at
+    pixel = 0
+    for i in range(renderer.sets):
+        position = offset + (index + phases[i]) % length
+        frame[pixel + red_at] = red[position]
+        frame[pixel + green_at] = green[position]
+        frame[pixel + blue_at] = blue[position]
+        pixel += 3
+
+
+try:
+    from hotpath import compose_strip
+except (ImportError, SyntaxError):
+    compose_strip = _compose_strip
+
+
+class StripRenderer(FlickerEngine):
+    FULL_SCALE = 255
+    INVERTED = False
+
+    def __init__(self, pin, pixels, palette='candle', gamma=GAMMA, order=GRB,
+                 table_length=STRIP_TABLE_LENGTH, seed=None):
+        # pin may be None to render into a plain buffer, e.g. for benchmarking
+        self.pin = pin
+        self.strip = None
+        self.red_at, self.green_at, self.blue_at = order
+        super().__init__(sets=pixels, palette=palette, gamma=gamma,
+                         table_length=table_length, seed=seed)
+        self._spread_phases()
+
+    def _spread_phases(self):
+        self.rng.seed(self.seed)
+        self.rng.fill(self.phases, 0, self.table_length - 1)  # each pixel flickers at its own phase
+
+    def reseed(self, seed):
+        super().reseed(seed)
+        self._spread_phases()
+
+    def _frame_buffer(self):
+        if self.pin is None:
+            return bytearray(3 * self.sets)
+        from machine import Pin
+        import neopixel
+        self.strip = neopixel.NeoPixel(Pin(self.pin), self.sets)
+        return self.strip.buf
+
+    def compose(self, factor):
+        # Fill the strip buffer with every pixel for one wind factor
+        length = self.table_length
+        self.index = (self.index + 1) % length
+        compose_strip(self, self.index, self.bucket(factor) * length)
+        return self.frame
+
+    def show(self):
+        if self.strip:
+            self.strip.write()
+
+    def render(self, factor):
+        # frame function body for the render schedulers
+        self.compose(factor)
+        self.show()
+        return factor
+
+
+def benchmark(pin=None, counts=(30, 60, 100, 150), frames=200, factor=6):
+    """Frame time against pixel count. With a pin the strip write is included."""
+    from wind import to_fixed
+    factor = to_fixed(factor)
+    results = {}
+    for count in counts:
+        renderer = StripRenderer(pin, count)
+        renderer.set_wind(factor, factor)
+        start = time.ticks_us()
+        for _ in range(frames):
+            renderer.render(factor)
+        per_frame = time.ticks_diff(time.ticks_us(), start) / frames
+        results[count] = per_frame
+        print(f"{count} pixels: {per_frame:.0f} us/frame, {1000000 / per_frame:.0f} frames/s max")
+        del renderer
+    return results
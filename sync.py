@@ -0,0 +1,166 @@
+# Rob Faludi 2025
+# Synchronized flicker for lanterns sharing a room, over BLE broadcast only.
+# A leader advertises a small beacon in its manufacturer data: table seed, frame
+# number, how long ago that frame started, frame interval, wind factor and table
+# rows. Followers scan passively, rebuild their tables from the same seed, adopt
+# the frame number and line their frame deadlines up with the leader's, so they
+# render the same frames. No connections are made.
+
+import asyncio
+import struct
+import time
+import aioble
+from wind import FACTOR_SHIFT
+
+SYNC_COMPANY_ID = 0xFFFF  # Bluetooth SIG id reserved for testing, not used by products
+BEACON_VERSION = 1
+BEACON_FORMAT = "<BHHHIHBB"  # version, seed, frame, age_us, interval_us, factor, low row, high row
+BEACON_PERIOD_MS = 1000  # a new beacon payload every second
+BEACON_ADV_US = 30000  # advertising interval, each payload is repeated about 30 times
+# average delay from a payload going on air to the follower seeing it:
+# half an advertising interval plus the random 0-10 ms advertising delay
+BEACON_LATENCY_US = BEACON_ADV_US // 2 + 5000
+SCAN_US = 30000  # scan window equals interval, the radio listens continuously
+SCAN_DURATION_MS = 10000
+SYNC_TIMEOUT_MS = 5000  # followers fall back to their own wind after this long without a beacon
+
+
+class LanternSync:
+    def __init__(self, scheduler, engines, wind=None, role='leader'):
+        # engines: the FlickerEngine (and StripRenderer) instances rendered by scheduler
+        if role not in ('leader', 'follower'):
+            raise ValueError("Sync role must be 'leader' or 'follower'")
+        self.scheduler = scheduler
+        self.engines = engines
+        self.wind = wind  # WindManager whose gust schedule follows the shared seed
+        self.role = role
+        self.locked = False  # follower: rendering the leader's frames
+        self.factor = 0  # the leader's wind factor
+        self.seed = None  # follower: last seed taken from a beacon
+        self.last_beacon = time.ticks_ms()
+        self._payload = None
+        self._saved_intervals = None
+        # phase error of the follower against the leader, measured at each beacon
+        self.beacons = 0
+        self.error_us = 0
+        self.error_avg_us = 0
+        self.error_max_us = 0
+        self.lost = 0  # times the lock timed out
+
+    def shared_factor(self, factor):
+        # called by the frame function with this lantern's own wind factor,
+        # returns the factor to render
+        if self.role == 'leader':
+            self.factor = factor
+            return factor
+        if self.locked:
+            return self.factor
+        return factor
+
+    def _frame_clock(self):
+        # frame number and start time, read again if a frame began in between
+        scheduler = self.scheduler
+        while True:
+            start = scheduler.frame_start
+            frame = scheduler.frame_number
+            if start == scheduler.frame_start:
+                return frame, start
+
+    def beacon(self):
+        engine = self.engines[0]
+        frame, start = self._frame_clock()
+        age = min(time.ticks_diff(time.ticks_us(), start), 0xFFFF)
+        return struct.pack(BEACON_FORMAT, BEACON_VERSION, engine.seed, frame, age,
+                           self.scheduler.governor.interval_us, self.factor,
+                           engine.low_bucket, engine.high_bucket)
+
+    async def lead(self):
+        while True:
+            try:
+                await aioble.advertise(BEACON_ADV_US, manufacturer=(SYNC_COMPANY_ID, self.beacon()),
+                                       connectable=False, timeout_ms=BEACON_PERIOD_MS)
+            except asyncio.TimeoutError:
+                pass  # the usual way out, a non-connectable advertisement is never answered
+            except Exception as e:
+                print("Error advertising sync beacon:", e)
+                await asyncio.sleep_ms(BEACON_PERIOD_MS)
+
+    async def follow(self):
+        while True:
+            try:
+                async with aioble.scan(SCAN_DURATION_MS, interval_us=SCAN_US, window_us=SCAN_US) as scanner:
+                    async for result in scanner:
+                        received = time.ticks_us()
+                        for _, data in result.manufacturer(SYNC_COMPANY_ID):
+                            if data != self._payload and len(data) == struct.calcsize(BEACON_FORMAT):
+                                self._payload = data
+                                self.apply(data, received)
+                        self._check_timeout()
+            except Exception as e:
+                print("Error scanning for sync beacon:", e)
+            self._check_timeout()
+            await asyncio.sleep_ms(100)
+
+    def apply(self, data, received):
+        # line this lantern up with a new leader beacon heard at `received` (ticks_us)
+        version, seed, frame, age, interval_us, factor, low, high = struct.unpack(BEACON_FORMAT, data)
+        if version != BEACON_VERSION:
+            return
+        scheduler = self.scheduler
+        since_start = age + BEACON_LATENCY_US  # how long ago the leader started `frame`
+        if self.locked:
+            own_frame, own_start = self._frame_clock()
+            frames_ahead = ((own_frame - frame + 0x8000) & 0xFFFF) - 0x8000
+            error = frames_ahead * interval_us + time.ticks_diff(received, own_start) - since_start
+            self._record(error)
+        else:
+            governor = scheduler.governor
+            self._saved_intervals = (governor.base_us, governor.calm_us)
+        for engine in self.engines:
+            if engine.seed != seed:
+                engine.reseed(seed)
+            if engine.low_bucket != low or engine.high_bucket != high:
+                engine.rebuild(low << FACTOR_SHIFT, high << FACTOR_SHIFT)
+        if self.wind and seed != self.seed:
+            self.wind.rng.seed(seed)  # the same gust schedule when the leader goes quiet
+        self.seed = seed
+        self.factor = factor
+        scheduler.frame_number = frame
+        for engine in self.engines:
+            engine.index = frame % engine.table_length
+        scheduler.governor.align(time.ticks_add(received, interval_us - since_start), interval_us)
+        self.last_beacon = time.ticks_ms()
+        self.beacons += 1
+        self.locked = True
+
+    def _check_timeout(self):
+        if self.locked and time.ticks_diff(time.ticks_ms(), self.last_beacon) > SYNC_TIMEOUT_MS:
+            self.locked = False
+            self.lost += 1
+            if self._saved_intervals:
+                governor = self.scheduler.governor
+                governor.base_us, governor.calm_us = self._saved_intervals
+            print("Sync beacon lost, rendering on our own")
+
+    def _record(self, error):
+        self.error_us = error
+        size = abs(error)
+        if size > self.error_max_us:
+            self.error_max_us = size
+        if self.beacons <= 1:
+            self.error_avg_us = size
+        else:
+            self.error_avg_us += (size - self.error_avg_us) >> 3
+
+    def start(self):
+        return asyncio.create_task(self.lead() if self.role == 'leader' else self.follow())
+
+    def report(self, reset=True):
+        if self.role == 'leader':
+            print(f"Sync leader: seed {self.engines[0].seed}, frame {self.scheduler.frame_number}")
+        else:
+            print(f"Sync follower: {'locked' if self.locked else 'free running'}, {self.beacons} beacons, "
+                  f"phase error last {self.error_us} avg {self.error_avg_us} max {self.error_max_us} us, "
+                  f"lost {self.lost} times")
+        if reset:
+            self.error_max_us = 0
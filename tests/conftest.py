@@ -0,0 +1,9 @@
+# Rob Faludi 2025
+# Tests for the firmware modules that run on a computer as well as on the Pico.
+# Run from the repository root with `python -m pytest tests`.
+
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+import host  # noqa: F401  adds MicroPython's time.ticks_* so the firmware modules import unchanged
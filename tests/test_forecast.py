@@ -0,0 +1,85 @@
+import asyncio
+import pytest
+from forecast import REFRESH_HOURS, SECONDS_PER_HOUR, WindForecast
+
+DAY = 1700006400  # a UTC midnight
+HERE = (40.7, -74.0)
+
+
+class _Client:
+    # stands in for nature_api.Client.get_weather
+    def __init__(self, series):
+        self.series = series
+        self.calls = []
+
+    def get_weather(self, *arguments):
+        self.calls.append(arguments)
+        return self.series
+
+
+class _AsyncClient(_Client):
+    async def get_weather(self, *arguments):
+        return _Client.get_weather(self, *arguments)
+
+
+def _forecast(hours=48):
+    forecast = WindForecast()
+    forecast.load([36.0] * hours, [72.0] * hours, DAY, HERE)
+    return forecast
+
+
+def test_load_fills_gaps():
+    forecast = WindForecast()
+    forecast.load([3.6, None, 7.2, 1.0], [None, 10.0, None], DAY)
+    assert list(forecast.speeds) == [100, 100, 200]
+    assert list(forecast.gusts) == [0, 278, 278]
+
+
+def test_wind_at_interpolates():
+    forecast = WindForecast()
+    forecast.load([0, 36.0, 72.0], [36.0, 36.0, 0], DAY)
+    assert forecast.wind_at(DAY) == (0, 10.0)
+    speed, gust = forecast.wind_at(DAY + SECONDS_PER_HOUR * 3 // 2)
+    assert speed == pytest.approx(15.0)
+    assert gust == pytest.approx(5.0)
+    assert forecast.wind_at(DAY - 1) is None
+    assert forecast.wind_at(DAY + 2 * SECONDS_PER_HOUR) is None
+
+
+def test_refresh():
+    forecast = _forecast()
+    assert WindForecast().needs_refresh(HERE, DAY)
+    assert not forecast.needs_refresh(HERE, DAY)
+    assert forecast.needs_refresh((0, 0), DAY)
+    due = DAY + (47 - REFRESH_HOURS) * SECONDS_PER_HOUR
+    assert forecast.seconds_to_refresh(DAY) == due - DAY
+    assert not forecast.needs_refresh(HERE, due - 1)
+    assert forecast.needs_refresh(HERE, due + 1)
+    assert forecast.seconds_to_refresh(due + 1) == 0
+
+
+def test_fetch():
+    client = _Client({'wind_speed_10m': [18.0] * 48, 'wind_gusts_10m': [36.0] * 48})
+    forecast = WindForecast()
+    forecast.fetch(client, HERE, now=DAY + 5000)
+    assert len(client.calls) == 1
+    assert forecast.start == DAY
+    assert forecast.fetched_at == DAY + 5000
+    assert forecast.wind_at(DAY + 5000) == (5.0, 10.0)
+    assert not forecast.needs_refresh(HERE, DAY + 5000)
+
+
+def test_fetch_async():
+    client = _AsyncClient({'wind_speed_10m': [18.0] * 48, 'wind_gusts_10m': [36.0] * 48})
+    forecast = WindForecast()
+    asyncio.run(forecast.fetch_async(client, HERE, now=DAY))
+    assert forecast.fetches == 1
+    assert len(forecast) == 48
+
+
+@pytest.mark.parametrize('series', [None, {}, {'wind_speed_10m': [1.0], 'wind_gusts_10m': []}])
+def test_fetch_without_wind(series):
+    forecast = _forecast()
+    with pytest.raises(ValueError):
+        forecast.fetch(_Client(series), HERE, now=DAY)
+    assert len(forecast) == 48  # the old series is kept
@@ -0,0 +1,51 @@
+import gzip
+import json
+import zlib
+import pytest
+from inflate import Inflater
+from jsonstream import JsonExtractor
+
+BODY = json.dumps({"hourly": {"wind_speed_10m": [i / 10 for i in range(2000)]}}).encode()
+
+
+def _decode(encoding, data, size=100):
+    out = bytearray()
+    inflater = Inflater(encoding, out.extend)
+    for i in range(0, len(data), size):
+        inflater.feed(data[i:i + size])
+    inflater.finish()
+    return inflater, bytes(out)
+
+
+@pytest.mark.parametrize('encoding, data', [
+    ('gzip', gzip.compress(BODY)),
+    ('deflate', zlib.compress(BODY)),
+    (None, BODY),
+    ('identity', BODY),
+])
+def test_decodes(encoding, data):
+    inflater, out = _decode(encoding, data)
+    assert out == BODY
+    assert inflater.compressed == len(data)
+    assert inflater.uncompressed == len(BODY)
+
+
+def test_streams_into_extractor():
+    extractor = JsonExtractor(["hourly.wind_speed_10m[3]"])
+    inflater = Inflater('GZIP', extractor.feed)
+    data = gzip.compress(BODY)
+    for i in range(0, len(data), 37):
+        inflater.feed(data[i:i + 37])
+    inflater.finish()
+    assert extractor.finish() == {"hourly": {"wind_speed_10m": [None, None, None, 0.3]}}
+
+
+def test_truncated():
+    data = gzip.compress(BODY)
+    with pytest.raises(ValueError):
+        _decode('gzip', data[:len(data) // 2])
+
+
+def test_unsupported():
+    with pytest.raises(ValueError):
+        Inflater('br', print)
@@ -0,0 +1,68 @@
+import json
+import pytest
+from jsonstream import JsonExtractor, compile_path, extract
+
+DOCUMENT = json.dumps({
+    "type": "FeatureCollection",
+    "metadata": {"count": 2, "title": "Quakes \"today\" \\ all"},
+    "features": [
+        {"properties": {"mag": 4.5, "time": 1700000000, "place": "at sea"}, "id": "a"},
+        {"properties": {"mag": None, "time": 1700000100, "place": "inland"}, "id": "b"},
+    ],
+    "empty": [],
+    "nested": {"deep": [[1, 2], [3, [4, 5]]]},
+}, indent=1).encode()
+
+
+def _chunks(data, size):
+    return [data[i:i + size] for i in range(0, len(data), size)]
+
+
+def test_compile_path():
+    assert compile_path("features[*].properties.time") == ['features', '*', 'properties', 'time']
+    assert compile_path("a[2][*].b") == ['a', 2, '*', 'b']
+    assert compile_path("current") == ['current']
+
+
+@pytest.mark.parametrize('size', [1, 2, 7, 64, len(DOCUMENT)])
+def test_extract_any_chunking(size):
+    paths = ["features[*].properties.time", "metadata.title", "type", "nested.deep[1]"]
+    assert extract(_chunks(DOCUMENT, size), paths) == {
+        "type": "FeatureCollection",
+        "metadata": {"title": "Quakes \"today\" \\ all"},
+        "features": [{"properties": {"time": 1700000000}}, {"properties": {"time": 1700000100}}],
+        "nested": {"deep": [None, [3, [4, 5]]]},
+    }
+
+
+def test_whole_values_and_literals():
+    document = json.loads(DOCUMENT)
+    assert extract([DOCUMENT], ["features[*].properties"]) == {
+        "features": [{"properties": feature["properties"]} for feature in document["features"]]}
+    assert extract([DOCUMENT], ["empty"]) == {"empty": []}
+    assert extract([b"[true, false, null, -1.5e3]"], ["[*]"]) == [True, False, None, -1500.0]
+    assert extract([b" 42 "], [""]) == 42
+
+
+def test_missing_paths():
+    assert extract([DOCUMENT], ["nothing.here"]) is None
+
+
+def test_memory_limit():
+    with pytest.raises(ValueError):
+        extract(_chunks(DOCUMENT, 16), ["features"], limit=100)
+    extractor = JsonExtractor(["metadata"], limit=64)
+    with pytest.raises(ValueError):
+        extractor.feed(b'{"metadata": "' + b'x' * 100 + b'"}')
+
+
+@pytest.mark.parametrize('body', [DOCUMENT[:-1], b'{"a": [1, 2', b'{"a": "open'])
+def test_truncated(body):
+    with pytest.raises(ValueError):
+        extract([body], ["a"])
+
+
+@pytest.mark.parametrize('body', [b'{1: 2}', b'{"a" 1}', b'[1 2]', b'{"a": 1} x'])
+def test_malformed(body):
+    with pytest.raises(ValueError):
+        extract([body], ["a"])
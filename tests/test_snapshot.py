@@ -0,0 +1,45 @@
+from array import array
+from snapshot import Snapshot
+
+
+def test_read_before_publish():
+    out = array('i', [7, 7])
+    assert Snapshot(2).read(out) == 0
+    assert list(out) == [0, 0]
+
+
+def test_publish_and_read():
+    snapshot = Snapshot(3, (1, 2, 3))
+    out = array('i', bytes(12))
+    assert snapshot.read(out) == 1
+    assert list(out) == [1, 2, 3]
+    snapshot.publish((4, 5.9, -6))
+    assert snapshot.read(out) == 2
+    assert list(out) == [4, 5, -6]
+
+
+class _Interrupting:
+    # an out buffer whose writes let the writer publish mid-copy, like the other core
+    def __init__(self, snapshot, writes):
+        self.snapshot = snapshot
+        self.writes = writes
+        self.values = [0, 0]
+
+    def __setitem__(self, index, value):
+        self.values[index] = value
+        if index == 0 and self.writes:
+            self.writes -= 1
+            self.snapshot.publish((self.snapshot.sequence + 1, 0))
+
+
+def test_read_retries_torn_copy():
+    snapshot = Snapshot(2, (1, 0))
+    out = _Interrupting(snapshot, writes=2)
+    sequence = snapshot.read(out)
+    assert sequence == 3
+    assert out.values == [3, 0]
+
+
+def test_read_gives_up():
+    snapshot = Snapshot(2, (1, 0))
+    assert snapshot.read(_Interrupting(snapshot, writes=100), retries=5) == -1
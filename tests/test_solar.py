@@ -0,0 +1,78 @@
+import calendar
+import pytest
+from render import FRAME_INTERVAL_MS
+from solar import REST_INTERVAL_MS, TWILIGHT_MIN, DayNight, sun_times
+from wind import FACTOR_ONE
+
+LONDON = (51.5074, -0.1278)
+TROMSO = (69.65, 18.96)
+
+
+def _utc(*when):
+    return calendar.timegm(when + (0,) * (6 - len(when)))
+
+
+def test_sun_times():
+    # London at midsummer 2024: sunrise 03:43 and sunset 20:21 UTC
+    sunrise, sunset = sun_times(2024, 6, 21, *LONDON)
+    assert sunrise == pytest.approx(3 * 60 + 43, abs=3)
+    assert sunset == pytest.approx(20 * 60 + 21, abs=3)
+    assert sun_times(2024, 6, 21, *TROMSO) is None
+    assert sun_times(2024, 12, 21, *TROMSO) is None
+
+
+def test_rests_by_day():
+    day_night = DayNight(*LONDON)
+    assert day_night.level_at(_utc(2024, 6, 21, 12)) == 0
+    assert day_night.level_at(_utc(2024, 6, 21, 23)) == FACTOR_ONE
+    # full by sunset, ramping up over TWILIGHT_MIN before it
+    sunset = _utc(2024, 6, 21) + int(sun_times(2024, 6, 21, *LONDON)[1] + 1) * 60
+    assert day_night.level_at(sunset) == FACTOR_ONE
+    assert 0 < day_night.level_at(sunset - TWILIGHT_MIN * 30) < FACTOR_ONE
+    assert day_night.level_at(sunset - TWILIGHT_MIN * 60 - 120) == 0
+
+
+def test_polar_day_and_night():
+    day_night = DayNight(*TROMSO)
+    assert day_night.level_at(_utc(2024, 6, 21, 0)) == 0
+    assert day_night.polar_day
+    assert day_night.level_at(_utc(2024, 12, 21, 12)) == FACTOR_ONE
+    assert not day_night.polar_day
+
+
+def test_quiet_hours():
+    day_night = DayNight(*LONDON, quiet_hours=(23, 6), utc_offset=3600)
+    night = (2024, 12, 21)
+    assert day_night.level_at(_utc(*night, 21)) == FACTOR_ONE  # 22:00 local
+    assert day_night.level_at(_utc(*night, 1)) == 0  # 02:00 local
+    assert 0 < day_night.level_at(_utc(*night, 22, 20)) < FACTOR_ONE  # 23:20 local
+
+
+class _Engine:
+    def __init__(self):
+        self.brightness = []
+
+    def set_brightness(self, brightness):
+        self.brightness.append(brightness)
+
+
+class _Governor:
+    def __init__(self):
+        self.intervals = []
+
+    def set_interval(self, interval):
+        self.intervals.append(interval)
+
+
+def test_update_applies_level():
+    day_night = DayNight(*LONDON)
+    engine = _Engine()
+    governor = _Governor()
+    assert day_night.update([engine], governor, _utc(2024, 6, 21, 12)) == 0
+    assert day_night.resting
+    assert engine.brightness and engine.brightness[-1] < FACTOR_ONE
+    assert governor.intervals[-1] == REST_INTERVAL_MS
+    day_night.update([engine], governor, _utc(2024, 6, 21, 23))
+    assert not day_night.resting
+    assert engine.brightness[-1] == FACTOR_ONE
+    assert governor.intervals[-1] == FRAME_INTERVAL_MS
@@ -0,0 +1,91 @@
+import pytest
+from wind import (COMPRESS_MAX, FACTOR_ONE, GUST_INTERVAL_HIGH, GUST_LENGTH_HIGH,
+                  SteppingClock, WindManager, from_fixed, to_fixed)
+
+STEP_MS = 100
+
+
+def _manager(seed=1):
+    manager = WindManager(seed=seed, clock=SteppingClock(STEP_MS))
+    manager.set_wind(4.5, 9.2)
+    return manager
+
+
+def _phases(manager, frames):
+    # the factors of each phase run through, the first one possibly cut short
+    phases = []
+    factors = []
+    started = manager.start_time
+    for _ in range(frames):
+        factor = manager.get_wind_factor()
+        if manager.start_time != started:
+            phases.append(factors)
+            factors = []
+            started = manager.start_time
+        factors.append(factor)
+    return phases
+
+
+def test_fixed_point():
+    assert to_fixed(1) == FACTOR_ONE
+    assert from_fixed(to_fixed(2.5)) == 2.5
+
+
+def test_compress_follows_adjust():
+    manager = WindManager(seed=1)
+    for tenths in range(0, COMPRESS_MAX * 10 + 50, 7):
+        speed = tenths / 10
+        assert from_fixed(manager.compress(speed)) == pytest.approx(manager.adjust(speed), abs=0.02)
+    assert manager.compress(-3) == manager.compress(0)
+
+
+def test_seed_replays_gusts():
+    a = _manager(7)
+    b = _manager(7)
+    assert [a.get_wind_factor() for _ in range(3000)] == [b.get_wind_factor() for _ in range(3000)]
+
+
+def test_phases_alternate_within_bounds():
+    manager = _manager()
+    gusting = []
+    lengths = []
+    started = manager.start_time
+    for _ in range(5000):
+        manager.get_wind_factor()
+        if manager.start_time != started:
+            lengths.append(manager.start_time - started)
+            started = manager.start_time
+            gusting.append(manager.gusting)
+    assert len(gusting) >= 6
+    assert all(a != b for a, b in zip(gusting, gusting[1:]))
+    assert max(lengths) <= max(GUST_INTERVAL_HIGH, GUST_LENGTH_HIGH) + 2 * STEP_MS
+
+
+def test_envelope_ramps_then_holds():
+    # each phase runs monotonically from the other level towards its own, then holds it
+    manager = _manager()
+    for factors in _phases(manager, 5000)[1:]:
+        assert min(factors) >= 0
+        rising = factors[-1] >= factors[0]
+        steps = [b - a for a, b in zip(factors, factors[1:])]
+        assert all(step >= 0 if rising else step <= 0 for step in steps)
+
+
+def test_wind_change_keeps_phase_timing():
+    manager = _manager()
+    for _ in range(50):
+        manager.get_wind_factor()
+    started = manager.start_time
+    manager.set_wind(12.0, 20.0)
+    factor = manager.get_wind_factor()
+    assert manager.start_time == started  # adopted mid-phase
+    if manager.gusting:
+        assert manager._gust == manager.gust_fp
+        target = manager._gust
+    else:
+        assert manager._wind == manager.wind_fp
+        target = manager._wind
+    while manager.start_time == started:
+        last = factor
+        factor = manager.get_wind_factor()
+    assert last == target
@@ -0,0 +1,49 @@
+from array import array
+from xorshift import MAX_RANGE, XorShift16
+
+
+def test_zero_seed_is_replaced():
+    assert XorShift16(0).state == 0xACE1
+    assert XorShift16(0x10000).state == 0xACE1  # only the low 16 bits count
+
+
+def test_full_period():
+    rng = XorShift16(1)
+    seen = set()
+    for _ in range(0xFFFF):
+        seen.add(rng.next())
+    assert len(seen) == 0xFFFF
+    assert 0 not in seen
+    assert rng.state == 1
+
+
+def test_seed_replays_sequence():
+    a = XorShift16(1234)
+    b = XorShift16(1234)
+    assert [a.randint(3, 10) for _ in range(100)] == [b.randint(3, 10) for _ in range(100)]
+
+
+def test_randint_bounds():
+    rng = XorShift16(7)
+    values = [rng.randint(-5, 5) for _ in range(5000)]
+    assert min(values) == -5
+    assert max(values) == 5
+    values = [rng.below(MAX_RANGE) for _ in range(5000)]
+    assert 0 <= min(values) and max(values) < MAX_RANGE
+
+
+def test_fill_matches_randint():
+    drawn = XorShift16(99)
+    filled = XorShift16(99)
+    buf = array('H', bytes(2 * 50))
+    filled.fill(buf, 2, 40)
+    assert list(buf) == [drawn.randint(2, 40) for _ in range(50)]
+    assert filled.state == drawn.state
+
+
+def test_fill_touches_only_the_slice():
+    buf = bytearray(b'\xff' * 20)
+    XorShift16(5).fill(buf, 0, 9, 4, 8)
+    assert buf[:4] == b'\xff' * 4
+    assert buf[12:] == b'\xff' * 8
+    assert all(value <= 9 for value in buf[4:12])
@@ -0,0 +1,272 @@
+# Rob Faludi 2025
+# Wind and gust model shared by the Wind Lantern firmwares.
+# Wind factors are fixed-point integers (FACTOR_ONE == 1.0) so that the render
+# loop never creates float objects on the heap.
+
+from array import array
+import time
+from snapshot import Snapshot
+from xorshift import XorShift16
+
+GUST_INTERVAL_LOW = 15000  # 15 seconds
+GUST_INTERVAL_HIGH = 40000  # 40 seconds
+GUST_LENGTH_LOW = 3000  # 3 seconds
+GUST_LENGTH_HIGH = 15000  # 15 seconds
+WIND_FACTOR_MULTIPLIER = 1.2
+WIND_FACTOR_K = 0.03 # how strongly the wind factor is pulled towards the center value
+# A gentle breeze should have the most effect, and higher winds should have less effect to prevent the lantern from flickering too wildly in strong winds.
+WIND_FACTOR_CENTER = 6 # increase wind effect below this speed, decrease effect above this speed.
+
+FACTOR_SHIFT = 8
+FACTOR_ONE = 1 << FACTOR_SHIFT
+
+COMPRESS_SHIFT = 2  # compression table steps of 1/4 m/s
+COMPRESS_MAX = 40  # m/s covered by the table, faster winds use adjust() directly
+COMPRESS_ENTRIES = COMPRESS_MAX << COMPRESS_SHIFT
+ENVELOPE_POINTS = 3  # phase start, end of the ramp, end of the phase
+SLOPE_SHIFT = 12  # fixed-point scale of the envelope slopes
+
+
+def to_fixed(value):
+    return int(value * FACTOR_ONE)
+
+
+def from_fixed(value):
+    return value / FACTOR_ONE
+
+
+class SteppingClock:
+    # Stand-in for time.ticks_ms that moves on a fixed step per call, for benchmarks
+    def __init__(self, step_ms=100, start=0):
+        self.now = start
+        self.step_ms = step_ms
+
+    def __call__(self):
+        now = self.now
+        self.now = now + self.step_ms
+        return now
+
+
+class WindManager:
+    def __init__(self, on_change=None, seed=None, clock=None):
+        self.rng = XorShift16(seed)  # seed to replay the same gust sequence
+        self.clock = clock or time.ticks_ms  # e.g. a SteppingClock to benchmark deterministically
+        self.compression = self.compression_table()
+        self.wind_fp = 0  # as last set, on the network side
+        self.gust_fp = 0
+        # set_wind() publishes (wind_fp, gust_fp) here, the render side adopts them
+        # at its next frame, so it never sees half an update
+        self.params = Snapshot(2)
+        self._incoming = array('i', bytes(8))
+        self._applied = 0  # params sequence the envelope was compiled from
+        self._wind = 0  # render side copies, gusts vary _gust
+        self._gust = 0
+        self.gust_ramp = self.rng.randint(GUST_LENGTH_LOW, GUST_LENGTH_HIGH) // 4
+        self.speed = 0
+        self.gusts = 0
+        self.gusting = True
+        self.start_time = self.clock()
+        self.delay = 0
+        self.on_change = on_change  # called with (wind_fp, gust_fp) after set_wind
+        # the current phase as a piecewise-linear envelope: breakpoint times in ms
+        # after start_time, and the fixed-point wind factor at each of them
+        self.times = array('i', bytes(4 * ENVELOPE_POINTS))
+        self.values = array('i', bytes(4 * ENVELOPE_POINTS))
+        self.points = 0
+        self.segment = 0  # breakpoint the current segment starts at
+        self.segment_from = 0  # its time
+        self.segment_end = 0  # time of the breakpoint it ends at
+        self.segment_value = 0
+        self.segment_slope = 0  # factor change per ms, scaled by SLOPE_SHIFT
+        self._compile(0)
+
+    @property
+    def wind_factor(self):
+        return from_fixed(self.wind_fp)
+
+    @property
+    def gust_factor(self):
+        return from_fixed(self.gust_fp)
+
+    def set_wind(self, wind_speed, wind_gusts):
+        # network side; get_wind_factor() picks the new levels up at its next call
+        self.speed = wind_speed
+        self.gusts = wind_gusts
+        self._calc_wind_factor(self.speed, self.gusts)
+        self.params.publish((self.wind_fp, self.gust_fp))
+        if self.on_change:
+            self.on_change(self.wind_fp, self.gust_fp)
+
+    def adjust(self, x, k=0.02, center=10):
+        return x - k * (x - center) * abs(x - center)
+
+    def compression_table(self, k=0.02, center=10):
+        """Tabulate adjust() in fixed point, one entry per 1/4 m/s up to COMPRESS_MAX."""
+        table = array('i', bytes(4 * (COMPRESS_ENTRIES + 1)))
+        for i in range(COMPRESS_ENTRIES + 1):
+            table[i] = to_fixed(self.adjust(i / (1 << COMPRESS_SHIFT), k, center))
+        return table
+
+    def compress(self, speed):
+        # adjust() in fixed point, interpolated from the compression table
+        speed = max(speed, 0) # protect against negative wind factor
+        if speed >= COMPRESS_MAX:
+            return to_fixed(self.adjust(speed))
+        position = int(speed * (1 << COMPRESS_SHIFT) * FACTOR_ONE)
+        index = position >> FACTOR_SHIFT
+        low = self.compression[index]
+        return low + (((self.compression[index + 1] - low) * (position & (FACTOR_ONE - 1))) >> FACTOR_SHIFT)
+
+    def _calc_wind_factor(self, wind_speed, wind_gusts):
+        # wind_factor = (wind_factor * WIND_FACTOR_MULTIPLIER)   # increase wind factor effect
+        self.wind_fp = self.compress(wind_speed)
+        self.gust_fp = self.compress(wind_gusts)
+
+    def _compile(self, elapsed):
+        # Envelope of the current phase: ramp from the other level to this phase's
+        # level over gust_ramp, then hold it to the end of the phase
+        if self.gusting:
+            start, target = self._wind, self._gust
+        else:
+            start, target = self._gust, self._wind
+        times = self.times
+        values = self.values
+        ramp = self.gust_ramp
+        times[0] = 0
+        values[0] = start
+        if ramp < self.delay:
+            times[1] = ramp
+            values[1] = target
+            times[2] = self.delay
+            values[2] = target
+            self.points = 3
+        else:
+            # the phase ends before the ramp does
+            times[1] = self.delay
+            values[1] = start + (target - start) * self.delay // ramp
+            self.points = 2
+        self.segment = 0
+        while self.segment < self.points - 2 and elapsed >= times[self.segment + 1]:
+            self.segment += 1
+        self._load_segment()
+
+    def _load_segment(self):
+        i = self.segment
+        start = self.times[i]
+        length = self.times[i + 1] - start
+        self.segment_from = start
+        self.segment_end = self.times[i + 1]
+        self.segment_value = self.values[i]
+        self.segment_slope = ((self.values[i + 1] - self.values[i]) << SLOPE_SHIFT) // length if length > 0 else 0
+
+    def _next_phase(self, now):
+        self.start_time = now
+        self.gust_ramp = self.rng.randint(GUST_LENGTH_LOW, GUST_LENGTH_HIGH) // 4
+        if not self.gusting:
+            self.gusting = True
+            self._gust = self._gust * self.rng.randint(80, 120) // 100 # add some randomness to gust factor
+            self.delay = self.rng.randint(GUST_LENGTH_LOW, GUST_LENGTH_HIGH)
+            print("Gusting for", self.delay // 1000, "secs")
+        else:
+            self.gusting = False
+            self.delay = self.rng.randint(GUST_INTERVAL_LOW, GUST_INTERVAL_HIGH)
+            print("Next gust in", self.delay // 1000, "secs")
+        self._compile(0)
+
+    def _advance(self, now, elapsed):
+        # move to the segment containing elapsed, starting a new phase after the last one
+        while elapsed >= self.segment_end:
+            if self.segment + 2 < self.points:
+                self.segment += 1
+                self._load_segment()
+            elif elapsed > self.segment_end or self.points == 2 and self.segment_end == 0:
+                self._next_phase(now)
+                elapsed = 0
+            else:
+                break  # exactly at the end of the phase, still on its final value
+        return elapsed
+
+    def _adopt(self, elapsed):
+        # render side: take newly published levels, same phase timing
+        sequence = self.params.read(self._incoming)
+        if sequence < 0:
+            return  # the writer is busy, try again next frame
+        self._applied = sequence
+        self._wind = self._incoming[0]
+        self._gust = self._incoming[1]
+        self._compile(elapsed)
+
+    def get_wind_factor(self):
+        # Returns the current wind factor in fixed point: one clock read, one
+        # comparison and a linear interpolation within the compiled envelope
+        now = self.clock()
+        elapsed = time.ticks_diff(now, self.start_time)
+        if self.params.sequence != self._applied:
+            self._adopt(elapsed)
+        if elapsed >= self.segment_end:
+            elapsed = self._advance(now, elapsed)
+        return self.segment_value + (((elapsed - self.segment_from) * self.segment_slope) >> SLOPE_SHIFT)
+
+
+def benchmark(frames=5000, seed=1, step_ms=100):
+    """Time get_wind_factor() on a stepping clock. The checksum repeats for a seed."""
+    manager = WindManager(seed=seed, clock=SteppingClock(step_ms))
+    manager.set_wind(4.5, 9.2)
+    checksum = 0
+    start = time.ticks_us()
+    for _ in range(frames):
+        checksum = (checksum + manager.get_wind_factor()) & 0xFFFFFF
+    elapsed = time.ticks_diff(time.ticks_us(), start)
+    print(f"get_wind_factor: {elapsed / frames:.2f} us per frame, checksum {checksum:06x}")
+    return elapsed / frames, checksum
+
+
+class WindBlend:
+    # Feeds one WindManager from a preferred live source (e.g. a BLE sensor) and a
+    # fallback (e.g. the forecast). The live source's weight ramps up while its
+    # readings are fresh and back down once they go stale, so a switch is a fade
+    # over fade_ms instead of a jump. Call step() regularly from the asyncio side.
+    def __init__(self, manager, fade_ms=10000, stale_ms=5000, gust_decay=0.95):
+        self.manager = manager
+        self.fade_ms = fade_ms
+        self.stale_ms = stale_ms
+        self.gust_decay = gust_decay  # per reading, for sources without gusts
+        self.primary = None  # (speed, gusts) m/s
+        self.fallback = None
+        self.primary_at = None  # ticks_ms of the last primary reading
+        self.weight = 0.0  # share of the primary source, 0..1
+        self._stepped_at = time.ticks_ms()
+
+    def update_primary(self, speed, gusts=None):
+        if gusts is None:
+            # a sensor reports the wind now, take a slowly decaying peak as gusts
+            peak = self.primary[1] * self.gust_decay if self.primary else 0
+            gusts = max(speed, peak)
+        self.primary = (speed, gusts)
+        self.primary_at = time.ticks_ms()
+
+    def update_fallback(self, speed, gusts):
+        self.fallback = (speed, gusts)
+
+    @property
+    def live(self):
+        return self.primary_at is not None and time.ticks_diff(time.ticks_ms(), self.primary_at) < self.stale_ms
+
+    def step(self):
+        """Move the weight towards the preferred source and publish the blend."""
+        now = time.ticks_ms()
+        change = time.ticks_diff(now, self._stepped_at) / self.fade_ms
+        self._stepped_at = now
+        if self.live or self.fallback is None:
+            self.weight = min(self.weight + change, 1.0) if self.primary else 0.0
+        else:
+            self.weight = max(self.weight - change, 0.0)
+        if self.primary is None and self.fallback is None:
+            return None
+        weight = self.weight
+        primary = self.primary or self.fallback
+        fallback = self.fallback or self.primary
+        speed = primary[0] * weight + fallback[0] * (1 - weight)
+        gusts = primary[1] * weight + fallback[1] * (1 - weight)
+        self.manager.set_wind(speed, gusts)
+        return speed, gusts
@@ -0,0 +1,78 @@
+# Rob Faludi 2025
+# Small integer PRNG for the render loop and the gust model.
+# 16-bit xorshift (7, 9, 8), period 65535. State and results stay small ints,
+# so drawing numbers never allocates, and a seed reproduces a sequence exactly.
+
+import time
+
+MAX_RANGE = 1 << 15  # largest span below() can draw without leaving small ints
+
+
+class XorShift16:
+    def __init__(self, seed=None):
+        self.state = 1
+        self.seed(seed)
+
+    def seed(self, seed=None):
+        if seed is None:
+            seed = time.ticks_us()
+        seed &= 0xFFFF
+        self.state = seed or 0xACE1  # zero is the one state the generator cannot leave
+
+    def next(self):
+        # 1..65535
+        x = self.state
+        x ^= (x << 7) & 0xFFFF
+        x ^= x >> 9
+        x ^= (x << 8) & 0xFFFF
+        self.state = x
+        return x
+
+    def below(self, n):
+        # 0..n-1, for n up to MAX_RANGE
+        return ((self.next() >> 2) * n) >> 14
+
+    def randint(self, a, b):
+        # a..b inclusive, like random.randint
+        return a + self.below(b - a + 1)
+
+    def fill(self, buf, low, high, start=0, count=None):
+        """Fill buf[start:start + count] with values in low..high inclusive, in place."""
+        if count is None:
+            count = len(buf) - start
+        span = high - low + 1
+        x = self.state
+        for i in range(start, start + count):
+            x ^= (x << 7) & 0xFFFF
+            x ^= x >> 9
+            x ^= (x << 8) & 0xFFFF
+            buf[i] = low + (((x >> 2) * span) >> 14)
+        self.state = x
+        return buf
+
+
+def benchmark(count=5000):
+    """Time random.randint against XorShift16.randint and a batch fill."""
+    import random
+    from array import array
+    rng = XorShift16(1)
+    buf = array('H', bytes(2 * count))
+    results = {}
+
+    start = time.ticks_us()
+    for _ in range(count):
+        random.randint(3, 10)
+    results['random.randint'] = time.ticks_diff(time.ticks_us(), start)
+
+    start = time.ticks_us()
+    for _ in range(count):
+        rng.randint(3, 10)
+    results['XorShift16.randint'] = time.ticks_diff(time.ticks_us(), start)
+
+    start = time.ticks_us()
+    rng.fill(buf, 3, 10)
+    results['XorShift16.fill'] = time.ticks_diff(time.ticks_us(), start)
+
+    for name, elapsed in results.items():
+        print(f"{name}: {elapsed / count:.2f} us per value")
+    return results